@@ -25,10 +25,14 @@ def create_default_local_file():
         'msra10k_dir': empty_str,
         'davis_dir': empty_str,
         'youtubevos_dir': empty_str,
-        'lasot_candidate_matching_dataset_path': empty_str})
+        'lasot_candidate_matching_dataset_path': empty_str,
+        'annotation_cache_dir': 'self.workspace_dir + \'/annotation_cache/\'',
+        'crop_cache_dir': 'self.workspace_dir + \'/crop_cache/\''})
 
     comment = {'workspace_dir': 'Base directory for saving network checkpoints.',
-               'tensorboard_dir': 'Directory for tensorboard files.'}
+               'tensorboard_dir': 'Directory for tensorboard files.',
+               'annotation_cache_dir': 'Packed annotations of the video datasets. Empty to read the annotation files.',
+               'crop_cache_dir': 'Pre-extracted training crops, see ltr.dataset.CropCacheDataset.'}
 
     with open(path, 'w') as f:
         f.write('class EnvironmentSettings:\n')
@@ -70,6 +70,75 @@ def jpeg4py_loader_w_failsafe(path):
             return None
 
 
+_reduced_color_flags = {1: cv.IMREAD_COLOR, 2: cv.IMREAD_REDUCED_COLOR_2, 4: cv.IMREAD_REDUCED_COLOR_4,
+                        8: cv.IMREAD_REDUCED_COLOR_8}
+
+
+class DeferredImage:
+    """ An image that is only decoded when a region of it is cropped, see deferred_image_loader. The training crops
+    are usually much smaller than the frames after resizing, so the image is decoded at a reduced DCT scale (1/2, 1/4
+    or 1/8 for jpeg images) when the crop is downsampled anyway, and only the crop is converted to rgb.
+
+    args:
+        path - Path of the image.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._shape = None
+
+    @property
+    def shape(self):
+        """ Shape (H, W, 3) of the decoded image, read from the image header."""
+        if self._shape is None:
+            with Image.open(self.path) as im:
+                self._shape = (im.size[1], im.size[0], 3)
+        return self._shape
+
+    def decode(self):
+        """ Decode the full image, in rgb format."""
+        return opencv_loader(self.path)
+
+    def crop(self, x1, y1, x2, y2, output_sz):
+        """ Extracts the region [x1, x2) x [y1, y2) of the image, resized to output_sz. Parts of the region outside the
+        image are padded by replicating the boundary pixels, as in ltr.data.processing_utils.sample_target.
+
+        args:
+            x1, y1, x2, y2 - Region to crop, in pixels of the full image.
+            output_sz - (width, height) to which the region is resized.
+
+        returns:
+            np.array - The crop, in rgb format.
+        """
+        # Largest DCT scale at which the region is at least the output size
+        scale = next((s for s in (8, 4, 2) if x2 - x1 >= s * output_sz[0] and y2 - y1 >= s * output_sz[1]), 1)
+
+        im = cv.imread(self.path, _reduced_color_flags[scale])
+        if im is None:
+            raise Exception('Could not read image "{}"'.format(self.path))
+
+        if scale > 1:
+            x1, y1, x2, y2 = [int(round(v / scale)) for v in (x1, y1, x2, y2)]
+
+        x1_pad = max(0, -x1)
+        x2_pad = max(x2 - im.shape[1] + 1, 0)
+
+        y1_pad = max(0, -y1)
+        y2_pad = max(y2 - im.shape[0] + 1, 0)
+
+        im_crop = im[y1 + y1_pad:y2 - y2_pad, x1 + x1_pad:x2 - x2_pad, :]
+        im_crop = cv.copyMakeBorder(im_crop, y1_pad, y2_pad, x1_pad, x2_pad, cv.BORDER_REPLICATE)
+
+        # Colour conversion of the crop only
+        im_crop = cv.cvtColor(im_crop, cv.COLOR_BGR2RGB)
+        return cv.resize(im_crop, tuple(output_sz))
+
+
+def deferred_image_loader(path):
+    """ Returns a DeferredImage, which is decoded by the processing when the training crop is extracted, instead of
+    decoding the full frame. Supported by the DiMPProcessing, KLDiMPProcessing and LTRBDenseRegressionProcessing."""
+    return DeferredImage(path)
+
+
 def opencv_seg_loader(path):
     """ Read segmentation annotation using opencv's imread function"""
     try:
@@ -1,7 +1,10 @@
 import torch
 import torch.utils.data.dataloader
 import importlib
-import collections
+import functools
+import re
+import collections.abc
+import numpy as np
 
 from pytracking import TensorDict, TensorList
 
@@ -16,35 +19,120 @@ def _check_use_shared_memory():
     return torch.utils.data.get_worker_info() is not None
 
 
-def ltr_collate(batch):
-    """Puts each data field into a tensor with outer dimension batch size"""
+class PackedTensor:
+    """A variable-length field of a batch, e.g. candidate lists with a different number of candidates per sample, given
+    in the packed_keys of the LTRLoader. The samples are concatenated along the dimension dim in which their sizes
+    differ, and sample i is data.narrow(dim, offsets[i], offsets[i+1] - offsets[i]). The tensor methods are applied to
+    the concatenated samples.
 
+    args:
+        data - The concatenated samples.
+        offsets - LongTensor with the start of each sample along dim, and the total size as last element.
+        dim - The dimension of the samples along which they are concatenated.
+    """
+    def __init__(self, data: torch.Tensor, offsets: torch.Tensor, dim: int):
+        self.data = data
+        self.offsets = offsets
+        self.dim = dim
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        start, end = self.offsets[i].item(), self.offsets[i + 1].item()
+        return self.data.narrow(self.dim, start, end - start)
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def sizes(self):
+        """The size of each sample along dim."""
+        return self.offsets[1:] - self.offsets[:-1]
+
+    def to(self, *args, **kwargs):
+        return PackedTensor(self.data.to(*args, **kwargs), self.offsets, self.dim)
+
+    def pin_memory(self):
+        return PackedTensor(self.data.pin_memory(), self.offsets.pin_memory(), self.dim)
+
+    def __getattr__(self, name):
+        # Forward the tensor methods to the concatenated samples, as TensorDict does for its elements
+        if name.startswith('__') or name in ('data', 'offsets', 'dim') or not hasattr(torch.Tensor, name):
+            raise AttributeError('\'PackedTensor\' object has no attribute \'{}\''.format(name))
+
+        def apply_attr(*args, **kwargs):
+            out = getattr(self.data, name)(*args, **kwargs)
+            # Results that keep the packed dimension (e.g. float(), cuda()) are packed again, others (e.g. sum()) are
+            # returned as they are
+            if torch.is_tensor(out) and out.dim() > self.dim and out.shape[self.dim] == self.data.shape[self.dim]:
+                return PackedTensor(out, self.offsets, self.dim)
+            return out
+        return apply_attr
+
+
+def _new_batch_tensor(elem, size):
+    """Uninitialized shared memory tensor for a batch, with the type of elem, if in a DataLoader worker. The samples are
+    then written in place, and the batch is passed to the main process without a copy. Returns None otherwise."""
+    if not _check_use_shared_memory():
+        return None
+    numel = int(np.prod(size))
+    if hasattr(elem, '_typed_storage'):
+        storage = elem._typed_storage()._new_shared(numel, device=elem.device)
+    else:
+        storage = elem.storage()._new_shared(numel)
+    return elem.new(storage).view(size)
+
+
+def _collate_tensors(batch, stack_dim, pack_dim=None):
+    """Stacks the tensors along stack_dim. If pack_dim is given, the tensors are instead concatenated along pack_dim,
+    in which their sizes may differ, see PackedTensor."""
+    elem = batch[0]
+    sizes = [x.shape for x in batch]
+    if pack_dim is None:
+        if any(sz != sizes[0] for sz in sizes):
+            raise RuntimeError('Cannot collate tensors of sizes {}. Variable-length fields must be declared in the '
+                               'packed_keys.'.format([tuple(sz) for sz in sizes]))
+        size = list(elem.shape)
+        size.insert(stack_dim, len(batch))
+        return torch.stack(batch, stack_dim, out=_new_batch_tensor(elem, size))
+
+    if any(len(sz) != elem.dim() or any(sz[d] != sizes[0][d] for d in range(elem.dim()) if d != pack_dim)
+           for sz in sizes):
+        raise RuntimeError('Cannot pack tensors of sizes {} along dim {}'.format([tuple(sz) for sz in sizes], pack_dim))
+
+    lengths = torch.LongTensor([sz[pack_dim] for sz in sizes])
+    offsets = torch.cat((torch.zeros(1, dtype=torch.long), lengths.cumsum(0)))
+
+    size = list(elem.shape)
+    size[pack_dim] = offsets[-1].item()
+    return PackedTensor(torch.cat(batch, pack_dim, out=_new_batch_tensor(elem, size)), offsets, pack_dim)
+
+
+def _packed_keys_dims(packed_keys):
+    """The packed_keys as a dict from the field names to the dimension in which they are packed."""
+    if packed_keys is None:
+        return {}
+    if isinstance(packed_keys, collections.abc.Mapping):
+        return dict(packed_keys)
+    return {key: 0 for key in packed_keys}
+
+
+def _collate(batch, stack_dim, packed_keys, pack_dim=None):
     error_msg = "batch must contain tensors, numbers, dicts or lists; found {}"
     elem_type = type(batch[0])
     if isinstance(batch[0], torch.Tensor):
-        out = None
-        if _check_use_shared_memory():
-            # If we're in a background process, concatenate directly into a
-            # shared memory tensor to avoid an extra copy
-            numel = sum([x.numel() for x in batch])
-            storage = batch[0].storage()._new_shared(numel)
-            out = batch[0].new(storage)
-        return torch.stack(batch, 0, out=out)
-        # if batch[0].dim() < 4:
-        #     return torch.stack(batch, 0, out=out)
-        # return torch.cat(batch, 0, out=out)
+        return _collate_tensors(batch, stack_dim, pack_dim)
     elif elem_type.__module__ == 'numpy' and elem_type.__name__ != 'str_' \
             and elem_type.__name__ != 'string_':
         elem = batch[0]
         if elem_type.__name__ == 'ndarray':
             # array of string classes and object
-            if torch.utils.data.dataloader.re.search('[SaUO]', elem.dtype.str) is not None:
+            if re.search('[SaUO]', elem.dtype.str) is not None:
                 raise TypeError(error_msg.format(elem.dtype))
 
-            return torch.stack([torch.from_numpy(b) for b in batch], 0)
+            return _collate_tensors([torch.from_numpy(b) for b in batch], stack_dim, pack_dim)
         if elem.shape == ():  # scalars
-            py_type = float if elem.dtype.name.startswith('float') else int
-            return torch.utils.data.dataloader.numpy_type_map[elem.dtype.name](list(map(py_type, batch)))
+            return torch.from_numpy(np.array(batch))
     elif isinstance(batch[0], int):
         return torch.LongTensor(batch)
     elif isinstance(batch[0], float):
@@ -52,70 +140,35 @@ def ltr_collate(batch):
     elif isinstance(batch[0], string_classes):
         return batch
     elif isinstance(batch[0], TensorDict):
-        return TensorDict({key: ltr_collate([d[key] for d in batch]) for key in batch[0]})
-    elif isinstance(batch[0], collections.Mapping):
-        return {key: ltr_collate([d[key] for d in batch]) for key in batch[0]}
+        return TensorDict({key: _collate([d[key] for d in batch], stack_dim, packed_keys, packed_keys.get(key, pack_dim))
+                           for key in batch[0]})
+    elif isinstance(batch[0], collections.abc.Mapping):
+        return {key: _collate([d[key] for d in batch], stack_dim, packed_keys, packed_keys.get(key, pack_dim))
+                for key in batch[0]}
     elif isinstance(batch[0], TensorList):
         transposed = zip(*batch)
-        return TensorList([ltr_collate(samples) for samples in transposed])
-    elif isinstance(batch[0], collections.Sequence):
+        return TensorList([_collate(samples, stack_dim, packed_keys, pack_dim) for samples in transposed])
+    elif isinstance(batch[0], collections.abc.Sequence):
         transposed = zip(*batch)
-        return [ltr_collate(samples) for samples in transposed]
+        return [_collate(samples, stack_dim, packed_keys, pack_dim) for samples in transposed]
     elif batch[0] is None:
         return batch
 
     raise TypeError((error_msg.format(type(batch[0]))))
 
 
-def ltr_collate_stack1(batch):
-    """Puts each data field into a tensor. The tensors are stacked at dim=1 to form the batch"""
+def ltr_collate(batch, packed_keys=None):
+    """Puts each data field into a tensor with outer dimension batch size. The fields in packed_keys have a variable
+    length and are packed into a PackedTensor. packed_keys is a list of field names, which are packed along their first
+    dimension, or a dict from the field names to the dimension in which their size varies. All other fields must have
+    the same size in all samples."""
+    return _collate(batch, 0, _packed_keys_dims(packed_keys))
 
-    error_msg = "batch must contain tensors, numbers, dicts or lists; found {}"
-    elem_type = type(batch[0])
-    if isinstance(batch[0], torch.Tensor):
-        out = None
-        if _check_use_shared_memory():
-            # If we're in a background process, concatenate directly into a
-            # shared memory tensor to avoid an extra copy
-            numel = sum([x.numel() for x in batch])
-            storage = batch[0].storage()._new_shared(numel)
-            out = batch[0].new(storage)
-        return torch.stack(batch, 1, out=out)
-        # if batch[0].dim() < 4:
-        #     return torch.stack(batch, 0, out=out)
-        # return torch.cat(batch, 0, out=out)
-    elif elem_type.__module__ == 'numpy' and elem_type.__name__ != 'str_' \
-            and elem_type.__name__ != 'string_':
-        elem = batch[0]
-        if elem_type.__name__ == 'ndarray':
-            # array of string classes and object
-            if torch.utils.data.dataloader.re.search('[SaUO]', elem.dtype.str) is not None:
-                raise TypeError(error_msg.format(elem.dtype))
 
-            return torch.stack([torch.from_numpy(b) for b in batch], 1)
-        if elem.shape == ():  # scalars
-            py_type = float if elem.dtype.name.startswith('float') else int
-            return torch.utils.data.dataloader.numpy_type_map[elem.dtype.name](list(map(py_type, batch)))
-    elif isinstance(batch[0], int):
-        return torch.LongTensor(batch)
-    elif isinstance(batch[0], float):
-        return torch.DoubleTensor(batch)
-    elif isinstance(batch[0], string_classes):
-        return batch
-    elif isinstance(batch[0], TensorDict):
-        return TensorDict({key: ltr_collate_stack1([d[key] for d in batch]) for key in batch[0]})
-    elif isinstance(batch[0], collections.Mapping):
-        return {key: ltr_collate_stack1([d[key] for d in batch]) for key in batch[0]}
-    elif isinstance(batch[0], TensorList):
-        transposed = zip(*batch)
-        return TensorList([ltr_collate_stack1(samples) for samples in transposed])
-    elif isinstance(batch[0], collections.Sequence):
-        transposed = zip(*batch)
-        return [ltr_collate_stack1(samples) for samples in transposed]
-    elif batch[0] is None:
-        return batch
-
-    raise TypeError((error_msg.format(type(batch[0]))))
+def ltr_collate_stack1(batch, packed_keys=None):
+    """Puts each data field into a tensor. The tensors are stacked at dim=1 to form the batch. The fields in
+    packed_keys are packed into a PackedTensor, see ltr_collate."""
+    return _collate(batch, 1, _packed_keys_dims(packed_keys))
 
 
 class LTRLoader(torch.utils.data.dataloader.DataLoader):
@@ -142,6 +195,8 @@ class LTRLoader(torch.utils.data.dataloader.DataLoader):
             (default: 0)
         collate_fn (callable, optional): merges a list of samples to form a mini-batch.
         stack_dim (int): Dimension along which to stack to form the batch. (default: 0)
+        packed_keys (list or dict, optional): Names of the variable-length fields, which are packed into a
+            PackedTensor instead of being stacked, see ltr_collate. Only used with the default collate_fn.
         pin_memory (bool, optional): If ``True``, the data loader will copy tensors
             into CUDA pinned memory before returning them.
         drop_last (bool, optional): set to ``True`` to drop the last incomplete batch,
@@ -172,7 +227,7 @@ class LTRLoader(torch.utils.data.dataloader.DataLoader):
 
     def __init__(self, name, dataset, training=True, batch_size=1, shuffle=False, sampler=None, batch_sampler=None,
                  num_workers=0, epoch_interval=1, collate_fn=None, stack_dim=0, pin_memory=False, drop_last=False,
-                 timeout=0, worker_init_fn=None):
+                 timeout=0, worker_init_fn=None, packed_keys=None):
         if collate_fn is None:
             if stack_dim == 0:
                 collate_fn = ltr_collate
@@ -180,6 +235,8 @@ class LTRLoader(torch.utils.data.dataloader.DataLoader):
                 collate_fn = ltr_collate_stack1
             else:
                 raise ValueError('Stack dim no supported. Must be 0 or 1.')
+            if packed_keys is not None:
+                collate_fn = functools.partial(collate_fn, packed_keys=packed_keys)
 
         super(LTRLoader, self).__init__(dataset, batch_size, shuffle, sampler, batch_sampler,
                  num_workers, collate_fn, pin_memory, drop_last,
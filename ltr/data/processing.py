@@ -4,6 +4,8 @@ import numpy as np
 import torchvision.transforms as transforms
 from pytracking import TensorDict
 import ltr.data.processing_utils as prutils
+import ltr.data.transforms as tfm
+from ltr.data.image_loader import DeferredImage
 
 
 def stack_tensors(x):
@@ -35,6 +37,26 @@ class BaseProcessing:
     def __call__(self, data: TensorDict):
         raise NotImplementedError
 
+    def _pixelwise_joint_transform(self):
+        """ Whether the joint transform only contains pixelwise transforms, which give the same result when applied
+        to the crops instead of the frames."""
+        return all(isinstance(t, (tfm.ToGrayscale, tfm.ToBGR)) for t in self.transform['joint'].transforms)
+
+    def _joint_transform_on_crops(self, data: TensorDict):
+        """ Whether the joint transform is applied to the crops instead of the frames. This is the case when the frames
+        are DeferredImages (see ltr.data.image_loader.deferred_image_loader), of which only the crops are decoded, and
+        the joint transform only contains pixelwise transforms. For other joint transforms, the frames are decoded."""
+        frames = list(data['train_images']) + list(data['test_images'])
+        if self.transform['joint'] is None or not any(isinstance(f, DeferredImage) for f in frames):
+            return False
+
+        if self._pixelwise_joint_transform():
+            return True
+
+        for s in ['train', 'test']:
+            data[s + '_images'] = [f.decode() if isinstance(f, DeferredImage) else f for f in data[s + '_images']]
+        return False
+
 
 class ATOMProcessing(BaseProcessing):
     """ The processing class used for training ATOM. The images are processed in the following way.
@@ -452,7 +474,8 @@ class DiMPProcessing(BaseProcessing):
                 'test_label' (optional), 'train_label' (optional), 'test_label_density' (optional), 'train_label_density' (optional)
         """
 
-        if self.transform['joint'] is not None:
+        joint_on_crops = self._joint_transform_on_crops(data)
+        if self.transform['joint'] is not None and not joint_on_crops:
             data['train_images'], data['train_anno'] = self.transform['joint'](image=data['train_images'], bbox=data['train_anno'])
             data['test_images'], data['test_anno'] = self.transform['joint'](image=data['test_images'], bbox=data['test_anno'], new_roll=False)
 
@@ -467,6 +490,9 @@ class DiMPProcessing(BaseProcessing):
                                                      self.search_area_factor, self.output_sz, mode=self.crop_type,
                                                      max_scale_change=self.max_scale_change)
 
+            if joint_on_crops:
+                crops, boxes = self.transform['joint'](image=crops, bbox=boxes, new_roll=(s == 'train'))
+
             data[s + '_images'], data[s + '_anno'] = self.transform[s](image=crops, bbox=boxes, joint=False)
 
         # Generate proposals
@@ -490,6 +516,44 @@ class DiMPProcessing(BaseProcessing):
         return data
 
 
+class CropCacheDiMPProcessing(DiMPProcessing):
+    """ DiMPProcessing for the frames of a ltr.dataset.CropCacheDataset, of which only crops covering oversize times
+    the search area around the target are cached. The jitter of the target box is bounded, so that the search region
+    stays inside the cached crop. The search_area_factor and output_sz must be those of the crop cache, and the joint
+    transform can only contain pixelwise transforms.
+    """
+
+    def __init__(self, search_area_factor, output_sz, center_jitter_factor, scale_jitter_factor, oversize=1.5,
+                 *args, **kwargs):
+        """
+        args:
+            oversize - Size of the cached crops relative to the search area, see ltr.dataset.crop_cache.
+            For the other arguments, see DiMPProcessing. The crop_type must be 'replicate'.
+        """
+        super().__init__(search_area_factor, output_sz, center_jitter_factor, scale_jitter_factor, *args, **kwargs)
+        if self.crop_type != 'replicate':
+            raise ValueError('CropCacheDiMPProcessing only supports the crop_type \'replicate\'.')
+        if self.transform['joint'] is not None and not self._pixelwise_joint_transform():
+            raise ValueError('CropCacheDiMPProcessing only supports pixelwise joint transforms (ToGrayscale, ToBGR), '
+                             'since the full frames are not cached.')
+        self.oversize = oversize
+
+    def _get_jittered_box(self, box, mode):
+        """ Jitter the input box as in DiMPProcessing, bounded to the cached crop around the input box."""
+        jittered_box = super()._get_jittered_box(box, mode)
+
+        # Side of the cached crop, and the largest scale of the jittered box for which the search region fits in it
+        cache_sz = self.oversize * self.search_area_factor * box[2:4].prod().sqrt()
+        max_scale = cache_sz / (self.search_area_factor * jittered_box[2:4].prod().sqrt())
+        jittered_size = jittered_box[2:4] * max_scale.clamp(max=1.0)
+
+        max_offset = 0.5 * (cache_sz - self.search_area_factor * jittered_size.prod().sqrt())
+        center = box[0:2] + 0.5 * box[2:4]
+        offset = (jittered_box[0:2] + 0.5 * jittered_box[2:4] - center).clamp(-max_offset, max_offset)
+
+        return torch.cat((center + offset - 0.5 * jittered_size, jittered_size), dim=0)
+
+
 class KLDiMPProcessing(BaseProcessing):
     """ The processing class used for training PrDiMP that additionally supports the probabilistic classifier and
     bounding box regressor. See DiMPProcessing for details.
@@ -615,7 +679,8 @@ class KLDiMPProcessing(BaseProcessing):
                 'test_label' (optional), 'train_label' (optional), 'test_label_density' (optional), 'train_label_density' (optional)
         """
 
-        if self.transform['joint'] is not None:
+        joint_on_crops = self._joint_transform_on_crops(data)
+        if self.transform['joint'] is not None and not joint_on_crops:
             data['train_images'], data['train_anno'] = self.transform['joint'](image=data['train_images'], bbox=data['train_anno'])
             data['test_images'], data['test_anno'] = self.transform['joint'](image=data['test_images'], bbox=data['test_anno'], new_roll=False)
 
@@ -630,6 +695,9 @@ class KLDiMPProcessing(BaseProcessing):
                                                      self.search_area_factor, self.output_sz, mode=self.crop_type,
                                                      max_scale_change=self.max_scale_change)
 
+            if joint_on_crops:
+                crops, boxes = self.transform['joint'](image=crops, bbox=boxes, new_roll=(s == 'train'))
+
             data[s + '_images'], data[s + '_anno'] = self.transform[s](image=crops, bbox=boxes, joint=False)
 
         # Generate proposals
@@ -1577,7 +1645,8 @@ class LTRBDenseRegressionProcessing(BaseProcessing):
                 'test_label' (optional), 'train_label' (optional), 'test_label_density' (optional), 'train_label_density' (optional)
         """
 
-        if self.transform['joint'] is not None:
+        joint_on_crops = self._joint_transform_on_crops(data)
+        if self.transform['joint'] is not None and not joint_on_crops:
             data['train_images'], data['train_anno'] = self.transform['joint'](image=data['train_images'],
                                                                                bbox=data['train_anno'])
             data['test_images'], data['test_anno'] = self.transform['joint'](image=data['test_images'],
@@ -1594,6 +1663,9 @@ class LTRBDenseRegressionProcessing(BaseProcessing):
                                                      self.search_area_factor, self.output_sz, mode=self.crop_type,
                                                      max_scale_change=self.max_scale_change)
 
+            if joint_on_crops:
+                crops, boxes = self.transform['joint'](image=crops, bbox=boxes, new_roll=(s == 'train'))
+
             data[s + '_images'], data[s + '_anno'] = self.transform[s](image=crops, bbox=boxes, joint=False)
 
         # Prepare output
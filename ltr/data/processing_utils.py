@@ -4,6 +4,7 @@ import cv2 as cv
 import random
 import torch.nn.functional as F
 from .bounding_box_utils import rect_to_rel, rel_to_rect
+from .image_loader import DeferredImage
 from pytracking import TensorList
 
 
@@ -20,6 +21,9 @@ def sample_target(im, target_bb, search_area_factor, output_sz=None, mask=None):
         cv image - extracted crop
         float - the factor by which the crop has been resized to make the crop size equal output_size
     """
+    if isinstance(im, DeferredImage) and (mask is not None or output_sz is None):
+        im = im.decode()
+
     x, y, w, h = target_bb.tolist()
 
     # Crop image
@@ -34,6 +38,10 @@ def sample_target(im, target_bb, search_area_factor, output_sz=None, mask=None):
     y1 = round(y + 0.5 * h - crop_sz * 0.5)
     y2 = y1 + crop_sz
 
+    if isinstance(im, DeferredImage):
+        # Only decode the crop
+        return im.crop(x1, y1, x2, y2, (output_sz, output_sz)), output_sz / crop_sz
+
     x1_pad = max(0, -x1)
     x2_pad = max(x2 - im.shape[1] + 1, 0)
 
@@ -155,6 +163,9 @@ def sample_target_adaptive(im, target_bb, search_area_factor, output_sz, mode: s
         output_sz = (output_sz, output_sz)
     output_sz = torch.Tensor(output_sz)
 
+    if isinstance(im, DeferredImage) and mask is not None:
+        im = im.decode()
+
     im_h = im.shape[0]
     im_w = im.shape[1]
 
@@ -205,6 +216,11 @@ def sample_target_adaptive(im, target_bb, search_area_factor, output_sz, mode: s
     y1 += shift_y
     y2 += shift_y
 
+    if isinstance(im, DeferredImage):
+        # Only decode the crop
+        im_out = im.crop(x1, y1, x2, y2, tuple(output_sz.long().tolist()))
+        return im_out, torch.Tensor([x1, y1, x2 - x1, y2 - y1])
+
     x1_pad = max(0, -x1)
     x2_pad = max(x2 - im.shape[1] + 1, 0)
 
@@ -258,6 +274,9 @@ def sample_target_from_crop_region(im, crop_box, output_sz):
     x2 = x1 + w1
     y2 = y1 + h1
 
+    if isinstance(im, DeferredImage):
+        return im.crop(x1, y1, x2, y2, tuple(output_sz.long().tolist()))
+
     x1_pad = max(0, -x1)
     x2_pad = max(x2 - im.shape[1] + 1, 0)
 
@@ -280,6 +299,9 @@ def crop_and_resize(im, box, crop_bb, output_sz, mask=None):
     if isinstance(output_sz, (float, int)):
         output_sz = (output_sz, output_sz)
 
+    if isinstance(im, DeferredImage):
+        im = im.decode()
+
     im_h = im.shape[0]
     im_w = im.shape[1]
 
@@ -1,4 +1,5 @@
 import random
+import numpy as np
 import torch.utils.data
 from pytracking import TensorDict
 
@@ -7,6 +8,128 @@ def no_processing(data):
     return data
 
 
+class VisibleFrameIndex:
+    """ The sorted ids of the frames of a sequence in which the target is visible, together with the prefix counts of
+    the visible frames. The visible frames within a range of frame numbers are then found in constant time, instead
+    of scanning the visibility of every frame in the range.
+
+    args:
+        visible - Tensor indicating whether target is visible for each frame. If it has several columns (e.g. one
+                  per object), a frame counts as visible if any of them is set.
+    """
+    def __init__(self, visible):
+        visible = np.asarray(visible).reshape(len(visible), -1).any(axis=1)
+
+        self.num_frames = len(visible)
+        self.visible_ids = np.flatnonzero(visible).astype(np.int32)
+        self.prefix_counts = np.concatenate(([0], np.cumsum(visible))).astype(np.int32)
+
+    def __len__(self):
+        return self.num_frames
+
+    def id_range(self, min_id=None, max_id=None):
+        """ Range [start, end) of positions in visible_ids of the visible frames with min_id <= frame < max_id."""
+        min_id = 0 if min_id is None or min_id < 0 else min(int(min_id), self.num_frames)
+        max_id = self.num_frames if max_id is None or max_id > self.num_frames else int(max_id)
+        if max_id <= min_id:
+            return 0, 0
+        return int(self.prefix_counts[min_id]), int(self.prefix_counts[max_id])
+
+    def sample(self, num_ids=1, min_id=None, max_id=None):
+        """ Samples num_ids visible frames (with replacement) with min_id <= frame < max_id. Returns None if there is no
+        visible frame in the range."""
+        start, end = self.id_range(min_id, max_id)
+        if end == start:
+            return None
+        return [int(self.visible_ids[i]) for i in random.choices(range(start, end), k=num_ids)]
+
+
+class EligibleSequences:
+    """ Samples the sequences of a video dataset with more than min_visible_frames visible frames and at least
+    min_length frames. If all sequences are in the annotation index of the dataset, the eligible sequences are read
+    from it at once. Otherwise, a sequence is checked the first time it is sampled, and sampled again if it is not
+    eligible, so that the samplers do not read the annotations of every sequence when they are constructed. The
+    sequences found to be eligible or not are remembered.
+
+    args:
+        dataset - The video dataset.
+        min_visible_frames - The sequences need more visible frames than this.
+        min_length - Minimum number of frames of the sequences.
+    """
+    def __init__(self, dataset, min_visible_frames, min_length=0):
+        self.dataset = dataset
+        self.min_visible_frames = min_visible_frames
+        self.min_length = min_length
+
+        self.num_sequences = dataset.get_num_sequences()
+        self.seq_ids = self._eligible_from_annotation_index()
+        self.eligible = set()
+        self.not_eligible = set()
+
+    def _eligible_from_annotation_index(self):
+        """ Ids of the eligible sequences, or None if they are not all in the annotation index of the dataset."""
+        anno_index = getattr(self.dataset, 'annotation_index', None)
+        if anno_index is None or 'visible' not in anno_index.keys:
+            return None
+
+        seq_names = [self.dataset._get_sequence_name(seq_id) for seq_id in range(self.num_sequences)]
+        if not all(seq_name in anno_index for seq_name in seq_names):
+            return None
+
+        lengths, num_visible = anno_index.count_frames(seq_names, 'visible')
+        seq_ids = np.flatnonzero((num_visible > self.min_visible_frames) & (lengths >= self.min_length)).tolist()
+        if len(seq_ids) == 0:
+            raise ValueError('No sequence of the dataset {} has enough visible frames.'.format(self.dataset.get_name()))
+        return seq_ids
+
+    def _is_eligible(self, seq_id):
+        visible = self.dataset.get_sequence_info(seq_id)['visible']
+        return visible.type(torch.int64).sum().item() > self.min_visible_frames and len(visible) >= self.min_length
+
+    def sample(self):
+        """ Samples an eligible sequence uniformly."""
+        if self.seq_ids is not None:
+            return random.choice(self.seq_ids)
+
+        while len(self.not_eligible) < self.num_sequences:
+            seq_id = random.randint(0, self.num_sequences - 1)
+            if seq_id in self.eligible:
+                return seq_id
+            if seq_id in self.not_eligible:
+                continue
+
+            if self._is_eligible(seq_id):
+                self.eligible.add(seq_id)
+                return seq_id
+            self.not_eligible.add(seq_id)
+
+        raise ValueError('No sequence of the dataset {} has enough visible frames.'.format(self.dataset.get_name()))
+
+
+def _eligible_sequences(dataset, min_visible_frames, min_length=0):
+    """ EligibleSequences of a video dataset. None for image datasets, for which all sequences are used."""
+    if not dataset.is_video_sequence():
+        return None
+    return EligibleSequences(dataset, min_visible_frames, min_length)
+
+
+def _visible_frame_index(index_cache, dataset_id, seq_id, visible):
+    """ VisibleFrameIndex of a sequence. The indices are kept in index_cache, a dict of the sampler (one per data
+    loader worker), so that the index of a sequence is only built the first time it is sampled."""
+    key = (dataset_id, seq_id)
+    visible_index = index_cache.get(key)
+    if visible_index is None:
+        visible_index = index_cache[key] = VisibleFrameIndex(visible)
+    return visible_index
+
+
+def _sample_sequence(dataset, eligible_sequences):
+    """ Samples a sequence uniformly from the eligible sequences (all sequences if None)."""
+    if eligible_sequences is None:
+        return random.randint(0, dataset.get_num_sequences() - 1)
+    return eligible_sequences.sample()
+
+
 class TrackingSampler(torch.utils.data.Dataset):
     """ Class responsible for sampling frames from training sequences to form batches. Each training sample is a
     tuple consisting of i) a set of train frames, used to learn the DiMP classification model and obtain the
@@ -53,6 +176,11 @@ class TrackingSampler(torch.utils.data.Dataset):
         self.processing = processing
         self.frame_sample_mode = frame_sample_mode
 
+        # Sequences with enough visible frames
+        self.eligible_sequences = [_eligible_sequences(d, 2 * (num_test_frames + num_train_frames), min_length=20)
+                                 for d in self.datasets]
+        self.visible_frame_indices = {}
+
     def __len__(self):
         return self.samples_per_epoch
 
@@ -60,7 +188,8 @@ class TrackingSampler(torch.utils.data.Dataset):
         """ Samples num_ids frames between min_id and max_id for which target is visible
 
         args:
-            visible - 1d Tensor indicating whether target is visible for each frame
+            visible - VisibleFrameIndex of the sequence (or 1d Tensor indicating whether target is visible for each
+                      frame)
             num_ids - number of frames to be samples
             min_id - Minimum allowed frame number
             max_id - Maximum allowed frame number
@@ -70,18 +199,9 @@ class TrackingSampler(torch.utils.data.Dataset):
         """
         if num_ids == 0:
             return []
-        if min_id is None or min_id < 0:
-            min_id = 0
-        if max_id is None or max_id > len(visible):
-            max_id = len(visible)
-
-        valid_ids = [i for i in range(min_id, max_id) if visible[i]]
-
-        # No visible ids
-        if len(valid_ids) == 0:
-            return None
-
-        return random.choices(valid_ids, k=num_ids)
+        if not isinstance(visible, VisibleFrameIndex):
+            visible = VisibleFrameIndex(visible)
+        return visible.sample(num_ids, min_id, max_id)
 
     def __getitem__(self, index):
         """
@@ -93,25 +213,16 @@ class TrackingSampler(torch.utils.data.Dataset):
         """
 
         # Select a dataset
-        dataset = random.choices(self.datasets, self.p_datasets)[0]
+        dataset_id = random.choices(range(len(self.datasets)), self.p_datasets)[0]
+        dataset = self.datasets[dataset_id]
         is_video_dataset = dataset.is_video_sequence()
 
         # Sample a sequence with enough visible frames
-        enough_visible_frames = False
-        while not enough_visible_frames:
-            # Sample a sequence
-            seq_id = random.randint(0, dataset.get_num_sequences() - 1)
-
-            # Sample frames
-            seq_info_dict = dataset.get_sequence_info(seq_id)
-            visible = seq_info_dict['visible']
-
-            enough_visible_frames = visible.type(torch.int64).sum().item() > 2 * (
-                    self.num_test_frames + self.num_train_frames) and len(visible) >= 20
-
-            enough_visible_frames = enough_visible_frames or not is_video_dataset
+        seq_id = _sample_sequence(dataset, self.eligible_sequences[dataset_id])
+        seq_info_dict = dataset.get_sequence_info(seq_id)
 
         if is_video_dataset:
+            visible = _visible_frame_index(self.visible_frame_indices, dataset_id, seq_id, seq_info_dict['visible'])
             train_frame_ids = None
             test_frame_ids = None
             gap_increase = 0
@@ -237,6 +348,11 @@ class LWLSampler(torch.utils.data.Dataset):
 
         self.p_reverse = p_reverse
 
+        # Sequences with enough visible frames
+        self.eligible_sequences = [_eligible_sequences(d, 2 * (num_test_frames + num_train_frames))
+                                 for d in self.datasets]
+        self.visible_frame_indices = {}
+
     def __len__(self):
         return self.samples_per_epoch
 
@@ -244,7 +360,8 @@ class LWLSampler(torch.utils.data.Dataset):
         """ Samples num_ids frames between min_id and max_id for which target is visible
 
         args:
-            visible - 1d Tensor indicating whether target is visible for each frame
+            visible - VisibleFrameIndex of the sequence (or 1d Tensor indicating whether target is visible for each
+                      frame)
             num_ids - number of frames to be samples
             min_id - Minimum allowed frame number
             max_id - Maximum allowed frame number
@@ -252,18 +369,9 @@ class LWLSampler(torch.utils.data.Dataset):
         returns:
             list - List of sampled frame numbers. None if not sufficient visible frames could be found.
         """
-        if min_id is None or min_id < 0:
-            min_id = 0
-        if max_id is None or max_id > len(visible):
-            max_id = len(visible)
-
-        valid_ids = [i for i in range(min_id, max_id) if visible[i]]
-
-        # No visible ids
-        if len(valid_ids) == 0:
-            return None
-
-        return random.choices(valid_ids, k=num_ids)
+        if not isinstance(visible, VisibleFrameIndex):
+            visible = VisibleFrameIndex(visible)
+        return visible.sample(num_ids, min_id, max_id)
 
     def __getitem__(self, index):
         """
@@ -275,7 +383,8 @@ class LWLSampler(torch.utils.data.Dataset):
         """
 
         # Select a dataset
-        dataset = random.choices(self.datasets, self.p_datasets)[0]
+        dataset_id = random.choices(range(len(self.datasets)), self.p_datasets)[0]
+        dataset = self.datasets[dataset_id]
 
         is_video_dataset = dataset.is_video_sequence()
 
@@ -284,20 +393,11 @@ class LWLSampler(torch.utils.data.Dataset):
             reverse_sequence = random.random() < self.p_reverse
 
         # Sample a sequence with enough visible frames
-        enough_visible_frames = False
-        while not enough_visible_frames:
-            # Sample a sequence
-            seq_id = random.randint(0, dataset.get_num_sequences() - 1)
-
-            # Sample frames
-            seq_info_dict = dataset.get_sequence_info(seq_id)
-            visible = seq_info_dict['visible']
-
-            enough_visible_frames = visible.type(torch.int64).sum().item() > 2 * (self.num_test_frames + self.num_train_frames)
-
-            enough_visible_frames = enough_visible_frames or not is_video_dataset
+        seq_id = _sample_sequence(dataset, self.eligible_sequences[dataset_id])
+        seq_info_dict = dataset.get_sequence_info(seq_id)
 
         if is_video_dataset:
+            visible = _visible_frame_index(self.visible_frame_indices, dataset_id, seq_id, seq_info_dict['visible'])
             train_frame_ids = None
             test_frame_ids = None
             gap_increase = 0
@@ -407,6 +507,11 @@ class KYSSampler(torch.utils.data.Dataset):
 
         self.sample_occluded_sequences = sample_occluded_sequences
 
+        # Sequences with enough visible frames. Only sampling with missing targets is implemented, which requires one
+        # visible frame.
+        self.eligible_sequences = [_eligible_sequences(d, 0, min_length=20) for d in self.datasets]
+        self.visible_frame_indices = {}
+
     def __len__(self):
         return self.samples_per_epoch
 
@@ -414,7 +519,8 @@ class KYSSampler(torch.utils.data.Dataset):
         """ Samples num_ids frames between min_id and max_id for which target is visible
 
         args:
-            visible - 1d Tensor indicating whether target is visible for each frame
+            valid - VisibleFrameIndex of the sequence (or 1d Tensor indicating whether target is visible for each
+                    frame)
             num_ids - number of frames to be samples
             min_id - Minimum allowed frame number
             max_id - Maximum allowed frame number
@@ -422,25 +528,17 @@ class KYSSampler(torch.utils.data.Dataset):
         returns:
             list - List of sampled frame numbers. None if not sufficient visible frames could be found.
         """
-        if min_id is None or min_id < 0:
-            min_id = 0
-        if max_id is None or max_id > len(valid):
-            max_id = len(valid)
-
-        valid_ids = [i for i in range(min_id, max_id) if valid[i]]
-
-        # No visible ids
-        if len(valid_ids) == 0:
-            return None
-
-        return random.choices(valid_ids, k=num_ids)
+        if not isinstance(valid, VisibleFrameIndex):
+            valid = VisibleFrameIndex(valid)
+        return valid.sample(num_ids, min_id, max_id)
 
     def find_occlusion_end_frame(self, first_occ_frame, target_not_fully_visible):
-        for i in range(first_occ_frame, len(target_not_fully_visible)):
-            if not target_not_fully_visible[i]:
-                return i
+        first_occ_frame = int(first_occ_frame)
+        end_frames = (~target_not_fully_visible[first_occ_frame:]).nonzero()
+        if len(end_frames) == 0:
+            return len(target_not_fully_visible)
 
-        return len(target_not_fully_visible)
+        return first_occ_frame + end_frames[0].item()
 
     def __getitem__(self, index):
         """
@@ -454,7 +552,8 @@ class KYSSampler(torch.utils.data.Dataset):
         # Select a dataset
         p_datasets = self.p_datasets
 
-        dataset = random.choices(self.datasets, p_datasets)[0]
+        dataset_id = random.choices(range(len(self.datasets)), p_datasets)[0]
+        dataset = self.datasets[dataset_id]
         is_video_dataset = dataset.is_video_sequence()
 
         num_train_frames = self.sequence_sample_info['num_train_frames']
@@ -463,26 +562,15 @@ class KYSSampler(torch.utils.data.Dataset):
         allow_missing_target = self.sequence_sample_info['allow_missing_target']
         min_fraction_valid_frames = self.sequence_sample_info.get('min_fraction_valid_frames', 0.0)
 
-        if allow_missing_target:
-            min_visible_frames = 0
-        else:
+        if not allow_missing_target:
             raise NotImplementedError
 
-        valid_sequence = False
-
         # Sample a sequence with enough visible frames and get anno for the same
-        while not valid_sequence:
-            seq_id = random.randint(0, dataset.get_num_sequences() - 1)
-
-            seq_info_dict = dataset.get_sequence_info(seq_id)
-            visible = seq_info_dict['visible']
-            visible_ratio = seq_info_dict.get('visible_ratio', visible)
-
-            num_visible = visible.type(torch.int64).sum().item()
+        seq_id = _sample_sequence(dataset, self.eligible_sequences[dataset_id])
 
-            enough_visible_frames = not is_video_dataset or (num_visible > min_visible_frames and len(visible) >= 20)
-
-            valid_sequence = enough_visible_frames
+        seq_info_dict = dataset.get_sequence_info(seq_id)
+        visible_ratio = seq_info_dict.get('visible_ratio', seq_info_dict['visible'])
+        visible = _visible_frame_index(self.visible_frame_indices, dataset_id, seq_id, seq_info_dict['visible'])
 
         if self.sequence_sample_info['mode'] == 'Sequence':
             if is_video_dataset:
@@ -490,15 +578,15 @@ class KYSSampler(torch.utils.data.Dataset):
                 test_frame_ids = None
                 gap_increase = 0
 
+                occlusion_sampling = False
+                if dataset.has_occlusion_info() and self.sample_occluded_sequences:
+                    target_not_fully_visible = visible_ratio < 0.9
+                    if target_not_fully_visible.float().sum() > 0:
+                        occlusion_sampling = True
+
                 test_valid_image = torch.zeros(num_test_frames, dtype=torch.int8)
                 # Sample frame numbers in a causal manner, i.e. test_frame_ids > train_frame_ids
                 while test_frame_ids is None:
-                    occlusion_sampling = False
-                    if dataset.has_occlusion_info() and self.sample_occluded_sequences:
-                        target_not_fully_visible = visible_ratio < 0.9
-                        if target_not_fully_visible.float().sum() > 0:
-                            occlusion_sampling = True
-
                     if occlusion_sampling:
                         first_occ_frame = target_not_fully_visible.nonzero()[0]
 
@@ -656,7 +744,8 @@ class SequentialTargetCandidateMatchingSampler(torch.utils.data.Dataset):
         """ Samples num_ids frames between min_id and max_id for which dumped data is useful
 
         args:
-            visible - 1d Tensor indicating whether target is visible for each frame
+            visible - VisibleFrameIndex of the sequence (or 1d Tensor indicating whether target is visible for each
+                      frame)
             num_ids - number of frames to be sampled
             min_id - Minimum allowed frame number
             max_id - Maximum allowed frame number
@@ -668,20 +757,21 @@ class SequentialTargetCandidateMatchingSampler(torch.utils.data.Dataset):
             return []
         if min_id is None or min_id < 2:
             min_id = 2
-        if max_id is None or max_id > len(visible):
-            max_id = len(visible)
+        if not isinstance(visible, VisibleFrameIndex):
+            visible = VisibleFrameIndex(visible)
 
-        valid_ids = [i for i in range(min_id, max_id) if visible[i]]
+        start, end = visible.id_range(min_id, max_id)
 
         # No visible ids
-        if len(valid_ids) == 0:
+        if end == start:
             return None
 
         num_begin = num_ids//2
         num_end = num_ids - num_ids//2
-        ids_begin = random.sample(valid_ids[:len(valid_ids)//2], k=num_begin)
-        ids_end = random.sample(valid_ids[len(valid_ids)//2:], k=num_end)
-        return ids_begin + ids_end
+        middle = start + (end - start)//2
+        ids_begin = random.sample(range(start, middle), k=num_begin)
+        ids_end = random.sample(range(middle, end), k=num_end)
+        return [int(visible.visible_ids[i]) for i in ids_begin + ids_end]
 
 
     def __getitem__(self, index):
@@ -16,3 +16,4 @@ from .sbd import SBD
 from .synthetic_video import SyntheticVideo
 from .synthetic_video_blend import SyntheticVideoBlend
 from .lasot_candidate_matching import LasotCandidateMatching
+from .crop_cache import CropCacheDataset
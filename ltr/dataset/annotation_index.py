@@ -0,0 +1,144 @@
+import os
+import json
+import uuid
+import hashlib
+import numpy as np
+import torch
+
+
+_index_file = 'index.json'
+_annotations_file = 'annotations.npy'
+
+
+class AnnotationIndex:
+    """The per-frame annotations (e.g. bbox, valid and visible) of all sequences of a video dataset, packed into one
+    memory-mapped structured array with one element per frame. The frames of a sequence are the slice given by its
+    offsets in the index, so that get_sequence_info does not need to parse the annotation files. The array is opened
+    read-only, and shared between the DataLoader workers through the page cache. The index file names the array file
+    it belongs to, so that the index can be replaced with a single rename.
+    args:
+        path - Directory of the index, containing the annotation array and the index file.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, _index_file), 'r') as f:
+            index = json.load(f)
+
+        self.keys = index['keys']
+        self.offsets = {name: tuple(offset) for name, offset in zip(index['sequences'], index['offsets'])}
+        self.annotations_file = index.get('annotations', _annotations_file)
+        self._annotations = None
+
+    @property
+    def annotations(self):
+        # Opened on first use, so that each DataLoader worker maps the file itself
+        if self._annotations is None:
+            self._annotations = np.load(os.path.join(self.path, self.annotations_file), mmap_mode='r')
+        return self._annotations
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_annotations'] = None
+        return state
+
+    def __contains__(self, seq_name):
+        return seq_name in self.offsets
+
+    def get_sequence_info(self, seq_name):
+        """The annotations of a sequence, as a dict of tensors in the format of get_sequence_info."""
+        start, end = self.offsets[seq_name]
+        seq_anno = self.annotations[start:end]
+        return {key: torch.from_numpy(np.array(seq_anno[key])) for key in self.keys}
+
+    def count_frames(self, seq_names, key='visible'):
+        """The number of frames of each of the sequences, and the number of frames in which the annotation key (e.g.
+        visible) is set. Reads the key of all frames at once, instead of calling get_sequence_info per sequence."""
+        offsets = np.array([self.offsets[seq_name] for seq_name in seq_names], dtype=np.int64).reshape(-1, 2)
+        flags = np.asarray(self.annotations[key]).reshape(len(self.annotations), -1).any(axis=1)
+        prefix_counts = np.concatenate(([0], np.cumsum(flags)))
+        return offsets[:, 1] - offsets[:, 0], prefix_counts[offsets[:, 1]] - prefix_counts[offsets[:, 0]]
+
+
+def annotation_index_dir(cache_dir, dataset):
+    """Directory of the annotation index of a dataset. It depends on the root, so that e.g. the GOT-10k train and val
+    folders get separate indices."""
+    root_hash = hashlib.sha1(os.path.abspath(dataset.root).encode()).hexdigest()[:8]
+    return os.path.join(cache_dir, '{}_{}'.format(dataset.get_name(), root_hash))
+
+
+def _to_numpy(value):
+    return value.numpy() if torch.is_tensor(value) else np.asarray(value)
+
+
+def write_annotation_index(path, seq_names, read_sequence_info, existing_index=None):
+    """Read the annotations of the sequences and pack them into an annotation index.
+    args:
+        path - Directory of the index.
+        seq_names - Names of the sequences.
+        read_sequence_info - Function reading the annotations of a sequence name, as a dict of tensors.
+        existing_index - AnnotationIndex to take the sequences from that it already contains.
+    returns:
+        AnnotationIndex - The new index.
+    """
+    os.makedirs(path, exist_ok=True)
+
+    seq_infos = []
+    for seq_name in seq_names:
+        if existing_index is not None and seq_name in existing_index:
+            seq_info = existing_index.get_sequence_info(seq_name)
+        else:
+            seq_info = read_sequence_info(seq_name)
+        seq_infos.append({key: _to_numpy(value) for key, value in seq_info.items()})
+
+    keys = list(seq_infos[0].keys())
+    dtype = np.dtype([(key, seq_infos[0][key].dtype, seq_infos[0][key].shape[1:]) for key in keys], align=True)
+
+    lengths = [seq_info[keys[0]].shape[0] for seq_info in seq_infos]
+    ends = np.cumsum(lengths).tolist()
+    offsets = [(end - length, end) for end, length in zip(ends, lengths)]
+
+    # The annotations are written to a new file, and the index naming it is moved into place with a single rename.
+    # Readers see either the old or the new index, and several processes can build the index at the same time. The
+    # previous annotation files are kept, since the AnnotationIndex objects of other processes may still open them.
+    annotations_file = 'annotations_{}.npy'.format(uuid.uuid4().hex)
+    annotations = np.lib.format.open_memmap(os.path.join(path, annotations_file), mode='w+', dtype=dtype,
+                                            shape=(sum(lengths),))
+    for seq_info, (start, end) in zip(seq_infos, offsets):
+        for key in keys:
+            annotations[key][start:end] = seq_info[key]
+    annotations.flush()
+    del annotations
+
+    index = {'keys': keys, 'sequences': list(seq_names), 'offsets': offsets, 'annotations': annotations_file}
+    tmp_file = os.path.join(path, _index_file + '.{}.tmp'.format(os.getpid()))
+    with open(tmp_file, 'w') as f:
+        json.dump(index, f)
+    os.replace(tmp_file, os.path.join(path, _index_file))
+
+    return AnnotationIndex(path)
+
+
+def load_annotation_index(dataset, cache_dir, seq_names):
+    """The annotation index of a dataset, containing the given sequences. It is built on first use, and extended when
+    sequences are missing. Delete the index directory after changing the annotation files of the dataset.
+    args:
+        dataset - The video dataset, implementing _read_sequence_info(seq_id).
+        cache_dir - Root directory of the annotation indices.
+        seq_names - Names of the sequences of the dataset, in the order of the seq_ids.
+    """
+    path = annotation_index_dir(cache_dir, dataset)
+
+    anno_index = None
+    if os.path.isfile(os.path.join(path, _index_file)):
+        anno_index = AnnotationIndex(path)
+
+    missing = [seq_id for seq_id, seq_name in enumerate(seq_names) if anno_index is None or seq_name not in anno_index]
+    if len(missing) == 0:
+        return anno_index
+
+    print('Building the annotation index of {} ({} sequences)'.format(dataset.get_name(), len(missing)))
+    seq_to_id = {seq_names[seq_id]: seq_id for seq_id in missing}
+    all_names = list(seq_names) if anno_index is None else \
+        list(anno_index.offsets.keys()) + [seq_names[seq_id] for seq_id in missing]
+    return write_annotation_index(path, all_names, lambda seq_name: dataset._read_sequence_info(seq_to_id[seq_name]),
+                                  anno_index)
@@ -1,5 +1,15 @@
 import torch.utils.data
 from ltr.data.image_loader import jpeg4py_loader
+from ltr.admin.environment import env_settings
+from ltr.dataset.annotation_index import load_annotation_index
+
+
+def _default_annotation_cache_dir():
+    """The annotation_cache_dir of the local.py, or '' (no annotation index) if it is not set."""
+    try:
+        return getattr(env_settings(), 'annotation_cache_dir', '')
+    except RuntimeError:
+        return ''
 
 
 class BaseVideoDataset(torch.utils.data.Dataset):
@@ -18,6 +28,7 @@ class BaseVideoDataset(torch.utils.data.Dataset):
 
         self.sequence_list = []     # Contains the list of sequences.
         self.class_list = []
+        self.annotation_index = None
 
     def __len__(self):
         """ Returns size of the dataset
@@ -80,6 +91,23 @@ class BaseVideoDataset(torch.utils.data.Dataset):
     def has_segmentation_info(self):
         return False
 
+    def _init_annotation_index(self, cache_dir=None):
+        """ Reads get_sequence_info from a memory-mapped annotation index (see ltr.dataset.annotation_index) instead of
+        the annotation files. The index is built on first use. Requires the methods _get_sequence_name and
+        _read_sequence_info of the dataset.
+
+        args:
+            cache_dir - Root directory of the annotation indices. If None, the annotation_cache_dir of the local.py is
+                        used. No index is used if it is empty.
+        """
+        if cache_dir is None:
+            cache_dir = _default_annotation_cache_dir()
+        if not cache_dir:
+            return
+
+        seq_names = [self._get_sequence_name(seq_id) for seq_id in range(self.get_num_sequences())]
+        self.annotation_index = load_annotation_index(self, cache_dir, seq_names)
+
     def get_sequence_info(self, seq_id):
         """ Returns information about a particular sequences,
 
@@ -0,0 +1,324 @@
+import os
+import json
+import numpy as np
+import cv2 as cv
+import torch
+import ltr.data.processing_utils as prutils
+from ltr.admin.environment import env_settings
+from ltr.data.image_loader import DeferredImage
+from .base_video_dataset import BaseVideoDataset
+from .annotation_index import annotation_index_dir
+
+
+_index_file = 'index.json'
+_crops_file = 'crops_{:04d}.npy'
+_regions_file = 'regions_{:04d}.npy'
+_shard_file = 'shard_{:04d}.json'
+
+
+class CachedCrop(DeferredImage):
+    """ A frame of which only a crop around the target is available, read from a crop cache. Like a DeferredImage, it
+    is cropped by ltr.data.processing_utils in image co-ordinates, and the region is then taken from the cached crop.
+
+    args:
+        image - The cached crop.
+        region - Region [x1, y1, w, h] of the frame covered by the cached crop.
+        image_shape - Shape (H, W, 3) of the frame.
+    """
+    def __init__(self, image, region, image_shape):
+        super().__init__(None)
+        self.image = image
+        self.region = region
+        self._shape = image_shape
+
+    def decode(self):
+        raise RuntimeError('The full frame is not available for cached crops. Only pixelwise joint transforms can be '
+                           'used with a CropCacheDataset.')
+
+    def crop(self, x1, y1, x2, y2, output_sz):
+        # Affine map from the pixels of the output to the pixels of the cached crop, with the pixel centers as in
+        # cv.resize. Parts outside the cached crop replicate its boundary.
+        scale_x = self.image.shape[1] / self.region[2]
+        scale_y = self.image.shape[0] / self.region[3]
+        sx = (x2 - x1) * scale_x / output_sz[0]
+        sy = (y2 - y1) * scale_y / output_sz[1]
+        warp = np.array([[sx, 0, 0.5 * sx + (x1 - self.region[0]) * scale_x - 0.5],
+                         [0, sy, 0.5 * sy + (y1 - self.region[1]) * scale_y - 0.5]])
+        return cv.warpAffine(self.image, warp, tuple(output_sz), flags=cv.INTER_LINEAR | cv.WARP_INVERSE_MAP,
+                             borderMode=cv.BORDER_REPLICATE)
+
+
+class CropCache:
+    """Crops around the target in every frame of a video dataset, extracted offline by write_crop_cache. The crop of a
+    frame covers oversize times the search area (search_area_factor^2 times the target area) around the target,
+    shifted inside the frame as in ltr.data.processing_utils.sample_target_adaptive, and is resized to
+    oversize * output_sz. The crops are stored in shards, each a memory-mapped uint8 array of shape
+    (num_frames, crop_sz, crop_sz, 3), together with the regions of the frames covered by the crops and the frame
+    sizes. The frames of a sequence are a contiguous range of rows of one shard.
+    args:
+        path - Directory of the cache, containing the shards and the index file.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, _index_file), 'r') as f:
+            index = json.load(f)
+
+        self.settings = index['settings']
+        self.offsets = {name: tuple(offset) for name, offset in zip(index['sequences'], index['offsets'])}
+        self._shards = {}
+
+    def _shard(self, shard_id):
+        # Opened on first use, so that each DataLoader worker maps the files itself
+        if shard_id not in self._shards:
+            self._shards[shard_id] = (np.load(os.path.join(self.path, _crops_file.format(shard_id)), mmap_mode='r'),
+                                      np.load(os.path.join(self.path, _regions_file.format(shard_id)), mmap_mode='r'))
+        return self._shards[shard_id]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_shards'] = {}
+        return state
+
+    def __contains__(self, seq_name):
+        return seq_name in self.offsets
+
+    def get_frames(self, seq_name, frame_ids):
+        """The frames of a sequence, as a list of CachedCrops."""
+        shard_id, start, end = self.offsets[seq_name]
+        crops, regions = self._shard(shard_id)
+        frame_list = []
+        for f_id in frame_ids:
+            region = regions[start + f_id].tolist()
+            frame_list.append(CachedCrop(np.array(crops[start + f_id]), region[:4],
+                                         (int(region[4]), int(region[5]), 3)))
+        return frame_list
+
+
+def crop_cache_dir(cache_dir, dataset, search_area_factor, output_sz, oversize):
+    """Directory of the crop cache of a dataset, for the given crop settings."""
+    return '{}_{:g}_{}_{:g}'.format(annotation_index_dir(cache_dir, dataset), search_area_factor, output_sz, oversize)
+
+
+def cached_crop_size(output_sz, oversize):
+    return int(round(output_sz * oversize))
+
+
+def _extract_boxes(seq_info):
+    """The target boxes about which the crops of a sequence are extracted. Frames without a valid box use the box of the
+    previous valid frame, or of the first valid frame. None if no frame is valid."""
+    bbox = seq_info['bbox']
+    valid = seq_info['valid'].bool() if 'valid' in seq_info else (bbox[:, 2] > 0) & (bbox[:, 3] > 0)
+    if not valid.any():
+        return None
+
+    frame_ids = torch.where(valid, torch.arange(len(valid)), torch.zeros_like(valid, dtype=torch.long))
+    frame_ids = torch.cummax(frame_ids, dim=0)[0]
+    frame_ids[:valid.nonzero()[0, 0]] = valid.nonzero()[0, 0]
+    return bbox[frame_ids]
+
+
+def plan_crop_cache_shards(dataset, shard_size=10000):
+    """Splits the sequences of a dataset into shards of about shard_size frames. Sequences without valid boxes are not
+    cached. Returns a list with the list of seq_ids of each shard."""
+    shards = [[]]
+    num_frames = 0
+    for seq_id in range(dataset.get_num_sequences()):
+        seq_info = dataset.get_sequence_info(seq_id)
+        if _extract_boxes(seq_info) is None:
+            continue
+        if num_frames >= shard_size:
+            shards.append([])
+            num_frames = 0
+        shards[-1].append(seq_id)
+        num_frames += seq_info['bbox'].shape[0]
+    return [shard for shard in shards if len(shard) > 0]
+
+
+def _read_json(file):
+    """The content of a json file, or None if it does not exist or cannot be read."""
+    try:
+        with open(file, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_crop_cache_shard(dataset, path, shard_id, seq_ids, search_area_factor, output_sz, oversize):
+    """Extract and write the crops of the sequences of a shard. Each shard has a manifest with the settings, sequence
+    names and lengths it was written with. Shards with the same manifest are skipped, so that an interrupted
+    write_crop_cache can be resumed, while shards written with another plan or other settings are rewritten. Returns
+    the (shard_id, start, end) rows of the sequences."""
+    crop_sz = cached_crop_size(output_sz, oversize)
+    seq_infos = [dataset.get_sequence_info(seq_id) for seq_id in seq_ids]
+
+    lengths = [seq_info['bbox'].shape[0] for seq_info in seq_infos]
+    ends = np.cumsum(lengths).tolist()
+    offsets = [(shard_id, end - length, end) for end, length in zip(ends, lengths)]
+
+    manifest = {'settings': {'search_area_factor': search_area_factor, 'output_sz': output_sz, 'oversize': oversize,
+                             'crop_sz': crop_sz},
+                'sequences': [dataset._get_sequence_name(seq_id) for seq_id in seq_ids], 'lengths': lengths}
+
+    crops_file = os.path.join(path, _crops_file.format(shard_id))
+    regions_file = os.path.join(path, _regions_file.format(shard_id))
+    shard_file = os.path.join(path, _shard_file.format(shard_id))
+    if os.path.isfile(regions_file) and _read_json(shard_file) == manifest:
+        return offsets
+
+    # Written to temporary files first, the manifest marks the shard as complete
+    if os.path.isfile(shard_file):
+        os.remove(shard_file)
+    tmp_suffix = '.{}.tmp'.format(os.getpid())
+    crops = np.lib.format.open_memmap(crops_file + tmp_suffix, mode='w+', dtype=np.uint8,
+                                      shape=(sum(lengths), crop_sz, crop_sz, 3))
+    # Region [x1, y1, w, h] covered by the crop, and the frame size [H, W]
+    regions = np.zeros((sum(lengths), 6), dtype=np.float32)
+
+    for seq_id, seq_info, (_, start, _) in zip(seq_ids, seq_infos, offsets):
+        extract_boxes = _extract_boxes(seq_info)
+        for f_id in range(seq_info['bbox'].shape[0]):
+            frames, _, _ = dataset.get_frames(seq_id, [f_id], seq_info)
+            crop, region = prutils.sample_target_adaptive(frames[0], extract_boxes[f_id].float(),
+                                                          search_area_factor * oversize, crop_sz, mode='replicate')
+            crops[start + f_id] = crop
+            regions[start + f_id, :4] = region.numpy()
+            regions[start + f_id, 4:] = frames[0].shape[:2]
+    crops.flush()
+    del crops
+
+    os.replace(crops_file + tmp_suffix, crops_file)
+    np.save(regions_file + tmp_suffix, regions)
+    os.replace(regions_file + tmp_suffix + '.npy', regions_file)
+
+    with open(shard_file + tmp_suffix, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(shard_file + tmp_suffix, shard_file)
+    return offsets
+
+
+def write_crop_cache(dataset, path, search_area_factor, output_sz, oversize=1.5, shard_size=10000, num_workers=0):
+    """Extract the crops of all frames of a dataset into a crop cache, see CropCache.
+    args:
+        dataset - The video dataset, implementing _get_sequence_name(seq_id).
+        path - Directory of the cache.
+        search_area_factor, output_sz - The search area settings of the processing the cache is used with.
+        oversize - Size of the cached crops relative to the search area. Bounds the center and scale jitter that can
+                   be applied to the cached crops, see ltr.data.processing.CropCacheDiMPProcessing.
+        shard_size - Approximate number of frames per shard.
+        num_workers - Number of processes extracting the shards. 0 extracts them in the main process.
+    returns:
+        CropCache - The new cache.
+    """
+    os.makedirs(path, exist_ok=True)
+    shards = plan_crop_cache_shards(dataset, shard_size)
+
+    args = [(dataset, path, shard_id, seq_ids, search_area_factor, output_sz, oversize)
+            for shard_id, seq_ids in enumerate(shards)]
+    if num_workers > 0:
+        import multiprocessing
+        with multiprocessing.Pool(num_workers) as pool:
+            shard_offsets = pool.starmap(write_crop_cache_shard, args)
+    else:
+        shard_offsets = [write_crop_cache_shard(*a) for a in args]
+
+    seq_names = [dataset._get_sequence_name(seq_id) for seq_ids in shards for seq_id in seq_ids]
+    offsets = [offset for offsets in shard_offsets for offset in offsets]
+    index = {'settings': {'search_area_factor': search_area_factor, 'output_sz': output_sz, 'oversize': oversize,
+                          'crop_sz': cached_crop_size(output_sz, oversize)},
+             'sequences': seq_names, 'offsets': offsets}
+
+    tmp_file = os.path.join(path, _index_file + '.{}.tmp'.format(os.getpid()))
+    with open(tmp_file, 'w') as f:
+        json.dump(index, f)
+    os.replace(tmp_file, os.path.join(path, _index_file))
+
+    return CropCache(path)
+
+
+def _default_crop_cache_dir():
+    """The crop_cache_dir of the local.py, or '' if it is not set."""
+    try:
+        return getattr(env_settings(), 'crop_cache_dir', '')
+    except RuntimeError:
+        return ''
+
+
+class CropCacheDataset(BaseVideoDataset):
+    """ Reads the frames of a video dataset from its crop cache (see CropCache), instead of decoding the full frames.
+    The frames are CachedCrops, and the annotations are those of the dataset. The dataset is used with a processing
+    that keeps the search regions inside the cached crops, see ltr.data.processing.CropCacheDiMPProcessing. Sequences
+    that are not in the cache have no visible frames, and are not sampled.
+
+    Create the cache with pytracking/util_scripts/create_crop_cache.py, using the same settings.
+    """
+
+    def __init__(self, dataset, search_area_factor, output_sz, oversize=1.5, cache_dir=None):
+        """
+        args:
+            dataset - The video dataset, implementing _get_sequence_name(seq_id) (e.g. Lasot, Got10k, TrackingNet).
+            search_area_factor, output_sz, oversize - Settings of the crop cache, see write_crop_cache.
+            cache_dir - Root directory of the crop caches. If None, the crop_cache_dir of the local.py is used.
+        """
+        super().__init__(dataset.get_name(), dataset.root, dataset.image_loader)
+        self.dataset = dataset
+
+        if cache_dir is None:
+            cache_dir = _default_crop_cache_dir()
+        if not cache_dir:
+            raise ValueError('No cache directory given and the crop_cache_dir is not set in the local.py.')
+
+        path = crop_cache_dir(cache_dir, dataset, search_area_factor, output_sz, oversize)
+        if not os.path.isfile(os.path.join(path, _index_file)):
+            raise ValueError('No crop cache of {} at {}. Create it with pytracking/util_scripts/create_crop_cache.py.'
+                             .format(dataset.get_name(), path))
+        self.crop_cache = CropCache(path)
+        self.sequence_names = [dataset._get_sequence_name(seq_id) for seq_id in range(dataset.get_num_sequences())]
+
+    def get_name(self):
+        return self.dataset.get_name()
+
+    def is_video_sequence(self):
+        return self.dataset.is_video_sequence()
+
+    def is_synthetic_video_dataset(self):
+        return self.dataset.is_synthetic_video_dataset()
+
+    def get_num_sequences(self):
+        return self.dataset.get_num_sequences()
+
+    def has_class_info(self):
+        return self.dataset.has_class_info()
+
+    def has_occlusion_info(self):
+        return self.dataset.has_occlusion_info()
+
+    def get_num_classes(self):
+        return self.dataset.get_num_classes()
+
+    def get_class_list(self):
+        return self.dataset.get_class_list()
+
+    def get_sequences_in_class(self, class_name):
+        return self.dataset.get_sequences_in_class(class_name)
+
+    def get_sequence_info(self, seq_id):
+        seq_info = self.dataset.get_sequence_info(seq_id)
+        if self.sequence_names[seq_id] not in self.crop_cache:
+            seq_info = {key: torch.zeros_like(value) if key in ('valid', 'visible') else value
+                        for key, value in seq_info.items()}
+        return seq_info
+
+    def get_frames(self, seq_id, frame_ids, anno=None):
+        if anno is None:
+            anno = self.get_sequence_info(seq_id)
+
+        # Only the meta information, no frames are decoded
+        _, _, object_meta = self.dataset.get_frames(seq_id, [], anno)
+
+        frame_list = self.crop_cache.get_frames(self.sequence_names[seq_id], frame_ids)
+
+        anno_frames = {}
+        for key, value in anno.items():
+            anno_frames[key] = [value[f_id, ...].clone() for f_id in frame_ids]
+
+        return frame_list, anno_frames, object_meta
@@ -23,7 +23,8 @@ class Got10k(BaseVideoDataset):
     Download dataset from http://got-10k.aitestunion.com/downloads
     """
 
-    def __init__(self, root=None, image_loader=jpeg4py_loader, split=None, seq_ids=None, data_fraction=None):
+    def __init__(self, root=None, image_loader=jpeg4py_loader, split=None, seq_ids=None, data_fraction=None,
+                 annotation_cache_dir=None):
         """
         args:
             root - path to the got-10k training data. Note: This should point to the 'train' folder inside GOT-10k
@@ -35,6 +36,8 @@ class Got10k(BaseVideoDataset):
             seq_ids - List containing the ids of the videos to be used for training. Note: Only one of 'split' or 'seq_ids'
                         options can be used at the same time.
             data_fraction - Fraction of dataset to be used. The complete dataset is used by default
+            annotation_cache_dir - Directory of the annotation index, see BaseVideoDataset._init_annotation_index. If
+                                   None, the annotation_cache_dir of the local.py is used.
         """
         root = env_settings().got10k_dir if root is None else root
         super().__init__('GOT10k', root, image_loader)
@@ -72,6 +75,8 @@ class Got10k(BaseVideoDataset):
         self.class_list = list(self.seq_per_class.keys())
         self.class_list.sort()
 
+        self._init_annotation_index(annotation_cache_dir)
+
     def get_name(self):
         return 'got10k'
 
@@ -146,7 +151,10 @@ class Got10k(BaseVideoDataset):
     def _get_sequence_path(self, seq_id):
         return os.path.join(self.root, self.sequence_list[seq_id])
 
-    def get_sequence_info(self, seq_id):
+    def _get_sequence_name(self, seq_id):
+        return self.sequence_list[seq_id]
+
+    def _read_sequence_info(self, seq_id):
         seq_path = self._get_sequence_path(seq_id)
         bbox = self._read_bb_anno(seq_path)
 
@@ -156,6 +164,11 @@ class Got10k(BaseVideoDataset):
 
         return {'bbox': bbox, 'valid': valid, 'visible': visible, 'visible_ratio': visible_ratio}
 
+    def get_sequence_info(self, seq_id):
+        if self.annotation_index is not None:
+            return self.annotation_index.get_sequence_info(self._get_sequence_name(seq_id))
+        return self._read_sequence_info(seq_id)
+
     def _get_frame_path(self, seq_path, frame_id):
         return os.path.join(seq_path, '{:08}.jpg'.format(frame_id+1))    # frames start from 1
 
@@ -23,7 +23,8 @@ class Lasot(BaseVideoDataset):
     Download the dataset from https://cis.temple.edu/lasot/download.html
     """
 
-    def __init__(self, root=None, image_loader=jpeg4py_loader, vid_ids=None, split=None, data_fraction=None):
+    def __init__(self, root=None, image_loader=jpeg4py_loader, vid_ids=None, split=None, data_fraction=None,
+                 annotation_cache_dir=None):
         """
         args:
             root - path to the lasot dataset.
@@ -34,6 +35,8 @@ class Lasot(BaseVideoDataset):
             split - If split='train', the official train split (protocol-II) is used for training. Note: Only one of
                     vid_ids or split option can be used at a time.
             data_fraction - Fraction of dataset to be used. The complete dataset is used by default
+            annotation_cache_dir - Directory of the annotation index, see BaseVideoDataset._init_annotation_index. If
+                                   None, the annotation_cache_dir of the local.py is used.
         """
         root = env_settings().lasot_dir if root is None else root
         super().__init__('LaSOT', root, image_loader)
@@ -49,6 +52,8 @@ class Lasot(BaseVideoDataset):
 
         self.seq_per_class = self._build_class_list()
 
+        self._init_annotation_index(annotation_cache_dir)
+
     def _build_sequence_list(self, vid_ids=None, split=None):
         if split is not None:
             if vid_ids is not None:
@@ -121,7 +126,10 @@ class Lasot(BaseVideoDataset):
 
         return os.path.join(self.root, class_name, class_name + '-' + vid_id)
 
-    def get_sequence_info(self, seq_id):
+    def _get_sequence_name(self, seq_id):
+        return self.sequence_list[seq_id]
+
+    def _read_sequence_info(self, seq_id):
         seq_path = self._get_sequence_path(seq_id)
         bbox = self._read_bb_anno(seq_path)
 
@@ -130,6 +138,11 @@ class Lasot(BaseVideoDataset):
 
         return {'bbox': bbox, 'valid': valid, 'visible': visible}
 
+    def get_sequence_info(self, seq_id):
+        if self.annotation_index is not None:
+            return self.annotation_index.get_sequence_info(self._get_sequence_name(seq_id))
+        return self._read_sequence_info(seq_id)
+
     def _get_frame_path(self, seq_path, frame_id):
         return os.path.join(seq_path, 'img', '{:08}.jpg'.format(frame_id+1))    # frames start from 1
 
@@ -14,7 +14,8 @@ class LasotVOS(Lasot):
     """
 
     def __init__(self, anno_path=None, split='train'):
-        super().__init__(split=split)
+        # The annotations are subsampled, so the annotation index of LaSOT can not be used
+        super().__init__(split=split, annotation_cache_dir='')
         self.anno_path = anno_path
         self.skip_interval = 5
 
@@ -43,7 +43,8 @@ class TrackingNet(BaseVideoDataset):
 
     Download the dataset using the toolkit https://github.com/SilvioGiancola/TrackingNet-devkit.
     """
-    def __init__(self, root=None, image_loader=jpeg4py_loader, set_ids=None, data_fraction=None):
+    def __init__(self, root=None, image_loader=jpeg4py_loader, set_ids=None, data_fraction=None,
+                 annotation_cache_dir=None):
         """
         args:
             root        - The path to the TrackingNet folder, containing the training sets.
@@ -52,6 +53,8 @@ class TrackingNet(BaseVideoDataset):
             set_ids (None) - List containing the ids of the TrackingNet sets to be used for training. If None, all the
                             sets (0 - 11) will be used.
             data_fraction - Fraction of dataset to be used. The complete dataset is used by default
+            annotation_cache_dir - Directory of the annotation index, see BaseVideoDataset._init_annotation_index. If
+                                   None, the annotation_cache_dir of the local.py is used.
         """
         root = env_settings().trackingnet_dir if root is None else root
         super().__init__('TrackingNet', root, image_loader)
@@ -74,6 +77,8 @@ class TrackingNet(BaseVideoDataset):
         self.class_list = list(self.seq_per_class.keys())
         self.class_list.sort()
 
+        self._init_annotation_index(annotation_cache_dir)
+
     def _load_class_info(self):
         ltr_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..')
         class_map_path = os.path.join(ltr_path, 'data_specs', 'trackingnet_classmap.txt')
@@ -108,13 +113,22 @@ class TrackingNet(BaseVideoDataset):
                              low_memory=False).values
         return torch.tensor(gt)
 
-    def get_sequence_info(self, seq_id):
+    def _get_sequence_name(self, seq_id):
+        set_id, vid_name = self.sequence_list[seq_id]
+        return 'TRAIN_{}/{}'.format(set_id, vid_name)
+
+    def _read_sequence_info(self, seq_id):
         bbox = self._read_bb_anno(seq_id)
 
         valid = (bbox[:, 2] > 0) & (bbox[:, 3] > 0)
         visible = valid.clone().byte()
         return {'bbox': bbox, 'valid': valid, 'visible': visible}
 
+    def get_sequence_info(self, seq_id):
+        if self.annotation_index is not None:
+            return self.annotation_index.get_sequence_info(self._get_sequence_name(seq_id))
+        return self._read_sequence_info(seq_id)
+
     def _get_frame(self, seq_id, frame_id):
         set_id = self.sequence_list[seq_id][0]
         vid_name = self.sequence_list[seq_id][1]
@@ -85,11 +85,20 @@ def run(settings):
     loader_val = LTRLoader('val_self_sup', dataset_val, training=False, batch_size=settings.batch_size,
                            num_workers=settings.num_workers, shuffle=False, drop_last=True, stack_dim=1)
 
+    # The number of detected target candidates varies between the samples of the real validation sets, so the
+    # candidate fields are packed along the candidate dimension instead of stacked
+    packed_keys_real = {key: 1 for key in ['candidate_img_coords0', 'candidate_img_coords1', 'candidate_tsm_coords0',
+                                           'candidate_tsm_coords1', 'candidate_scores0', 'candidate_scores1',
+                                           'candidate_valid0', 'candidate_valid1', 'gt_matches0', 'gt_matches1',
+                                           'gt_assignment']}
+
     loader_val_realHH = LTRLoader('val_HH', dataset_val_realHH, training=False, batch_size=1,
-                                  num_workers=settings.num_workers, shuffle=False, drop_last=True, stack_dim=1)
+                                  num_workers=settings.num_workers, shuffle=False, drop_last=True, stack_dim=1,
+                                  packed_keys=packed_keys_real)
 
     loader_val_realHK = LTRLoader('val_HK', dataset_val_realHK, training=False, batch_size=1,
-                                  num_workers=settings.num_workers, shuffle=False, drop_last=True, stack_dim=1)
+                                  num_workers=settings.num_workers, shuffle=False, drop_last=True, stack_dim=1,
+                                  packed_keys=packed_keys_real)
 
     loader = [loader_train, loader_val, loader_val_realHH, loader_val_realHK]
 
@@ -66,7 +66,7 @@ class LTRTrainer(BaseTrainer):
         for i, data in enumerate(loader, 1):
             # get inputs
             if self.move_data_to_gpu:
-                data = data.to(self.device)
+                data = data.to(self.device, non_blocking=loader.pin_memory)
 
             data['epoch'] = self.epoch
             data['settings'] = self.settings
@@ -2,9 +2,9 @@ import os
 import sys
 import importlib
 import numpy as np
-from pytracking.utils.load_text import load_text
 import torch
 import pickle
+import hashlib
 from tqdm import tqdm
 
 env_path = os.path.join(os.path.dirname(__file__), '../..')
@@ -12,6 +12,7 @@ if env_path not in sys.path:
     sys.path.append(env_path)
 
 from pytracking.evaluation.environment import env_settings
+from pytracking.evaluation.results_store import load_results, results_exist
 
 
 def calc_err_center(pred_bb, anno_bb, normalized=False):
@@ -38,7 +39,10 @@ def calc_iou_overlap(pred_bb, anno_bb):
     return intersection / union
 
 
-def calc_seq_err_robust(pred_bb, anno_bb, dataset, target_visible=None):
+def _prepare_pred_bb(pred_bb, anno_bb, dataset):
+    """Checks the predicted boxes of a sequence and aligns them with the annotation. Boxes with zero size are replaced
+    by the previous box, the boxes are cut or zero padded to the length of the annotation and the first box is set to
+    the annotation."""
     pred_bb = pred_bb.clone()
 
     # Check if invalid values are present
@@ -52,9 +56,13 @@ def calc_seq_err_robust(pred_bb, anno_bb, dataset, target_visible=None):
             raise Exception('Warning: NaNs in annotation')
 
     if (pred_bb[:, 2:] == 0.0).any():
-        for i in range(1, pred_bb.shape[0]):
-            if (pred_bb[i, 2:] == 0.0).any() and not torch.isnan(anno_bb[i, :]).any():
-                pred_bb[i, :] = pred_bb[i-1, :]
+        # Index of the box that each frame takes its box from, i.e. the last earlier frame that is not replaced
+        num_frames = min(pred_bb.shape[0], anno_bb.shape[0])
+        replace = (pred_bb[:num_frames, 2:] == 0.0).any(1) & ~torch.isnan(anno_bb[:num_frames, :]).any(1)
+        replace[0] = False
+        frame_ids = torch.arange(num_frames)
+        source_ids = torch.where(replace, torch.zeros_like(frame_ids), frame_ids).cummax(0)[0]
+        pred_bb[:num_frames, :] = pred_bb[source_ids, :]
 
     if pred_bb.shape[0] != anno_bb.shape[0]:
         if dataset == 'lasot':
@@ -72,6 +80,11 @@ def calc_seq_err_robust(pred_bb, anno_bb, dataset, target_visible=None):
                 pred_bb = torch.cat((pred_bb, pad), dim=0)
 
     pred_bb[0, :] = anno_bb[0, :]
+    return pred_bb
+
+
+def calc_seq_err_robust(pred_bb, anno_bb, dataset, target_visible=None):
+    pred_bb = _prepare_pred_bb(pred_bb, anno_bb, dataset)
 
     if target_visible is not None:
         target_visible = target_visible.bool()
@@ -100,10 +113,123 @@ def calc_seq_err_robust(pred_bb, anno_bb, dataset, target_visible=None):
     return err_overlap, err_center, err_center_normalized, valid
 
 
+def _count_per_threshold(err, seq_ids, num_seqs, thresholds, above):
+    """Number of frames of each sequence with an error above (above=True) or at most (above=False) each threshold.
+    The errors of all sequences are given concatenated, with the index of the sequence of each frame in seq_ids."""
+    num_bins = thresholds.numel() + 1
+
+    # Bin i holds the errors in (thresholds[i-1], thresholds[i]]
+    bins = torch.bucketize(err, thresholds)
+    hist = torch.bincount(seq_ids * num_bins + bins, minlength=num_seqs * num_bins).view(num_seqs, num_bins)
+
+    if above:
+        return hist.flip(1).cumsum(1).flip(1)[:, 1:]
+    return hist.cumsum(1)[:, :-1]
+
+
+def calc_seq_measures(pred_bbs, anno_bbs, datasets, target_visible, threshold_set_overlap, threshold_set_center,
+                      threshold_set_center_norm, exclude_invalid_frames=False):
+    """ Computes the measures of several sequences at once. The frames of all sequences are concatenated, so that the
+    errors and curves are computed with a few tensor operations instead of a loop over the sequences. Gives the same
+    results as calc_seq_err_robust for each sequence.
+    args:
+        pred_bbs - List of predicted boxes of each sequence.
+        anno_bbs - List of annotated boxes of each sequence.
+        datasets - List of the dataset names of the sequences.
+        target_visible - List of target visibility flags of each sequence (None if not available).
+        threshold_set_overlap, threshold_set_center, threshold_set_center_norm - Thresholds of the curves.
+        exclude_invalid_frames - Normalize the curves by the number of valid frames instead of the sequence length.
+    returns:
+        avg_overlap - Mean overlap of the valid frames of each sequence, shape (num_seqs,).
+        success_overlap, success_center, success_center_norm - Success rate curves, shape (num_seqs, num_thresholds).
+    """
+    num_seqs = len(anno_bbs)
+    seq_lengths = torch.tensor([anno.shape[0] for anno in anno_bbs])
+    seq_ids = torch.arange(num_seqs).repeat_interleave(seq_lengths)
+
+    pred_bb = torch.cat([_prepare_pred_bb(pred, anno, dataset)
+                         for pred, anno, dataset in zip(pred_bbs, anno_bbs, datasets)])
+    anno_bb = torch.cat(anno_bbs)
+    visible = torch.cat([torch.ones(anno.shape[0], dtype=torch.bool) if vis is None else vis.bool()
+                         for anno, vis in zip(anno_bbs, target_visible)])
+    is_uav = torch.tensor([d == 'uav' for d in datasets])[seq_ids]
+    is_lasot = torch.tensor([d == 'lasot' for d in datasets])[seq_ids]
+
+    valid = ((anno_bb[:, 2:] > 0.0).sum(1) == 2) & visible
+
+    err_center = calc_err_center(pred_bb, anno_bb)
+    err_center_normalized = calc_err_center(pred_bb, anno_bb, normalized=True)
+    err_overlap = calc_iou_overlap(pred_bb, anno_bb)
+
+    # handle invalid anno cases
+    err_center[~valid & is_uav] = -1.0
+    err_center[~valid & ~is_uav] = float("Inf")
+    err_center_normalized[~valid] = -1.0
+    err_overlap[~valid] = -1.0
+
+    err_center_normalized[~visible & is_lasot] = float("Inf")
+    err_center[~visible & is_lasot] = float("Inf")
+
+    if torch.isnan(err_overlap).any():
+        raise Exception('Nans in calculated overlap')
+
+    num_valid = torch.bincount(seq_ids[valid], minlength=num_seqs)
+    avg_overlap = torch.bincount(seq_ids[valid], weights=err_overlap[valid], minlength=num_seqs) / num_valid
+
+    seq_lengths = num_valid if exclude_invalid_frames else seq_lengths
+    if (seq_lengths <= 0).any():
+        raise Exception('Seq length zero')
+
+    seq_lengths = seq_lengths.view(-1, 1)
+    success_overlap = _count_per_threshold(err_overlap, seq_ids, num_seqs, threshold_set_overlap,
+                                           above=True).float() / seq_lengths
+    success_center = _count_per_threshold(err_center, seq_ids, num_seqs, threshold_set_center,
+                                          above=False).float() / seq_lengths
+    success_center_norm = _count_per_threshold(err_center_normalized, seq_ids, num_seqs, threshold_set_center_norm,
+                                               above=False).float() / seq_lengths
+
+    return avg_overlap, success_overlap, success_center, success_center_norm
+
+
+def _metrics_cache_path(settings, tracker):
+    name = '{}_{}'.format(tracker.name, tracker.parameter_name)
+    if tracker.run_id is not None:
+        name = '{}_{:03d}'.format(name, tracker.run_id)
+    return os.path.join(settings.result_plot_path, 'metrics_cache', '{}.pkl'.format(name))
+
+
+def _load_metrics_cache(path):
+    if not os.path.isfile(path):
+        return {}
+    try:
+        with open(path, 'rb') as fh:
+            return pickle.load(fh)
+    except (pickle.UnpicklingError, EOFError):
+        return {}
+
+
+def _save_metrics_cache(path, cache):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'wb') as fh:
+        pickle.dump(cache, fh)
+    os.replace(path + '.tmp', path)
+
+
+def _metrics_key(pred_bb, anno_hash, eval_settings):
+    """Hash of the results of a sequence, combined with the hash of the annotation and the evaluation settings."""
+    h = hashlib.sha1(np.ascontiguousarray(pred_bb, dtype=np.float64).tobytes())
+    h.update(anno_hash.encode())
+    h.update(eval_settings.encode())
+    return h.hexdigest()
+
+
 def extract_results(trackers, dataset, report_name, skip_missing_seq=False, plot_bin_gap=0.05,
                     exclude_invalid_frames=False):
+    """ Computes the overlap and center error measures of the trackers on the dataset and saves them in the folder
+    report_name of the result_plot_path. The measures of each tracker run and sequence are cached in the metrics_cache
+    folder of the result_plot_path, keyed by a hash of the results, the annotation and the evaluation settings. Only
+    the sequences with new or changed results are computed, for all sequences of a tracker at once."""
     settings = env_settings()
-    eps = 1e-16
 
     result_plot_path = os.path.join(settings.result_plot_path, report_name)
 
@@ -124,42 +250,59 @@ def extract_results(trackers, dataset, report_name, skip_missing_seq=False, plot
 
     valid_sequence = torch.ones(len(dataset), dtype=torch.uint8)
 
-    for seq_id, seq in enumerate(tqdm(dataset)):
-        # Load anno
-        anno_bb = torch.tensor(seq.ground_truth_rect)
-        target_visible = torch.tensor(seq.target_visible, dtype=torch.uint8) if seq.target_visible is not None else None
-        for trk_id, trk in enumerate(trackers):
-            # Load results
-            base_results_path = '{}/{}'.format(trk.results_dir, seq.name)
-            results_path = '{}.txt'.format(base_results_path)
-            print(trackers)
-
-            if os.path.isfile(results_path):
-                pred_bb = torch.tensor(load_text(str(results_path), delimiter=('\t', ','), dtype=np.float64))
-            else:
+    # Check for missing results before computing anything
+    for seq_id, seq in enumerate(dataset):
+        for trk in trackers:
+            if not results_exist(trk.results_dir, seq.name):
                 if skip_missing_seq:
                     valid_sequence[seq_id] = 0
                     break
                 else:
-                    raise Exception('Result not found. {}'.format(results_path))
-
-            # Calculate measures
-            err_overlap, err_center, err_center_normalized, valid_frame = calc_seq_err_robust(
-                pred_bb, anno_bb, seq.dataset, target_visible)
-
-            avg_overlap_all[seq_id, trk_id] = err_overlap[valid_frame].mean()
-
-            if exclude_invalid_frames:
-                seq_length = valid_frame.long().sum()
-            else:
-                seq_length = anno_bb.shape[0]
-
-            if seq_length <= 0:
-                raise Exception('Seq length zero')
-
-            ave_success_rate_plot_overlap[seq_id, trk_id, :] = (err_overlap.view(-1, 1) > threshold_set_overlap.view(1, -1)).sum(0).float() / seq_length
-            ave_success_rate_plot_center[seq_id, trk_id, :] = (err_center.view(-1, 1) <= threshold_set_center.view(1, -1)).sum(0).float() / seq_length
-            ave_success_rate_plot_center_norm[seq_id, trk_id, :] = (err_center_normalized.view(-1, 1) <= threshold_set_center_norm.view(1, -1)).sum(0).float() / seq_length
+                    raise Exception('Result not found. {}/{}.txt'.format(trk.results_dir, seq.name))
+
+    # Load anno
+    seq_ids = [seq_id for seq_id in range(len(dataset)) if valid_sequence[seq_id]]
+    anno_bbs = [torch.tensor(dataset[seq_id].ground_truth_rect) for seq_id in seq_ids]
+    target_visible = [torch.tensor(dataset[seq_id].target_visible, dtype=torch.uint8)
+                      if dataset[seq_id].target_visible is not None else None for seq_id in seq_ids]
+    anno_hashes = [hashlib.sha1(anno.numpy().tobytes() +
+                                (b'' if vis is None else vis.numpy().tobytes())).hexdigest()
+                   for anno, vis in zip(anno_bbs, target_visible)]
+    eval_settings = '{}_{}'.format(plot_bin_gap, exclude_invalid_frames)
+
+    for trk_id, trk in enumerate(tqdm(trackers)):
+        cache_path = _metrics_cache_path(settings, trk)
+        cache = _load_metrics_cache(cache_path)
+
+        # Load results, and compute the sequences that are not in the cache
+        compute_ids, pred_bbs, keys = [], [], []
+        for i, seq_id in enumerate(seq_ids):
+            seq = dataset[seq_id]
+            pred_bb = load_results(trk.results_dir, seq.name)
+            keys.append(_metrics_key(pred_bb, anno_hashes[i], '{}_{}'.format(seq.dataset, eval_settings)))
+            if seq.name not in cache or cache[seq.name]['key'] != keys[i]:
+                compute_ids.append(i)
+                pred_bbs.append(torch.tensor(pred_bb))
+
+        if len(compute_ids) > 0:
+            measures = calc_seq_measures(pred_bbs, [anno_bbs[i] for i in compute_ids],
+                                         [dataset[seq_ids[i]].dataset for i in compute_ids],
+                                         [target_visible[i] for i in compute_ids], threshold_set_overlap,
+                                         threshold_set_center, threshold_set_center_norm, exclude_invalid_frames)
+            for j, i in enumerate(compute_ids):
+                cache[dataset[seq_ids[i]].name] = {'key': keys[i],
+                                                   'avg_overlap': measures[0][j].item(),
+                                                   'success_overlap': measures[1][j].numpy(),
+                                                   'success_center': measures[2][j].numpy(),
+                                                   'success_center_norm': measures[3][j].numpy()}
+            _save_metrics_cache(cache_path, cache)
+
+        for seq_id in seq_ids:
+            seq_measures = cache[dataset[seq_id].name]
+            avg_overlap_all[seq_id, trk_id] = seq_measures['avg_overlap']
+            ave_success_rate_plot_overlap[seq_id, trk_id, :] = torch.from_numpy(seq_measures['success_overlap'])
+            ave_success_rate_plot_center[seq_id, trk_id, :] = torch.from_numpy(seq_measures['success_center'])
+            ave_success_rate_plot_center_norm[seq_id, trk_id, :] = torch.from_numpy(seq_measures['success_center_norm'])
 
     print('\n\nComputed results over {} / {} sequences'.format(valid_sequence.long().sum().item(), valid_sequence.shape[0]))
 
@@ -10,6 +10,7 @@ import matplotlib.pyplot as plt
 from pytracking.analysis.plot_results import get_plot_draw_styles
 from pytracking.utils.plotting import draw_figure
 from pytracking.evaluation import get_dataset, trackerlist
+from pytracking.evaluation.results_store import get_results_store
 
 env_path = os.path.join(os.path.dirname(__file__), '../..')
 if env_path not in sys.path:
@@ -146,7 +147,10 @@ def playback_results(trackers, sequence):
         base_results_path = '{}/{}'.format(trk.results_dir, sequence.name)
         results_path = '{}.txt'.format(base_results_path)
 
-        if os.path.isfile(results_path):
+        pred_bb = get_results_store(trk.results_dir).load(sequence.name)
+        if pred_bb is not None:
+            pred_bb = torch.tensor(pred_bb.astype(np.float64))
+        elif os.path.isfile(results_path):
             try:
                 pred_bb = torch.tensor(np.loadtxt(str(results_path), dtype=np.float64))
             except:
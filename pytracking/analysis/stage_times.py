@@ -0,0 +1,86 @@
+import os
+import numpy as np
+from collections import OrderedDict
+from pytracking.evaluation.results_store import get_results_store, load_results
+from pytracking.utils.profiler import load_stage_times
+
+
+def load_sequence_stage_times(tracker, seq):
+    """ Load the stage times of a tracker on a sequence, saved when the tracker is run with params.profile_stages set.
+    Returns the stage names, the array of stage times (num_frames, num_stages) and the total frame times, or None if the
+    sequence has no stage times."""
+    stage_name = '{}_stage_time'.format(seq.name)
+    data = get_results_store(tracker.results_dir).load(stage_name)
+    if data is not None:
+        stage_names, stage_times = list(data.dtype.names), data.view(np.float64).reshape(len(data), -1)
+    elif os.path.isfile(os.path.join(tracker.results_dir, stage_name + '.txt')):
+        stage_names, stage_times = load_stage_times(os.path.join(tracker.results_dir, stage_name + '.txt'))
+    else:
+        return None
+
+    frame_times = load_results(tracker.results_dir, '{}_time'.format(seq.name))
+    if frame_times is not None:
+        frame_times = np.atleast_1d(frame_times)
+    return stage_names, stage_times, frame_times
+
+
+def aggregate_stage_times(trackers, dataset, skip_init=True):
+    """ Mean time per frame of each stage, over all frames of the dataset.
+    args:
+        trackers - List of trackers.
+        dataset - List of sequences.
+        skip_init - Do not include the first frame of the sequences, where the tracker is initialized.
+    returns:
+        List with an OrderedDict for each tracker, containing the mean time per frame (in seconds) of each stage and of
+        the whole frame ('total'). None for trackers without stage times.
+    """
+    start_frame = 1 if skip_init else 0
+    results = []
+    for tracker in trackers:
+        stage_sums = OrderedDict()
+        total_sum = 0.0
+        num_frames = 0
+        num_total_frames = 0
+        for seq in dataset:
+            seq_times = load_sequence_stage_times(tracker, seq)
+            if seq_times is None:
+                continue
+            stage_names, stage_times, frame_times = seq_times
+            stage_times = stage_times[start_frame:]
+            for name, t in zip(stage_names, stage_times.sum(axis=0)):
+                stage_sums[name] = stage_sums.get(name, 0.0) + t
+            num_frames += stage_times.shape[0]
+            if frame_times is not None:
+                total_sum += frame_times[start_frame:].sum()
+                num_total_frames += frame_times[start_frame:].shape[0]
+
+        if num_frames == 0:
+            results.append(None)
+            continue
+
+        mean_times = OrderedDict((name, t / num_frames) for name, t in stage_sums.items())
+        if num_total_frames > 0:
+            mean_times['total'] = total_sum / num_total_frames
+        results.append(mean_times)
+    return results
+
+
+def print_stage_times(trackers, dataset, skip_init=True):
+    """ Print the mean time per frame of each stage, and its share of the whole frame time, for each tracker. The
+    stages can be nested (e.g. the features are part of the sample stage), so the shares need not sum to 100%."""
+    results = aggregate_stage_times(trackers, dataset, skip_init)
+    for tracker, mean_times in zip(trackers, results):
+        name = '{} {}'.format(tracker.name, tracker.parameter_name)
+        if tracker.run_id is not None:
+            name = '{} {:03d}'.format(name, tracker.run_id)
+        if mean_times is None:
+            print('\n{}: no stage times found'.format(name))
+            continue
+
+        total = mean_times.get('total', None)
+        name_width = max(len(s) for s in mean_times.keys()) + 2
+        print('\n{}'.format(name))
+        print('{: <{w}} | {: >10} | {: >7}'.format('stage', 'ms/frame', 'share', w=name_width))
+        for stage, t in mean_times.items():
+            share = '{:6.1f}%'.format(100 * t / total) if total else ''
+            print('{: <{w}} | {: >10.2f} | {: >7}'.format(stage, 1000 * t, share, w=name_width))
@@ -31,6 +31,7 @@ class Sequence:
         self.target_visible = target_visible
         self.object_ids = object_ids
         self.multiobj_mode = multiobj_mode
+        self.frame_cache = None     # Optional SequenceFrameCache with the decoded frames
         self.init_data = self._construct_init_data(init_data)
         self._ensure_start_frame()
 
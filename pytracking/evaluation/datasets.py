@@ -1,6 +1,8 @@
 from collections import namedtuple
 import importlib
 from pytracking.evaluation.data import SequenceList
+from pytracking.evaluation.environment import env_settings
+from pytracking.evaluation.sequence_cache import attach_sequence_cache
 
 DatasetInfo = namedtuple('DatasetInfo', ['module', 'class_name', 'kwargs'])
 
@@ -59,8 +61,13 @@ def load_dataset(name: str):
 
 
 def get_dataset(*args):
-    """ Get a single or set of datasets."""
+    """ Get a single or set of datasets. The sequences read their frames from the sequence cache if the
+    sequence_cache_path is set in the local.py and they have been cached."""
     dset = SequenceList()
     for name in args:
         dset.extend(load_dataset(name))
+
+    cache_path = getattr(env_settings(), 'sequence_cache_path', '')
+    if cache_path:
+        attach_sequence_cache(dset, cache_path)
     return dset
\ No newline at end of file
@@ -7,6 +7,7 @@ class EnvSettings:
         pytracking_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 
         self.results_path = '{}/tracking_results/'.format(pytracking_path)
+        self.results_format = 'text'
         self.segmentation_path = '{}/segmentation_results/'.format(pytracking_path)
         self.network_path = '{}/networks/'.format(pytracking_path)
         self.result_plot_path = '{}/result_plots/'.format(pytracking_path)
@@ -22,6 +23,7 @@ class EnvSettings:
         self.oxuva_path = ''
         self.davis_dir = ''
         self.youtubevos_dir = ''
+        self.sequence_cache_path = ''
 
         self.got_packed_results_path = ''
         self.got_reports_path = ''
@@ -30,12 +32,17 @@ class EnvSettings:
 
 def create_default_local_file():
     comment = {'results_path': 'Where to store tracking results',
-               'network_path': 'Where tracking networks are stored.'}
+               'results_format': 'npz (one file per tracker run) or text (one file per sequence)',
+               'network_path': 'Where tracking networks are stored.',
+               'sequence_cache_path': 'Decoded frames, see pytracking/util_scripts/create_sequence_cache.py'}
 
     path = os.path.join(os.path.dirname(__file__), 'local.py')
     with open(path, 'w') as f:
         settings = EnvSettings()
 
+        # Existing local.py files keep the text format of the EnvSettings, new ones use the results store
+        settings.results_format = 'npz'
+
         f.write('from pytracking.evaluation.environment import EnvSettings\n\n')
         f.write('def local_env_settings():\n')
         f.write('    settings = EnvSettings()\n\n')
@@ -0,0 +1,91 @@
+import time
+import queue
+import threading
+from ltr.data.image_loader import default_image_loader
+
+
+class FramePrefetcher:
+    """Reads and decodes the frames of a sequence in a background thread, up to num_prefetch frames ahead of the
+    tracker. Iterating gives the images in order. Use it in a with-statement, so that the thread is stopped also when
+    the tracker raises an exception.
+    args:
+        frames - List of image paths.
+        num_prefetch - Maximum number of decoded frames waiting in the queue. If 0, the frames are instead read in the
+                       calling thread when they are requested.
+        image_loader - Function reading an image from a path. The default uses jpeg4py where it is available and
+                       opencv otherwise.
+    """
+    def __init__(self, frames, num_prefetch=8, image_loader=default_image_loader):
+        self.frames = frames
+        self.image_loader = image_loader
+
+        # Time spent decoding each frame in the background thread and waiting for it in the main thread
+        self.decode_time = []
+        self.wait_time = []
+
+        self._stop = threading.Event()
+        self._thread = None
+        if num_prefetch > 0:
+            self._queue = queue.Queue(maxsize=num_prefetch)
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _run(self):
+        for frame in self.frames:
+            try:
+                item = (*self._read(frame), None)
+            except Exception as e:
+                item = (None, 0.0, e)
+
+            if not self._put(item) or item[2] is not None:
+                return
+
+    def _read(self, frame):
+        start_time = time.time()
+        image = self.image_loader(frame)
+        if image is None:
+            raise RuntimeError('Could not read image "{}"'.format(frame))
+        return image, time.time() - start_time
+
+    def __iter__(self):
+        for frame in self.frames:
+            start_time = time.time()
+            if self._thread is None:
+                image, decode_time = self._read(frame)
+            else:
+                image, decode_time, error = self._queue.get()
+                if error is not None:
+                    raise error
+
+            self.wait_time.append(time.time() - start_time)
+            self.decode_time.append(decode_time)
+            yield image
+
+    def close(self):
+        """Stop the background thread."""
+        if self._thread is None:
+            return
+        self._stop.set()
+
+        # Make room in the queue so that a blocked put returns
+        try:
+            while True:
+                self._queue.get_nowait()
+        except queue.Empty:
+            pass
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,187 @@
+import os
+import zipfile
+import numpy as np
+from pytracking.utils.load_text import load_text
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class _FileLock:
+    """Exclusive lock on a separate lock file, held while a results store is modified. Lets the worker processes of
+    run_dataset append to the same store. Not available (no locking) on platforms without fcntl."""
+    def __init__(self, path):
+        self.path = path + '.lock'
+
+    def __enter__(self):
+        self.file = open(self.path, 'a')
+        if fcntl is not None:
+            fcntl.flock(self.file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if fcntl is not None:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+        self.file.close()
+        return False
+
+
+class ResultsStore:
+    """The results of one tracker run, stored in a single compressed npz file instead of one text file per sequence
+    and field. Each array is named as the text file it replaces, without the .txt ending, e.g. 'Basketball' for the
+    boxes, 'Basketball_time' for the times and 'Basketball_1' for the boxes of object 1. New sequences are appended to
+    the file, see save.
+    args:
+        path - Path of the npz file.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._npz = None
+        self._npz_mtime = None
+
+    def _open(self):
+        """The NpzFile of the store, reopened when the file has changed. None if the file does not exist."""
+        if not os.path.isfile(self.path):
+            return None
+        # Appends grow the file in place, replacing the store creates a new inode
+        stat = os.stat(self.path)
+        mtime = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if self._npz is None or mtime != self._npz_mtime:
+            self.close()
+            try:
+                self._npz = np.load(self.path)
+            except zipfile.BadZipFile:
+                # A writer is appending to the store, read it once the append is done
+                with _FileLock(self.path):
+                    self._npz = np.load(self.path)
+            self._npz_mtime = mtime
+        return self._npz
+
+    def close(self):
+        if self._npz is not None:
+            self._npz.close()
+            self._npz = None
+
+    def names(self):
+        npz = self._open()
+        return [] if npz is None else list(npz.files)
+
+    def __contains__(self, name):
+        npz = self._open()
+        return npz is not None and name in npz.files
+
+    def load(self, name):
+        """Load an array, or None if it is not in the store."""
+        npz = self._open()
+        if npz is None or name not in npz.files:
+            return None
+        return npz[name]
+
+    def save(self, arrays: dict):
+        """Append the arrays to the store. The arrays are appended in place, so that saving a sequence does not copy
+        the whole store. If the append fails, the previous end of the file is restored. Arrays with names that are
+        already in the store are replaced by rewriting the store to a new file, which is then moved over it."""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+        with _FileLock(self.path):
+            # Only one writer at a time holds the lock
+            if not os.path.isfile(self.path):
+                self._write(arrays)
+                return
+
+            with zipfile.ZipFile(self.path, 'r') as zf:
+                existing = [n[:-len('.npy')] for n in zf.namelist()]
+                start_dir = zf.start_dir
+
+            if any(name in arrays for name in existing):
+                # Rewrite the kept arrays
+                self._write({**{name: self.load(name) for name in existing if name not in arrays}, **arrays})
+                return
+
+            # The new arrays are written over the central directory at the end of the file, keep it to restore the
+            # store if the append fails
+            size = os.path.getsize(self.path)
+            with open(self.path, 'rb') as f:
+                f.seek(start_dir)
+                central_dir = f.read()
+            try:
+                self._write_arrays(self.path, 'a', arrays)
+            except BaseException:
+                with open(self.path, 'r+b') as f:
+                    f.seek(start_dir)
+                    f.write(central_dir)
+                    f.truncate(size)
+                raise
+
+    def _write(self, arrays: dict):
+        """Write the arrays to a new file next to the store and move it over the store, so that readers and
+        interrupted writes never see a partially written store."""
+        tmp_path = self.path + '.tmp'
+        try:
+            self._write_arrays(tmp_path, 'w', arrays)
+            self.close()
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @staticmethod
+    def _write_arrays(path, mode, arrays: dict):
+        with zipfile.ZipFile(path, mode, compression=zipfile.ZIP_DEFLATED, allowZip64=True) as zf:
+            for name, array in arrays.items():
+                with zf.open(name + '.npy', 'w', force_zip64=True) as f:
+                    np.lib.format.write_array(f, np.asanyarray(array), allow_pickle=False)
+
+    def export_text(self, output_dir):
+        """Write the arrays as text files, in the layout of the text results format."""
+        os.makedirs(output_dir, exist_ok=True)
+        for name in self.names():
+            data = self.load(name)
+            file = os.path.join(output_dir, '{}.txt'.format(name))
+            if data.dtype.names is not None:
+                # Stage times, with the stage names in the header
+                np.savetxt(file, data.view(np.float64).reshape(len(data), -1), delimiter='\t', fmt='%f',
+                           header='\t'.join(data.dtype.names), comments='')
+            elif np.issubdtype(data.dtype, np.integer):
+                np.savetxt(file, data, delimiter='\t', fmt='%d')
+            else:
+                np.savetxt(file, data, delimiter='\t', fmt='%f')
+
+
+def results_store_path(results_dir):
+    """Path of the results store of the tracker run with the given results directory."""
+    return '{}.npz'.format(results_dir.rstrip('/'))
+
+
+_stores = {}
+
+
+def get_results_store(results_dir):
+    """The ResultsStore of a tracker run. The stores are kept open, so that loading the results of many sequences only
+    reads the index of the file once."""
+    path = results_store_path(results_dir)
+    if path not in _stores:
+        _stores[path] = ResultsStore(path)
+    return _stores[path]
+
+
+def results_exist(results_dir, name):
+    """Check if the results with the given name exist, in the results store or as a text file."""
+    return name in get_results_store(results_dir) or os.path.isfile(os.path.join(results_dir, '{}.txt'.format(name)))
+
+
+def load_results(results_dir, name, dtype=np.float64):
+    """Load results of a tracker run, e.g. load_results(tracker.results_dir, seq.name) for the boxes of a sequence.
+    They are read from the results store if they are there, otherwise from the text file. Returns None if neither
+    exists."""
+    data = get_results_store(results_dir).load(name)
+    if data is not None:
+        return data.astype(dtype) if data.dtype.names is None else data
+
+    file = os.path.join(results_dir, '{}.txt'.format(name))
+    if os.path.isfile(file):
+        return load_text(file, delimiter=('\t', ','), dtype=dtype)
+    return None
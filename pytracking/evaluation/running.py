@@ -3,10 +3,13 @@ import multiprocessing
 import os
 import sys
 import csv
-from itertools import product
+import time
 from collections import OrderedDict
 from pytracking.evaluation import Sequence, Tracker
+from pytracking.evaluation.tracker import track_sequence_fan_out
 from ltr.data.image_loader import imwrite_indexed
+from pytracking.evaluation.results_store import get_results_store, results_exist, load_results
+from pytracking.utils.profiler import save_stage_times, stage_times_array
 
 
 PREDICTION_FIELD_NAMES = ['video', 'object', 'frame_num', 'present', 'score', 'xmin', 'xmax', 'ymin', 'ymax']
@@ -56,9 +59,14 @@ def _save_tracker_output_oxuva(seq: Sequence, tracker: Tracker, output: dict):
 
 
 def _save_tracker_output(seq: Sequence, tracker: Tracker, output: dict):
-    """Saves the output of the tracker."""
+    """Saves the output of the tracker. With the npz results format, the boxes, times, object presence scores, saved CG
+    iterations, stage times and frame decode times are appended to the results store of the tracker run, instead of being written as
+    text files."""
 
-    if not os.path.exists(tracker.results_dir):
+    use_store = tracker.results_format == 'npz'
+    store_arrays = {}
+
+    if not use_store and not os.path.exists(tracker.results_dir):
         os.makedirs(tracker.results_dir)
 
     base_results_path = os.path.join(tracker.results_dir, seq.name)
@@ -66,13 +74,29 @@ def _save_tracker_output(seq: Sequence, tracker: Tracker, output: dict):
 
     frame_names = [os.path.splitext(os.path.basename(f))[0] for f in seq.frames]
 
+    def _store_name(file):
+        return os.path.splitext(os.path.basename(file))[0]
+
     def save_bb(file, data):
         tracked_bb = np.array(data).astype(int)
-        np.savetxt(file, tracked_bb, delimiter='\t', fmt='%d')
+        if use_store:
+            store_arrays[_store_name(file)] = tracked_bb
+        else:
+            np.savetxt(file, tracked_bb, delimiter='\t', fmt='%d')
 
     def save_time(file, data):
         exec_times = np.array(data).astype(float)
-        np.savetxt(file, exec_times, delimiter='\t', fmt='%f')
+        if use_store:
+            store_arrays[_store_name(file)] = exec_times
+        else:
+            np.savetxt(file, exec_times, delimiter='\t', fmt='%f')
+
+    def save_count(file, data):
+        counts = np.array(data).astype(int)
+        if use_store:
+            store_arrays[_store_name(file)] = counts
+        else:
+            np.savetxt(file, counts, delimiter='\t', fmt='%d')
 
     def _convert_dict(input_dict):
         data_dict = {}
@@ -112,6 +136,38 @@ def _save_tracker_output(seq: Sequence, tracker: Tracker, output: dict):
                 timings_file = '{}_time.txt'.format(base_results_path)
                 save_time(timings_file, data)
 
+        elif key == 'cg_iter_saved':
+            if isinstance(data[0], dict):
+                data_dict = _convert_dict(data)
+
+                for obj_id, d in data_dict.items():
+                    cg_iter_file = '{}_{}_cg_iter_saved.txt'.format(base_results_path, obj_id)
+                    save_count(cg_iter_file, d)
+            else:
+                cg_iter_file = '{}_cg_iter_saved.txt'.format(base_results_path)
+                save_count(cg_iter_file, data)
+
+        elif key == 'stage_time':
+            stage_file = '{}_stage_time.txt'.format(base_results_path)
+            if use_store:
+                store_arrays[_store_name(stage_file)] = stage_times_array(data)
+            else:
+                save_stage_times(stage_file, data)
+
+        elif key == 'decode_time':
+            # Table with the decode time and the time the tracker waited for the frame, in the stage times layout
+            decode_file = '{}_decode_time.txt'.format(base_results_path)
+            decode_times = [OrderedDict([('decode_time', d), ('decode_wait_time', w)])
+                            for d, w in zip(data, output['decode_wait_time'])]
+            if use_store:
+                store_arrays[_store_name(decode_file)] = stage_times_array(decode_times)
+            else:
+                save_stage_times(decode_file, decode_times)
+
+        elif key == 'object_presence_score':
+            if use_store and not isinstance(data[0], dict):
+                store_arrays['{}_object_presence_score'.format(seq.name)] = np.array(data).astype(float)
+
         elif key == 'segmentation':
             assert len(frame_names) == len(data)
             if not os.path.exists(segmentation_path):
@@ -119,26 +175,29 @@ def _save_tracker_output(seq: Sequence, tracker: Tracker, output: dict):
             for frame_name, frame_seg in zip(frame_names, data):
                 imwrite_indexed(os.path.join(segmentation_path, '{}.png'.format(frame_name)), frame_seg)
 
+    if use_store and len(store_arrays) > 0:
+        get_results_store(tracker.results_dir).save(store_arrays)
+
+
+def _results_exist(seq: Sequence, tracker: Tracker):
+    if seq.dataset == 'oxuva':
+        vid_id, obj_id = seq.name.split('_')[:2]
+        pred_file = os.path.join(tracker.results_dir, '{}_{}.csv'.format(vid_id, obj_id))
+        return os.path.isfile(pred_file)
+    elif seq.object_ids is None:
+        return results_exist(tracker.results_dir, seq.name)
+    else:
+        names = ['{}_{}'.format(seq.name, obj_id) for obj_id in seq.object_ids]
+        missing = [not results_exist(tracker.results_dir, name) for name in names]
+        return sum(missing) == 0
+
 
 def run_sequence(seq: Sequence, tracker: Tracker, debug=False, visdom_info=None):
     """Runs a tracker on a sequence."""
 
-    def _results_exist():
-        if seq.dataset == 'oxuva':
-            vid_id, obj_id = seq.name.split('_')[:2]
-            pred_file = os.path.join(tracker.results_dir, '{}_{}.csv'.format(vid_id, obj_id))
-            return os.path.isfile(pred_file)
-        elif seq.object_ids is None:
-            bbox_file = '{}/{}.txt'.format(tracker.results_dir, seq.name)
-            return os.path.isfile(bbox_file)
-        else:
-            bbox_files = ['{}/{}_{}.txt'.format(tracker.results_dir, seq.name, obj_id) for obj_id in seq.object_ids]
-            missing = [not os.path.isfile(f) for f in bbox_files]
-            return sum(missing) == 0
-
     visdom_info = {} if visdom_info is None else visdom_info
 
-    if _results_exist() and not debug:
+    if _results_exist(seq, tracker) and not debug:
         print('FPS: {}'.format(-1))
         return
 
@@ -155,6 +214,10 @@ def run_sequence(seq: Sequence, tracker: Tracker, debug=False, visdom_info=None)
 
     sys.stdout.flush()
 
+    _report_and_save_output(seq, tracker, output, debug)
+
+
+def _report_and_save_output(seq: Sequence, tracker: Tracker, output: dict, debug=False):
     if isinstance(output['time'][0], (dict, OrderedDict)):
         exec_time = sum([sum(times.values()) for times in output['time']])
         num_frames = len(output['time'])
@@ -163,6 +226,13 @@ def run_sequence(seq: Sequence, tracker: Tracker, debug=False, visdom_info=None)
         num_frames = len(output['time'])
 
     print('FPS: {}'.format(num_frames / exec_time))
+    if 'decode_time' in output:
+        # Frame decoding is not included in the tracker time above. Only the time the tracker had to wait for the
+        # frames adds to the wall-clock time, the rest of the decoding runs in parallel with the tracker.
+        decode_time = sum(output['decode_time'])
+        wall_time = exec_time + sum(output['decode_wait_time'])
+        print('Decode time per frame: {:.2f} ms,  Wall-clock FPS: {}'.format(1000 * decode_time / num_frames,
+                                                                           num_frames / wall_time))
 
     if not debug:
         if seq.dataset == 'oxuva':
@@ -171,7 +241,142 @@ def run_sequence(seq: Sequence, tracker: Tracker, debug=False, visdom_info=None)
             _save_tracker_output(seq, tracker, output)
 
 
-def run_dataset(dataset, trackers, debug=False, threads=0, visdom_info=None):
+def run_sequence_fan_out(seq: Sequence, trackers: list, debug=False, visdom_info=None):
+    """Runs several trackers on a sequence in lockstep, decoding each frame once for all trackers. The trackers that
+    already have results for the sequence are skipped. See track_sequence_fan_out."""
+
+    visdom_info = {} if visdom_info is None else visdom_info
+
+    if not debug:
+        trackers = [t for t in trackers if not _results_exist(seq, t)]
+    if len(trackers) == 0:
+        print('FPS: {}'.format(-1))
+        return
+
+    for tracker in trackers:
+        print('Tracker: {} {} {} ,  Sequence: {}'.format(tracker.name, tracker.parameter_name, tracker.run_id, seq.name))
+
+    if debug:
+        outputs = track_sequence_fan_out(trackers, seq, debug=debug, visdom_info=visdom_info)
+    else:
+        # A tracker that fails is dropped and the other trackers continue on the sequence
+        try:
+            outputs = track_sequence_fan_out(trackers, seq, debug=debug, visdom_info=visdom_info, catch_errors=True)
+        except Exception as e:
+            print(e)
+            return
+
+    sys.stdout.flush()
+
+    for tracker, output in zip(trackers, outputs):
+        if output is None:
+            continue
+        print('Tracker: {} {} {}'.format(tracker.name, tracker.parameter_name, tracker.run_id))
+        _report_and_save_output(seq, tracker, output, debug)
+
+
+def warm_up_networks(trackers):
+    """Loads the networks of the trackers into the process-wide network registry, so that the sequences run in the
+    process get copies of them instead of loading them from disk."""
+    for tracker_info in trackers:
+        tracker = tracker_info.create_tracker(tracker_info.get_parameters())
+        if hasattr(tracker, 'initialize_features'):
+            tracker.initialize_features()
+
+
+def estimate_tracker_cost(tracker: Tracker, max_files=50):
+    """Mean time per frame of a tracker, from the saved times of earlier runs of the tracker (any run id), in the text
+    or npz results format. Returns None if there are no earlier results."""
+    results_dir = os.path.dirname(tracker.results_dir)
+    if not os.path.isdir(results_dir):
+        return None
+
+    run_names = sorted({d[:-len('.npz')] if d.endswith('.npz') else d for d in os.listdir(results_dir)
+                        if d.endswith('.npz') or os.path.isdir(os.path.join(results_dir, d))})
+    run_dirs = [os.path.join(results_dir, d) for d in run_names
+                if d == tracker.parameter_name or d.startswith(tracker.parameter_name + '_')]
+
+    time_results = []
+    for run_dir in run_dirs:
+        names = get_results_store(run_dir).names()
+        if os.path.isdir(run_dir):
+            names += [f[:-len('.txt')] for f in os.listdir(run_dir) if f.endswith('.txt')]
+        time_results += [(run_dir, n) for n in sorted(set(names))
+                         if n.endswith('_time') and not n.endswith(('_stage_time', '_decode_time'))]
+
+    times = []
+    for run_dir, name in time_results[:max_files]:
+        try:
+            times.append(np.atleast_1d(load_results(run_dir, name)))
+        except Exception:
+            continue
+    if len(times) == 0:
+        return None
+    return float(np.concatenate(times).mean())
+
+
+def _schedule_jobs(dataset, trackers, debug, visdom_info, fan_out):
+    """The (run function, arguments, estimated cost, description) of the jobs, ordered by decreasing cost. The cost is
+    the number of frames times the time per frame of the tracker, see estimate_tracker_cost. Trackers without earlier
+    results get the mean cost of the others. Jobs that already have results are placed last."""
+    tracker_costs = [estimate_tracker_cost(t) for t in trackers]
+    known_costs = [c for c in tracker_costs if c is not None]
+    default_cost = np.mean(known_costs) if len(known_costs) > 0 else 1.0
+    tracker_costs = [default_cost if c is None else c for c in tracker_costs]
+
+    def _cost(seq, tracker_inds):
+        inds = [i for i in tracker_inds if debug or not _results_exist(seq, trackers[i])]
+        return len(seq.frames) * sum(tracker_costs[i] for i in inds)
+
+    jobs = []
+    for seq in dataset:
+        if fan_out:
+            jobs.append((run_sequence_fan_out, (seq, trackers, debug, visdom_info), _cost(seq, range(len(trackers))),
+                         seq.name))
+        else:
+            for i, tracker_info in enumerate(trackers):
+                jobs.append((run_sequence, (seq, tracker_info, debug, visdom_info), _cost(seq, [i]),
+                             '{} {} {} {}'.format(seq.name, tracker_info.name, tracker_info.parameter_name,
+                                                  tracker_info.run_id)))
+
+    # Stable sort, so that jobs of equal cost keep the dataset order
+    return sorted(jobs, key=lambda job: -job[2])
+
+
+def _run_indexed_job(indexed_job):
+    job_ind, (run_fn, args) = indexed_job
+    run_fn(*args)
+    return job_ind
+
+
+class _ProgressLog:
+    """Writes the number of finished jobs and the estimated remaining time to stdout and, optionally, a log file. The
+    remaining time is estimated from the estimated costs of the remaining jobs."""
+    def __init__(self, total_cost, num_jobs, log_file=None):
+        self.total_cost = max(total_cost, 1e-9)
+        self.num_jobs = num_jobs
+        self.log_file = log_file
+        self.done_cost = 0.0
+        self.num_done = 0
+        self.start_time = time.time()
+
+    def update(self, cost, description):
+        self.done_cost += cost
+        self.num_done += 1
+        elapsed = time.time() - self.start_time
+        done_ratio = self.done_cost / self.total_cost
+        eta = elapsed * (1 - done_ratio) / done_ratio if done_ratio > 0 else float('nan')
+
+        line = '[{}/{}] {}  elapsed {:.0f} s,  ETA {:.0f} s'.format(self.num_done, self.num_jobs, description, elapsed,
+                                                                    eta)
+        print(line)
+        if self.log_file is not None:
+            with open(self.log_file, 'a') as f:
+                f.write(line + '\n')
+
+
+def run_dataset(dataset, trackers, debug=False, threads=0, visdom_info=None, warm_up=False, fan_out=False,
+                progress_log=None):
     """Runs a list of trackers on a dataset.
     args:
         dataset: List of Sequence instances, forming a dataset.
@@ -179,6 +384,9 @@ def run_dataset(dataset, trackers, debug=False, threads=0, visdom_info=None):
         debug: Debug level.
         threads: Number of threads to use (default 0).
         visdom_info: Dict containing information about the server for visdom
+        warm_up: Load the networks of the trackers when each worker process is started.
+        fan_out: Run all trackers on a sequence in lockstep, so that each frame is only decoded once.
+        progress_log: File to write the progress and estimated remaining time to, in the parallel mode.
     """
     multiprocessing.set_start_method('spawn', force=True)
 
@@ -195,10 +403,19 @@ def run_dataset(dataset, trackers, debug=False, threads=0, visdom_info=None):
 
     if mode == 'sequential':
         for seq in dataset:
+            if fan_out:
+                run_sequence_fan_out(seq, trackers, debug=debug, visdom_info=visdom_info)
+                continue
             for tracker_info in trackers:
                 run_sequence(seq, tracker_info, debug=debug, visdom_info=visdom_info)
     elif mode == 'parallel':
-        param_list = [(seq, tracker_info, debug, visdom_info) for seq, tracker_info in product(dataset, trackers)]
-        with multiprocessing.Pool(processes=threads) as pool:
-            pool.starmap(run_sequence, param_list)
+        # The longest jobs are started first and each worker takes a new job when it is done with the previous one,
+        # so that a few long sequences do not end up last
+        jobs = _schedule_jobs(dataset, trackers, debug, visdom_info, fan_out)
+        progress = _ProgressLog(sum(job[2] for job in jobs), len(jobs), progress_log)
+
+        initializer, initargs = (warm_up_networks, (trackers,)) if warm_up else (None, ())
+        with multiprocessing.Pool(processes=threads, initializer=initializer, initargs=initargs) as pool:
+            for job_ind in pool.imap_unordered(_run_indexed_job, enumerate([job[:2] for job in jobs]), chunksize=1):
+                progress.update(jobs[job_ind][2], jobs[job_ind][3])
     print('Done')
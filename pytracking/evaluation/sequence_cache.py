@@ -0,0 +1,161 @@
+import os
+import json
+import numpy as np
+import cv2 as cv
+from collections import OrderedDict
+from ltr.data.image_loader import default_image_loader
+
+
+_index_file = 'index.json'
+_frames_file = 'frames.npy'
+
+
+class SequenceFrameCache:
+    """The decoded frames of a sequence, stored as one uint8 array of shape (num_frames, H, W, 3) that is memory mapped
+    from disk. Indexing gives zero-copy views of the frames. The frames may be downscaled by the factor scale compared
+    to the original images.
+    args:
+        path - Directory of the cached sequence, containing the frame array and the index file.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, _index_file), 'r') as f:
+            self.index = json.load(f)
+
+        self.scale = self.index['scale']
+
+        self.frames = self._load_frames()
+
+    def _load_frames(self):
+        # Copy-on-write, so that the frames are writable numpy arrays without touching the file
+        return np.load(os.path.join(self.path, _frames_file), mmap_mode='c')
+
+    def __getstate__(self):
+        # The memory map is not pickled with the sequence, it is reopened from the path
+        state = self.__dict__.copy()
+        del state['frames']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.frames = self._load_frames()
+
+    def __len__(self):
+        return self.frames.shape[0]
+
+    def __getitem__(self, item):
+        return self.frames[item]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.frames[i]
+
+    def matches(self, seq):
+        """Check that the cache was created from the frames of the given sequence."""
+        return self.index['frames'] == [os.path.basename(f) for f in seq.frames]
+
+
+def sequence_cache_dir(cache_path, seq):
+    """Directory of the cached frames of a sequence."""
+    return os.path.join(cache_path, seq.dataset, seq.name)
+
+
+def sample_scale(seq, sample_sz, search_area_scale, target_shrink=4.0):
+    """The scale factor of the image at which the tracker samples an image region of search_area_scale times the
+    target size, resized to sample_sz pixels, without losing resolution as long as the target is not smaller than its
+    initial size divided by target_shrink. Only the initial target box is used, not the ground truth of later frames.
+    Targets that shrink further are sampled at a lower resolution than from the original frames, so results produced
+    from downscaled frames are not comparable to results produced from the original images. Returns at most 1."""
+    init_bbox = seq.init_bbox()
+    if isinstance(init_bbox, (dict, OrderedDict)):
+        init_bbox = list(init_bbox.values())
+    init_bbox = np.asarray(init_bbox, dtype=np.float64).reshape(-1, 4)
+    valid = np.all(np.isfinite(init_bbox), axis=1) & (init_bbox[:, 2] > 0) & (init_bbox[:, 3] > 0)
+    if not valid.any():
+        return 1.0
+
+    min_target_sz = np.sqrt(init_bbox[valid, 2] * init_bbox[valid, 3]).min() / target_shrink
+    return min(1.0, sample_sz / (search_area_scale * min_target_sz))
+
+
+def write_sequence_cache(seq, cache_path, scale=1.0, max_size=None, image_loader=default_image_loader):
+    """Decode the frames of a sequence and store them as a memory-mapped uint8 array in the sequence cache.
+    args:
+        seq - The sequence.
+        cache_path - Root directory of the sequence cache.
+        scale - Downscaling factor of the frames, e.g. from sample_scale. Ignored for sequences with segmentation masks.
+        max_size - Optional maximum length of the longest image side.
+        image_loader - Function reading an image from a path.
+    returns:
+        SequenceFrameCache - The cached frames.
+    """
+    path = sequence_cache_dir(cache_path, seq)
+    os.makedirs(path, exist_ok=True)
+
+    # Remove the index first, so that the cache is invalid until it is complete. The frames are written to a new file,
+    # the processes that have the old frames mapped keep reading them
+    index_file = os.path.join(path, _index_file)
+    if os.path.isfile(index_file):
+        os.remove(index_file)
+    tmp_suffix = '.{}.tmp'.format(os.getpid())
+
+    image = image_loader(seq.frames[0])
+    source_size = image.shape[:2]
+
+    if max_size is not None:
+        scale = min(scale, max_size / max(source_size))
+    if seq.ground_truth_seg is not None or scale >= 1:
+        scale = 1.0
+
+    frame_size = tuple(int(round(s * scale)) for s in source_size)
+    frames_file = os.path.join(path, _frames_file)
+    frames = np.lib.format.open_memmap(frames_file + tmp_suffix, mode='w+', dtype=np.uint8,
+                                       shape=(len(seq.frames), *frame_size, 3))
+
+    for i, frame in enumerate(seq.frames):
+        if i > 0:
+            image = image_loader(frame)
+        if image.shape[:2] != frame_size:
+            image = cv.resize(image, (frame_size[1], frame_size[0]), interpolation=cv.INTER_AREA)
+        frames[i] = image
+    frames.flush()
+    del frames
+    os.replace(frames_file + tmp_suffix, frames_file)
+
+    # Written last, so that an interrupted conversion does not leave a valid looking cache
+    index = {'name': seq.name, 'dataset': seq.dataset, 'num_frames': len(seq.frames), 'frame_size': frame_size,
+             'source_size': source_size, 'scale': scale, 'frames': [os.path.basename(f) for f in seq.frames]}
+    with open(index_file + tmp_suffix, 'w') as f:
+        json.dump(index, f)
+    os.replace(index_file + tmp_suffix, index_file)
+
+    return SequenceFrameCache(path)
+
+
+def load_sequence_cache(seq, cache_path):
+    """The cached frames of a sequence, or None if the sequence is not in the cache or the cache is outdated."""
+    path = sequence_cache_dir(cache_path, seq)
+    if not os.path.isfile(os.path.join(path, _index_file)):
+        return None
+
+    frame_cache = SequenceFrameCache(path)
+    if not frame_cache.matches(seq):
+        return None
+    return frame_cache
+
+
+def attach_sequence_cache(seq_list, cache_path):
+    """Set the frame_cache of the sequences that are found in the sequence cache. The trackers then read the frames
+    from the cache instead of decoding the images."""
+    for seq in seq_list:
+        seq.frame_cache = load_sequence_cache(seq, cache_path)
+    return seq_list
+
+
+def scale_bbox(bbox, scale):
+    """Scale a box, or an OrderedDict of boxes, given as [x, y, w, h]."""
+    if bbox is None or scale == 1:
+        return bbox
+    if isinstance(bbox, (dict, OrderedDict)):
+        return OrderedDict({obj_id: scale_bbox(b, scale) for obj_id, b in bbox.items()})
+    return [scale * v for v in bbox]
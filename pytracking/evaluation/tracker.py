@@ -12,6 +12,9 @@ from pytracking.utils.plotting import draw_figure, overlay_mask
 from pytracking.utils.convert_vot_anno_to_rect import convert_vot_anno_to_rect
 from ltr.data.bounding_box_utils import masks_to_bboxes
 from pytracking.evaluation.multi_object_wrapper import MultiObjectWrapper
+from pytracking.evaluation.frame_prefetcher import FramePrefetcher
+from pytracking.evaluation.sequence_cache import scale_bbox
+from pytracking.utils.profiler import disabled_profiler
 from pathlib import Path
 import torch
 
@@ -34,6 +37,137 @@ def trackerlist(name: str, parameter_name: str, run_ids = None, display_name: st
     return [Tracker(name, parameter_name, run_id, display_name) for run_id in run_ids]
 
 
+def _init_sequence_output():
+    # Define outputs
+    # Each field in output is a list containing tracker prediction for each frame.
+
+    # In case of single object tracking mode:
+    # target_bbox[i] is the predicted bounding box for frame i
+    # time[i] is the processing time for frame i
+    # segmentation[i] is the segmentation mask for frame i (numpy array)
+
+    # In case of multi object tracking mode:
+    # target_bbox[i] is an OrderedDict, where target_bbox[i][obj_id] is the predicted box for target obj_id in
+    # frame i
+    # time[i] is either the processing time for frame i, or an OrderedDict containing processing times for each
+    # object in frame i
+    # segmentation[i] is the multi-label segmentation mask for frame i (numpy array)
+
+    # decode_time[i] is the time spent reading and decoding frame i, which is not included in time[i]. The frames
+    # are decoded in a background thread, ahead of the tracker, if params.prefetch_frames > 0. If the sequence has a
+    # frame_cache, the frames are instead read from the memory-mapped cache.
+
+    # stage_time[i] is an OrderedDict with the times of the tracker stages in frame i, if params.profile_stages is set
+
+    # cg_iter_saved[i] is the number of CG iterations skipped by the early exit of the optimizer in frame i, for the
+    # trackers that report it (ECO)
+
+    output = {'target_bbox': [],
+              'time': [],
+              'segmentation': [],
+              'object_presence_score': [],
+              'stage_time': [],
+              'cg_iter_saved': []}
+
+    def _store_outputs(tracker_out: dict, defaults=None):
+        defaults = {} if defaults is None else defaults
+        for key in output.keys():
+            val = tracker_out.get(key, defaults.get(key, None))
+            if key in tracker_out or val is not None:
+                output[key].append(val)
+
+    return output, _store_outputs
+
+
+def _finalize_sequence_output(tracker, seq, output, frames, last_image):
+    if last_image is None:
+        raise ValueError('The sequence {} has no frames.'.format(seq.name))
+    output['image_shape'] = last_image.shape[:2]
+
+    # The cached frames can be downscaled, give the boxes in the original image coordinates
+    frame_cache = getattr(seq, 'frame_cache', None)
+    if frame_cache is not None and frame_cache.scale != 1:
+        output['target_bbox'] = [scale_bbox(bbox, 1 / frame_cache.scale) for bbox in output['target_bbox']]
+        output['image_shape'] = tuple(frame_cache.index['source_size'])
+
+    output['decode_time'] = frames.decode_time
+    output['decode_wait_time'] = frames.wait_time
+
+    for key in ['target_bbox', 'segmentation']:
+        if key in output and len(output[key]) <= 1:
+            output.pop(key)
+
+    output['object_presence_score_threshold'] = tracker.params.get('object_presence_score_threshold', 0.55)
+
+    return output
+
+
+def track_sequence_fan_out(trackers, seq, visualization=None, debug=None, visdom_info=None, catch_errors=False):
+    """Run several trackers on a sequence in lockstep. Each frame is decoded once and given to all trackers, so that
+    the frames are not decoded once per tracker. The outputs, including the per-frame times, are the same as from
+    running Tracker.run_sequence for each tracker.
+    args:
+        trackers: List of Tracker instances.
+        seq: Sequence to run the trackers on.
+        visualization, debug, visdom_info: See Tracker.run_sequence.
+        catch_errors: If True, a tracker that raises an exception is reported and dropped, and the other trackers
+                      continue on the sequence. Otherwise the exception is raised.
+    returns:
+        List of the outputs of the trackers. The output of a dropped tracker is None.
+    """
+    outputs = [None] * len(trackers)
+    tracker_instances = [None] * len(trackers)
+    tracks = OrderedDict()
+
+    def _drop(i, e):
+        print('Tracker: {} {} {} failed on sequence {}: {}'.format(trackers[i].name, trackers[i].parameter_name,
+                                                                   trackers[i].run_id, seq.name, e))
+        tracks.pop(i, None)
+
+    for i, tracker_info in enumerate(trackers):
+        try:
+            tracker_instances[i] = tracker_info.create_sequence_tracker(seq, visualization, debug, visdom_info)
+        except Exception as e:
+            if not catch_errors:
+                raise
+            _drop(i, e)
+
+    instances = [t for t in tracker_instances if t is not None]
+    if len(instances) == 0:
+        return outputs
+
+    num_prefetch = max(t.params.get('prefetch_frames', 8) for t in instances)
+    frame_reader, frame_scale = trackers[0]._sequence_frame_reader(seq, num_prefetch)
+
+    for i, (tracker_info, tracker) in enumerate(zip(trackers, tracker_instances)):
+        if tracker is None:
+            continue
+        output, _store_outputs = _init_sequence_output()
+        track = tracker_info._track_frames(tracker, seq, seq.init_info(), _store_outputs, frame_scale)
+        next(track)
+        outputs[i] = output
+        tracks[i] = track
+
+    last_image = None
+    with frame_reader as frames:
+        for image in frames:
+            for i, track in list(tracks.items()):
+                try:
+                    track.send(image)
+                except Exception as e:
+                    if not catch_errors:
+                        raise
+                    _drop(i, e)
+            if len(tracks) == 0:
+                break
+            last_image = image
+    for track in tracks.values():
+        track.close()
+
+    return [_finalize_sequence_output(tracker_instances[i], seq, output, frames, last_image) if i in tracks else None
+            for i, output in enumerate(outputs)]
+
+
 class Tracker:
     """Wraps the tracker for evaluation and running purposes.
     args:
@@ -54,6 +188,7 @@ class Tracker:
         self.display_name = display_name
 
         env = env_settings()
+        self.results_format = getattr(env, 'results_format', 'text')
         if self.run_id is None:
             self.results_dir = '{}/{}/{}'.format(env.results_path, self.name, self.parameter_name)
             self.segmentation_dir = '{}/{}/{}'.format(env.segmentation_path, self.name, self.parameter_name)
@@ -114,6 +249,16 @@ class Tracker:
             visdom_info: Visdom info.
             multiobj_mode: Which mode to use for multiple objects.
         """
+        tracker = self.create_sequence_tracker(seq, visualization, debug, visdom_info, multiobj_mode)
+
+        # Get init information
+        init_info = seq.init_info()
+
+        output = self._track_sequence(tracker, seq, init_info)
+        return output
+
+    def create_sequence_tracker(self, seq, visualization=None, debug=None, visdom_info=None, multiobj_mode=None):
+        """Create the tracker instance for a sequence. See run_sequence for the arguments."""
         params = self.get_parameters()
         visualization_ = visualization
 
@@ -133,8 +278,6 @@ class Tracker:
         if visualization_ and self.visdom is None:
             self.init_visualization()
 
-        # Get init information
-        init_info = seq.init_info()
         is_single_object = not seq.multiobj_mode
 
         if multiobj_mode is None:
@@ -147,43 +290,46 @@ class Tracker:
         else:
             raise ValueError('Unknown multi object mode {}'.format(multiobj_mode))
 
-        output = self._track_sequence(tracker, seq, init_info)
-        return output
+        return tracker
 
     def _track_sequence(self, tracker, seq, init_info):
-        # Define outputs
-        # Each field in output is a list containing tracker prediction for each frame.
-
-        # In case of single object tracking mode:
-        # target_bbox[i] is the predicted bounding box for frame i
-        # time[i] is the processing time for frame i
-        # segmentation[i] is the segmentation mask for frame i (numpy array)
-
-        # In case of multi object tracking mode:
-        # target_bbox[i] is an OrderedDict, where target_bbox[i][obj_id] is the predicted box for target obj_id in
-        # frame i
-        # time[i] is either the processing time for frame i, or an OrderedDict containing processing times for each
-        # object in frame i
-        # segmentation[i] is the multi-label segmentation mask for frame i (numpy array)
-
-        output = {'target_bbox': [],
-                  'time': [],
-                  'segmentation': [],
-                  'object_presence_score': []}
-
-        def _store_outputs(tracker_out: dict, defaults=None):
-            defaults = {} if defaults is None else defaults
-            for key in output.keys():
-                val = tracker_out.get(key, defaults.get(key, None))
-                if key in tracker_out or val is not None:
-                    output[key].append(val)
+        frame_reader, frame_scale = self._sequence_frame_reader(seq, tracker.params.get('prefetch_frames', 8))
+
+        output, _store_outputs = _init_sequence_output()
+        track = self._track_frames(tracker, seq, init_info, _store_outputs, frame_scale)
+        next(track)
+
+        last_image = None
+        with frame_reader as frames:
+            for image in frames:
+                track.send(image)
+                last_image = image
+        track.close()
+
+        return _finalize_sequence_output(tracker, seq, output, frames, last_image)
+
+    def _sequence_frame_reader(self, seq, num_prefetch):
+        """FramePrefetcher for the frames of a sequence and the scale of the frames. If the sequence has a frame_cache,
+        the frames are read from the memory-mapped cache, otherwise they are decoded num_prefetch frames ahead."""
+        frame_cache = getattr(seq, 'frame_cache', None)
+        if frame_cache is not None:
+            return FramePrefetcher(frame_cache, 0, self._read_image), frame_cache.scale
+        return FramePrefetcher(seq.frames, num_prefetch), 1.0
+
+    def _track_frames(self, tracker, seq, init_info, _store_outputs, frame_scale=1.0):
+        """Generator tracking the frames of the sequence that are sent to it, one frame per send."""
+        if frame_scale != 1:
+            init_info = dict(init_info, init_bbox=scale_bbox(init_info.get('init_bbox'), frame_scale))
 
         # Initialize
-        image = self._read_image(seq.frames[0])
+        image = yield
 
         if tracker.params.visualization and self.visdom is None:
             self.visualize(image, init_info.get('init_bbox'))
 
+        profiler = getattr(tracker, 'profiler', disabled_profiler)
+        profiler.new_frame()
+
         start_time = time.time()
         out = tracker.initialize(image, init_info)
         if out is None:
@@ -194,11 +340,15 @@ class Tracker:
         init_default = {'target_bbox': init_info.get('init_bbox'),
                         'time': time.time() - start_time,
                         'segmentation': init_info.get('init_mask'),
-                        'object_presence_score': 1.}
+                        'object_presence_score': 1.,
+                        'stage_time': profiler.current_frame()}
 
         _store_outputs(out, init_default)
 
-        for frame_num, frame_path in enumerate(seq.frames[1:], start=1):
+        frame_num = 1
+        while True:
+            image = yield
+
             while True:
                 if not self.pause_mode:
                     break
@@ -208,16 +358,17 @@ class Tracker:
                 else:
                     time.sleep(0.1)
 
-            image = self._read_image(frame_path)
-
+            profiler.new_frame()
             start_time = time.time()
 
             info = seq.frame_info(frame_num)
+            if frame_scale != 1 and 'init_bbox' in info:
+                info['init_bbox'] = scale_bbox(info['init_bbox'], frame_scale)
             info['previous_output'] = prev_output
 
             out = tracker.track(image, info)
             prev_output = OrderedDict(out)
-            _store_outputs(out, {'time': time.time() - start_time})
+            _store_outputs(out, {'time': time.time() - start_time, 'stage_time': profiler.current_frame()})
 
             segmentation = out['segmentation'] if 'segmentation' in out else None
             if self.visdom is not None:
@@ -225,14 +376,7 @@ class Tracker:
             elif tracker.params.visualization:
                 self.visualize(image, out['target_bbox'], segmentation)
 
-        for key in ['target_bbox', 'segmentation']:
-            if key in output and len(output[key]) <= 1:
-                output.pop(key)
-
-        output['image_shape'] = image.shape[:2]
-        output['object_presence_score_threshold'] = tracker.params.get('object_presence_score_threshold', 0.55)
-
-        return output
+            frame_num += 1
 
     def run_video(self, videofilepath, optional_box=None, debug=None, visdom_info=None, save_results=False):
         """Run the tracker with the video file.
@@ -710,6 +854,9 @@ class Tracker:
             print("Resetting target pos to gt!")
 
     def _read_image(self, image_file: str):
+        if isinstance(image_file, np.ndarray):
+            # Already decoded, e.g. a frame of a SequenceFrameCache
+            return image_file
         im = cv.imread(image_file)
         return cv.cvtColor(im, cv.COLOR_BGR2RGB)
 
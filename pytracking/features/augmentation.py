@@ -101,6 +101,10 @@ class Affine(Transform):
         super().__init__(output_sz, shift)
         self.transform_matrix = transform_matrix
 
+    def affine_matrix(self, image_shape):
+        """The 2x3 transformation matrix, in the convention of cv.warpAffine."""
+        return np.asarray(self.transform_matrix, dtype=np.float64)
+
     def __call__(self, image, is_mask=False):
         if isinstance(image, torch.Tensor):
             return self.crop_to_output(numpy_to_torch(self(torch_to_numpy(image))))
@@ -114,14 +118,18 @@ class Rotate(Transform):
         super().__init__(output_sz, shift)
         self.angle = math.pi * angle/180
 
+    def affine_matrix(self, image_shape):
+        """The 2x3 transformation matrix, in the convention of cv.warpAffine."""
+        c = (np.expand_dims(np.array(image_shape[:2]),1)-1)/2
+        R = np.array([[math.cos(self.angle), math.sin(self.angle)],
+                      [-math.sin(self.angle), math.cos(self.angle)]])
+        return np.concatenate([R, c - R @ c], 1)
+
     def __call__(self, image, is_mask=False):
         if isinstance(image, torch.Tensor):
             return self.crop_to_output(numpy_to_torch(self(torch_to_numpy(image))))
         else:
-            c = (np.expand_dims(np.array(image.shape[:2]),1)-1)/2
-            R = np.array([[math.cos(self.angle), math.sin(self.angle)],
-                          [-math.sin(self.angle), math.cos(self.angle)]])
-            H =np.concatenate([R, c - R @ c], 1)
+            H = self.affine_matrix(image.shape)
             return cv.warpAffine(image, H, image.shape[1::-1], borderMode=cv.BORDER_REPLICATE)
 
 
@@ -230,3 +238,85 @@ class RandomAffine(Transform):
             image_t = numpy_to_torch(image_t)
 
         return self.crop_to_output(image_t)
+
+
+def warp_affine_batch(image: torch.Tensor, matrices) -> torch.Tensor:
+    """Warp an image with several affine transformations using a single grid_sample. Bilinear interpolation with
+    replicated borders, as cv.warpAffine with BORDER_REPLICATE.
+    args:
+        image: Image (1, C, H, W).
+        matrices: List of 2x3 transformation matrices, in the convention of cv.warpAffine.
+    returns:
+        The warped images (len(matrices), C, H, W).
+    """
+    h, w = image.shape[2:]
+
+    # Inverse maps from output to input pixel coordinates
+    inv = np.stack([np.linalg.inv(np.concatenate([m, [[0, 0, 1]]]))[:2, :] for m in matrices])
+    inv = torch.from_numpy(inv).float().to(image.device)
+
+    y, x = torch.meshgrid(torch.arange(h, dtype=torch.float32, device=image.device),
+                          torch.arange(w, dtype=torch.float32, device=image.device), indexing='ij')
+    coords = torch.stack((x, y, torch.ones_like(x)), -1).view(1, -1, 3)
+    src = torch.matmul(coords, inv.transpose(1, 2))
+
+    # Normalize to [-1, 1]
+    grid = src / torch.Tensor([(w - 1) / 2, (h - 1) / 2]).to(image.device) - 1
+    grid = grid.view(-1, h, w, 2)
+
+    return F.grid_sample(image.expand(grid.shape[0], -1, -1, -1), grid, mode='bilinear', padding_mode='border',
+                         align_corners=True)
+
+
+def blur_batch(image: torch.Tensor, blurs) -> torch.Tensor:
+    """Blur an image with several Gaussian filters using one grouped separable convolution.
+    args:
+        image: Image (1, C, H, W).
+        blurs: List of Blur transforms.
+    returns:
+        The blurred images (len(blurs), C, H, W).
+    """
+    num_blur = len(blurs)
+    num_channels = image.shape[1]
+    fsz = [max(b.filter_size[d] for b in blurs) for d in range(2)]
+
+    # Zero pad the filters to the same size
+    filt_y = torch.cat([F.pad(b.filter[0].view(1, -1), (fsz[0] - b.filter_size[0],) * 2) for b in blurs])
+    filt_x = torch.cat([F.pad(b.filter[1].view(1, -1), (fsz[1] - b.filter_size[1],) * 2) for b in blurs])
+    filt_y = filt_y.repeat(num_channels, 1).view(-1, 1, 2*fsz[0]+1, 1).to(image.device)
+    filt_x = filt_x.repeat(num_channels, 1).view(-1, 1, 1, 2*fsz[1]+1).to(image.device)
+
+    im1 = F.conv2d(image, filt_y, padding=(fsz[0], 0), groups=num_channels)
+    im2 = F.conv2d(im1, filt_x, padding=(0, fsz[1]), groups=num_channels*num_blur)
+
+    return im2.view(num_channels, num_blur, *image.shape[2:]).transpose(0, 1)
+
+
+def apply_transforms(image: torch.Tensor, transforms, is_mask=False) -> torch.Tensor:
+    """Apply a list of transforms to an image and concatenate the results, as torch.cat([T(image) for T in
+    transforms]). All rotations and affine transformations are done with a single grid_sample and all blurs with a
+    single grouped convolution. The other transforms are applied one at a time.
+    args:
+        image: Image (1, C, H, W).
+        transforms: List of transforms.
+    """
+    outputs = [None] * len(transforms)
+
+    warp_inds = [i for i, T in enumerate(transforms) if isinstance(T, (Rotate, Affine))]
+    if warp_inds:
+        im_np_shape = (image.shape[2], image.shape[3], image.shape[1])
+        warped = warp_affine_batch(image, [transforms[i].affine_matrix(im_np_shape) for i in warp_inds])
+        for i, im in zip(warp_inds, warped):
+            outputs[i] = transforms[i].crop_to_output(im.unsqueeze(0))
+
+    blur_inds = [i for i, T in enumerate(transforms) if isinstance(T, Blur)]
+    if blur_inds:
+        blurred = blur_batch(image, [transforms[i] for i in blur_inds])
+        for i, im in zip(blur_inds, blurred):
+            outputs[i] = transforms[i].crop_to_output(im.unsqueeze(0))
+
+    for i, T in enumerate(transforms):
+        if outputs[i] is None:
+            outputs[i] = T(image, is_mask=is_mask)
+
+    return torch.cat(outputs)
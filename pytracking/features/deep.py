@@ -4,10 +4,11 @@ import torchvision
 from pytracking import TensorList
 from pytracking.evaluation.environment import env_settings
 import os
-from pytracking.utils.loading import load_network
+from pytracking.utils.loading import load_network, get_shared_network
 from ltr.models.backbone.resnet18_vggm import resnet18_vggmconv1
 from ltr.models.backbone.cvt import CvT
 from ltr.models.backbone.mobilenetv3 import mobilenet3
+from pytracking.features.icg import icg_features
 normalize = torchvision.transforms.Normalize(mean=[0.485, 0.456, 0.406],
                                              std=[0.229, 0.224, 0.225])
 
@@ -50,20 +51,18 @@ class cvt(MultiFeatureBase):
                 root_paths = [root_paths]
             net_path_full = [os.path.join(root, self.net_path) for root in root_paths]
 
-        self.net = None
-        for net_path in net_path_full:
-            try:
-                self.net = CvT()
-                self.net.load_state_dict(torch.load(net_path), strict=False)
-                break
-            except:
-                pass
-        if self.net is None:
+        def _load():
+            for net_path in net_path_full:
+                try:
+                    net = CvT()
+                    net.load_state_dict(torch.load(net_path), strict=False)
+                    return net
+                except:
+                    pass
             raise Exception('Did not find network file {}'.format(self.net_path))
 
-        if self.use_gpu:
-            self.net.cuda()
-        self.net.eval()
+        self.net = get_shared_network(('cvt', tuple(net_path_full)), _load,
+                                      device='cuda' if self.use_gpu else None)
 
     def dim(self):
         return TensorList([self.layer_dim[l] for l in self.output_layers])
@@ -123,20 +122,22 @@ class ResNet18m1(MultiFeatureBase):
             if isinstance(root_paths, str):
                 root_paths = [root_paths]
             net_path_full = [os.path.join(root, self.net_path) for root in root_paths]
-        print(net_path_full)
+        # The 'edg' layer is computed directly from the image
+        self.net_layers = [l for l in self.output_layers if l != 'edg']
         self.net = None
-        for net_path in net_path_full:
-            try:
-                self.net = resnet18_vggmconv1(self.output_layers, path=net_path)
-                break
-            except:
-                pass
-        if self.net is None:
+        if not self.net_layers:
+            return
+
+        def _load():
+            for net_path in net_path_full:
+                try:
+                    return resnet18_vggmconv1(self.net_layers, path=net_path)
+                except:
+                    pass
             raise Exception('Did not find network file {}'.format(self.net_path))
 
-        if self.use_gpu:
-            self.net.cuda()
-        self.net.eval()
+        self.net = get_shared_network(('resnet18_vggmconv1', tuple(net_path_full), tuple(self.net_layers)), _load,
+                                      device='cuda' if self.use_gpu else None)
 
     def dim(self):
         return TensorList([self.layer_dim[l] for l in self.output_layers])
@@ -145,15 +146,22 @@ class ResNet18m1(MultiFeatureBase):
         return TensorList([s * self.layer_stride[l] for l, s in zip(self.output_layers, self.pool_stride)])
 
     def extract(self, im: torch.Tensor):
-        im = im / 255
-        im -= self.mean
-        im /= self.std
+        output_features = {}
+        if 'edg' in self.output_layers:
+            output_features['edg'] = icg_features(im.cuda() if self.use_gpu else im)
 
-        if self.use_gpu:
-            im = im.cuda()
+        if self.net is not None:
+            im = im / 255
+            im -= self.mean
+            im /= self.std
 
-        with torch.no_grad():
-            return TensorList(self.net(im).values())
+            if self.use_gpu:
+                im = im.cuda()
+
+            with torch.no_grad():
+                output_features.update(self.net(im))
+
+        return TensorList([output_features[l] for l in self.output_layers])
 
 class Mobilenet(MultiFeatureBase):
     """ResNet18 feature together with the VGG-m conv1 layer.
@@ -195,19 +203,22 @@ class Mobilenet(MultiFeatureBase):
                 root_paths = [root_paths]
             net_path_full = [os.path.join(root, self.net_path) for root in root_paths]
 
+        # The 'edg' layer is computed directly from the image
+        self.net_layers = [l for l in self.output_layers if l != 'edg']
         self.net = None
-        for net_path in net_path_full:
-            try:
-                self.net = mobilenet3(self.output_layers)
-                break
-            except:
-                pass
-        if self.net is None:
+        if not self.net_layers:
+            return
+
+        def _load():
+            for net_path in net_path_full:
+                try:
+                    return mobilenet3(self.net_layers)
+                except:
+                    pass
             raise Exception('Did not find network file {}'.format(self.net_path))
 
-        if self.use_gpu:
-            self.net.cuda()
-        self.net.eval()
+        self.net = get_shared_network(('mobilenet3', tuple(net_path_full), tuple(self.net_layers)), _load,
+                                      device='cuda' if self.use_gpu else None)
 
     def dim(self):
         return TensorList([self.layer_dim[l] for l in self.output_layers])
@@ -216,15 +227,22 @@ class Mobilenet(MultiFeatureBase):
         return TensorList([s * self.layer_stride[l] for l, s in zip(self.output_layers, self.pool_stride)])
 
     def extract(self, im: torch.Tensor):
-        im = im / 255
-        im -= self.mean
-        im /= self.std
+        output_features = {}
+        if 'edg' in self.output_layers:
+            output_features['edg'] = icg_features(im.cuda() if self.use_gpu else im)
 
-        if self.use_gpu:
-            im = im.cuda()
+        if self.net is not None:
+            im = im / 255
+            im -= self.mean
+            im /= self.std
 
-        with torch.no_grad():
-            return TensorList(self.net(im).values())
+            if self.use_gpu:
+                im = im.cuda()
+
+            with torch.no_grad():
+                output_features.update(self.net(im))
+
+        return TensorList([output_features[l] for l in self.output_layers])
 
 class ATOMResNet18(MultiFeatureBase):
     """ResNet18 feature with the ATOM IoUNet.
@@ -242,11 +260,7 @@ class ATOMResNet18(MultiFeatureBase):
         self.net_path = net_path
 
     def initialize(self):
-        self.net = load_network(self.net_path)
-
-        if self.use_gpu:
-            self.net.cuda()
-        self.net.eval()
+        self.net = load_network(self.net_path, device='cuda' if self.use_gpu else None)
 
         self.iou_predictor = self.net.bb_regressor
 
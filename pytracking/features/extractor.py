@@ -1,6 +1,8 @@
 import torch
-from pytracking.features.preprocessing import sample_patch
+from pytracking.features.preprocessing import sample_patch, sample_patch_multiscale, sample_patch_batch
+from pytracking.features import augmentation
 from pytracking import TensorList
+from pytracking.utils.profiler import disabled_profiler
 
 class ExtractorBase:
     """Base feature extractor class.
@@ -9,6 +11,8 @@ class ExtractorBase:
     """
     def __init__(self, features):
         self.features = features
+        self.profiler = disabled_profiler
+
     def initialize(self):
         for f in self.features:
             f.initialize()
@@ -36,7 +40,7 @@ class SingleResolutionExtractor(ExtractorBase):
             scales = [scales]
 
         # Get image patches
-        im_patches = torch.cat([sample_patch(im, pos, s*image_sz, image_sz) for s in scales])
+        im_patches, _ = sample_patch_multiscale(im, pos, scales, image_sz)
 
         # Compute features
         feature_map = torch.cat(TensorList([f.get_feature(im_patches) for f in self.features]).unroll(), dim=1)
@@ -92,6 +96,17 @@ class MultiResolutionExtractor(ExtractorBase):
     def set_is_color(self, is_color: bool):
         self.is_color = is_color
 
+    def _get_features(self, im_patches):
+        """Compute the features of the image patches, timing each feature as a separate profiler stage."""
+        if not self.profiler.enabled:
+            return TensorList([f.get_feature(im_patches) for f in self.features]).unroll()
+
+        feature_map = []
+        for f in self.features:
+            with self.profiler.stage('features/' + type(f).__name__):
+                feature_map.append(f.get_feature(im_patches))
+        return TensorList(feature_map).unroll()
+
     def extract(self, im, pos, scales, image_sz, return_patches=False):
         """Extract features.
         args:
@@ -100,19 +115,15 @@ class MultiResolutionExtractor(ExtractorBase):
             scales: Image scales to extract features from.
             image_sz: Size to resize the image samples to before extraction.
         """
-        if isinstance(scales, (int, float)):
-            scales = [scales]
-
         # Get image patches
-        patch_iter, coord_iter = zip(*(sample_patch(im, pos, s*image_sz, image_sz, mode=self.patch_mode,
-                                                    max_scale_change=self.max_scale_change) for s in scales))
-        im_patches = torch.cat(list(patch_iter))
-        patch_coords = torch.cat(list(coord_iter))
+        with self.profiler.stage('patch_sampling'):
+            im_patches, patch_coords = sample_patch_multiscale(im, pos, scales, image_sz, mode=self.patch_mode,
+                                                               max_scale_change=self.max_scale_change)
 
         # im_patches = torch.cat([sample_patch(im, pos, s*image_sz, image_sz) for s in scales])
 
         # Compute features
-        feature_map = TensorList([f.get_feature(im_patches) for f in self.features]).unroll()
+        feature_map = self._get_features(im_patches)
 
         # cvt = self.model
 
@@ -126,6 +137,28 @@ class MultiResolutionExtractor(ExtractorBase):
         else:
             return feature_map, patch_coords
 
+    def extract_batch(self, im, pos, scales, image_sz):
+        """Extract features for several targets with a single call of each feature.
+        args:
+            im: Image.
+            pos: Center positions for extraction (num_targets, 2).
+            scales: Image scales to extract features from (num_targets, num_scales).
+            image_sz: Size to resize the image samples to before extraction.
+        returns:
+            The features, with the samples of the same target in consecutive positions of the batch dimension.
+        """
+
+        # Get image patches
+        with self.profiler.stage('patch_sampling'):
+            im_patches, _ = sample_patch_batch(im, pos.repeat_interleave(scales.shape[1], dim=0),
+                                               scales.reshape(-1, 1) * image_sz.view(1, -1), image_sz,
+                                               mode=self.patch_mode, max_scale_change=self.max_scale_change)
+
+        # Compute features
+        feature_map = self._get_features(im_patches)
+
+        return feature_map
+
     def extract_transformed(self, im, pos, scale, image_sz, transforms):
         """Extract features from a set of transformed image samples.
         args:
@@ -137,13 +170,14 @@ class MultiResolutionExtractor(ExtractorBase):
         """
 
         # Get image patche
-        im_patch, _ = sample_patch(im, pos, scale*image_sz, image_sz)
+        with self.profiler.stage('patch_sampling'):
+            im_patch, _ = sample_patch(im, pos, scale*image_sz, image_sz)
 
-        # Apply transforms
-        im_patches = torch.cat([T(im_patch) for T in transforms])
+            # Apply transforms
+            im_patches = augmentation.apply_transforms(im_patch, transforms)
 
         # Compute features
-        feature_map = TensorList([f.get_feature(im_patches) for f in self.features]).unroll()
+        feature_map = self._get_features(im_patches)
         # cvt = self.model
 
         # ft1 = cvt.feat_layers[0](im_patches)
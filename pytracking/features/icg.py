@@ -0,0 +1,83 @@
+import math
+import torch
+import torch.nn.functional as F
+from pytracking.features.featurebase import FeatureBase
+
+
+def icg_dim(num_orientations=4):
+    """Number of ICG channels: the intensity plus magnitude and orientation bins for the intensity and each colour."""
+    return 1 + 4 * (1 + num_orientations)
+
+
+def icg_features(im: torch.Tensor, num_orientations=4):
+    """Computes the stride-1 intensity and colour gradient (ICG) feature map for a batch of image patches.
+    All patches and all gradient sources are processed in a single vectorized pass.
+    args:
+        im: Image patches (N, 3, H, W) or (N, 1, H, W) in the range [0, 255].
+        num_orientations: Number of unsigned orientation bins.
+    returns:
+        Feature map (N, icg_dim(num_orientations), H, W).
+    """
+
+    im = im / 255
+    if im.shape[1] == 1:
+        im = im.expand(-1, 3, -1, -1)
+
+    # Gradient sources: intensity followed by the colour channels
+    intensity = im.mean(dim=1, keepdim=True)
+    src = torch.cat((intensity, im), dim=1)
+
+    # Central differences with replicated borders
+    src_pad = F.pad(src, (1, 1, 1, 1), 'replicate')
+    gx = 0.5 * (src_pad[:, :, 1:-1, 2:] - src_pad[:, :, 1:-1, :-2])
+    gy = 0.5 * (src_pad[:, :, 2:, 1:-1] - src_pad[:, :, :-2, 1:-1])
+
+    mag = torch.sqrt(gx*gx + gy*gy)
+
+    # Unsigned orientation in units of bins
+    ori = torch.atan2(gy, gx)
+    ori = torch.where(ori < 0, ori + math.pi, ori) * (num_orientations / math.pi)
+    bin_low = ori.floor()
+    w_high = ori - bin_low
+    bin_low = bin_low.long()
+    bin_low[bin_low >= num_orientations] = 0
+    bin_high = bin_low + 1
+    bin_high[bin_high == num_orientations] = 0
+
+    # Write all channels directly into the output
+    num_src = src.shape[1]
+    feat = mag.new_zeros(mag.shape[0], 1 + num_src * (1 + num_orientations), mag.shape[2], mag.shape[3])
+    feat[:, 0:1, ...] = intensity - 0.5
+    grad_feat = feat[:, 1:, ...].view(mag.shape[0], num_src, 1 + num_orientations, mag.shape[2], mag.shape[3])
+    grad_feat[:, :, 0, ...] = mag
+
+    # Soft assignment of the magnitude to the two closest orientation bins
+    hist = grad_feat[:, :, 1:, ...]
+    hist.scatter_add_(2, bin_low.unsqueeze(2), (mag * (1 - w_high)).unsqueeze(2))
+    hist.scatter_add_(2, bin_high.unsqueeze(2), (mag * w_high).unsqueeze(2))
+
+    return feat
+
+
+class ICG(FeatureBase):
+    """Intensity and colour gradient feature ('edg'). Computed directly from the image, no network is needed.
+    args:
+        num_orientations: Number of unsigned orientation bins per gradient source.
+        use_gpu: Compute the feature on the GPU. Default is CPU.
+    """
+    def __init__(self, num_orientations=4, use_gpu=False, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.num_orientations = num_orientations
+        self.use_gpu = use_gpu
+
+    def dim(self):
+        return icg_dim(self.num_orientations)
+
+    def stride(self):
+        return self.pool_stride
+
+    def extract(self, im: torch.Tensor):
+        if self.use_gpu:
+            im = im.cuda()
+
+        return icg_features(im, self.num_orientations)
@@ -1,5 +1,5 @@
 import torch
-from pytracking.utils.loading import load_network
+from pytracking.utils.loading import load_network, copy_submodules
 
 
 class NetWrapper:
@@ -28,11 +28,14 @@ class NetWrapper:
         return ret_val
 
     def load_network(self):
-        self.net = load_network(self.net_path, **self.net_kwargs)
-        if self.use_gpu:
-            self.cuda()
+        self.net = load_network(self.net_path, device='cuda' if self.use_gpu else None, **self.net_kwargs)
         self.eval()
 
+    def copy_submodules(self, *names):
+        """Replace the network by a copy with its own copies of the given submodules, before they are modified. The
+        loaded network is shared with the other trackers in the process, see pytracking.utils.loading."""
+        self.net = copy_submodules(self.net, names)
+
     def initialize(self):
         self.load_network()
 
@@ -45,6 +45,12 @@ def sample_patch_multiscale(im, pos, scales, image_sz, mode: str='replicate', ma
     if isinstance(scales, (int, float)):
         scales = [scales]
 
+    # Sample all scales at once
+    if mode in ['replicate', 'inside', 'inside_major']:
+        sample_sz = torch.stack([s*image_sz for s in scales]) if isinstance(scales, (list, tuple)) else \
+                    scales.view(-1, 1) * image_sz.view(1, -1)
+        return sample_patch_batch(im, pos, sample_sz, image_sz, mode=mode, max_scale_change=max_scale_change)
+
     # Get image patches
     patch_iter, coord_iter = zip(*(sample_patch(im, pos, s*image_sz, image_sz, mode=mode,
                                                 max_scale_change=max_scale_change) for s in scales))
@@ -54,6 +60,92 @@ def sample_patch_multiscale(im, pos, scales, image_sz, mode: str='replicate', ma
     return  im_patches, patch_coords
 
 
+def sample_patch_batch(im: torch.Tensor, pos: torch.Tensor, sample_sz: torch.Tensor, output_sz: torch.Tensor,
+                       mode: str = 'replicate', max_scale_change=None):
+    """Sample a batch of image patches, all resized to the same size. Gives the same patches and coordinates as
+    calling sample_patch for each patch, but samples all of them with a single gather from the image.
+
+    args:
+        im: Image
+        pos: center position of the crops, (2,) or one per patch (num_patches, 2)
+        sample_sz: sizes to crop (num_patches, 2)
+        output_sz: size to resize to
+        mode: how to treat image borders: 'replicate' (default), 'inside' or 'inside_major'
+        max_scale_change: maximum allowed scale change when using 'inside' and 'inside_major' mode
+    """
+
+    if mode not in ['replicate', 'inside', 'inside_major']:
+        raise ValueError('Unknown border mode \'{}\'.'.format(mode))
+
+    sample_sz = sample_sz.view(-1, 2).float()
+    num_patches = sample_sz.shape[0]
+    posl = pos.long().view(-1, 2).expand(num_patches, 2)
+    im_sz = torch.LongTensor([im.shape[2], im.shape[3]])
+    output_sz = output_sz.long()
+
+    # Get new sample size if forced inside the image
+    if mode == 'inside' or mode == 'inside_major':
+        shrink_factor = sample_sz / im_sz.float()
+        if mode == 'inside':
+            shrink_factor = shrink_factor.max(dim=1, keepdim=True)[0]
+        elif mode == 'inside_major':
+            shrink_factor = shrink_factor.min(dim=1, keepdim=True)[0]
+        shrink_factor.clamp_(min=1, max=max_scale_change)
+        sample_sz = (sample_sz / shrink_factor).long().float()
+
+    # Compute pre-downsampling factor
+    resize_factor = (sample_sz / output_sz.float()).min(dim=1, keepdim=True)[0]
+    df = torch.trunc(resize_factor - 0.1).long().clamp(min=1)
+
+    # Positions and image sizes after the downsampling
+    offset = posl % df
+    posl = (posl - offset) // df
+    im2_sz = (im_sz - offset + df - 1) // df
+
+    # compute size to crop
+    szl = (sample_sz / df).round().clamp(min=2).long()
+
+    # Extract top and bottom coordinates
+    tl = posl - (szl - 1) // 2
+    br = posl + szl//2 + 1
+
+    # Shift the crop to inside
+    if mode == 'inside' or mode == 'inside_major':
+        shift = (-tl).clamp(0) - (br - im2_sz).clamp(0)
+        tl += shift
+        br += shift
+
+        outside = ((-tl).clamp(0) + (br - im2_sz).clamp(0)) // 2
+        shift = (-tl - outside) * (outside > 0).long()
+        tl += shift
+        br += shift
+
+    # Get image coordinates
+    patch_coords = df * torch.cat((tl, br), dim=1)
+
+    # Source coordinates of the bilinear resize (F.interpolate, align_corners=False) of each crop, in the
+    # pre-downsampled image
+    src = []
+    for d in range(2):
+        scale = szl[:, d:d+1].float() / output_sz[d].item()
+        s = ((torch.arange(output_sz[d].item()).float().view(1, -1) + 0.5) * scale - 0.5).clamp(min=0)
+        src.append(tl[:, d:d+1].float() + s.min(szl[:, d:d+1].float() - 1))
+
+    # Resample all crops with the same pre-downsampling at once. The border padding replicates the image border.
+    im_patches = im.new_empty(num_patches, im.shape[1], output_sz[0].item(), output_sz[1].item())
+    groups, group_inds = torch.unique(torch.cat((df, offset), dim=1), dim=0, return_inverse=True)
+    for g, (gdf, oy, ox) in enumerate(groups.tolist()):
+        inds = (group_inds == g).nonzero().view(-1)
+        im2 = im[..., oy::gdf, ox::gdf]
+        gy = (2 * src[0][inds] + 1) / im2.shape[2] - 1
+        gx = (2 * src[1][inds] + 1) / im2.shape[3] - 1
+        grid = torch.stack((gx.unsqueeze(1).expand(-1, gy.shape[1], -1), gy.unsqueeze(2).expand(-1, -1, gx.shape[1])), dim=3)
+        im_patches[inds.to(im.device)] = F.grid_sample(im2.expand(inds.numel(), -1, -1, -1), grid.to(im.device),
+                                                       mode='bilinear', padding_mode='border', align_corners=False)
+
+    return im_patches, patch_coords
+
+
 def sample_patch(im: torch.Tensor, pos: torch.Tensor, sample_sz: torch.Tensor, output_sz: torch.Tensor = None,
                  mode: str = 'replicate', max_scale_change=None, is_mask=False):
     """Sample an image patch.
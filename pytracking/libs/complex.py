@@ -10,6 +10,23 @@ def is_real(a: torch.Tensor) -> bool:
     return not is_complex(a)
 
 
+def as_native(a: torch.Tensor) -> torch.Tensor:
+    """View a complex tensor with a last dimension of length 2 as a native complex tensor (no copy if possible)."""
+
+    if a.is_complex():
+        return a
+    try:
+        return torch.view_as_complex(a)
+    except RuntimeError:
+        return torch.view_as_complex(a.contiguous())
+
+
+def from_native(a: torch.Tensor) -> torch.Tensor:
+    """View a native complex tensor as a real tensor with a last dimension of length 2."""
+
+    return torch.view_as_real(a.resolve_conj())
+
+
 @tensor_operation
 def mult(a: torch.Tensor, b: torch.Tensor):
     """Pointwise complex multiplication of complex tensors."""
@@ -26,10 +43,7 @@ def mult(a: torch.Tensor, b: torch.Tensor):
         return mult_real_cplx(b, a)
 
     # Both complex
-    c = mult_real_cplx(a[..., 0], b)
-    c[..., 0] -= a[..., 1] * b[..., 1]
-    c[..., 1] += a[..., 1] * b[..., 0]
-    return c
+    return from_native(as_native(a) * as_native(b))
 
 
 @tensor_operation
@@ -48,10 +62,7 @@ def mult_conj(a: torch.Tensor, b: torch.Tensor):
         return mult_real_cplx(b, a)
 
     # Both complex
-    c = mult_real_cplx(b[...,0], a)
-    c[..., 0] += a[..., 1] * b[..., 1]
-    c[..., 1] -= a[..., 0] * b[..., 1]
-    return c
+    return from_native(as_native(a) * as_native(b).conj())
 
 
 @tensor_operation
@@ -74,7 +85,7 @@ def div(a: torch.Tensor, b: torch.Tensor):
         # b is real
         return div_cplx_real(a, b)
 
-    return div_cplx_real(mult_conj(a, b), abs_sqr(b))
+    return from_native(as_native(a) / as_native(b))
 
 
 @tensor_operation
@@ -114,8 +125,7 @@ def conj(a: torch.Tensor):
     if is_real(a):
         raise ValueError('Last dimension must have length 2.')
 
-    # return a * torch.Tensor([1, -1], device=a.device)
-    return complex(a[...,0], -a[...,1])
+    return from_native(torch.conj_physical(as_native(a)))
 
 
 @tensor_operation
@@ -163,19 +173,10 @@ def mtimes(a: torch.Tensor, b: torch.Tensor, conj_a=False, conj_b=False):
         if b.dim() >= a.dim():
             raise ValueError('Incorrect dimensions.')
         return mtimes_complex_real(a, b, conj_a=conj_a)
-#    print(a.shape, b.shape)
-    if not conj_a and not conj_b:
-        return complex(torch.matmul(a[..., 0], b[..., 0]) - torch.matmul(a[..., 1], b[..., 1]),
-                       torch.matmul(a[..., 0], b[..., 1]) + torch.matmul(a[..., 1], b[..., 0]))
-    if conj_a and not conj_b:
-        return complex(torch.matmul(a[..., 0], b[..., 0]) + torch.matmul(a[..., 1], b[..., 1]),
-                       torch.matmul(a[..., 0], b[..., 1]) - torch.matmul(a[..., 1], b[..., 0]))
-    if not conj_a and conj_b:
-        return complex(torch.matmul(a[..., 0], b[..., 0]) + torch.matmul(a[..., 1], b[..., 1]),
-                       torch.matmul(a[..., 1], b[..., 0]) - torch.matmul(a[..., 0], b[..., 1]))
-    if conj_a and conj_b:
-        return complex(torch.matmul(a[..., 0], b[..., 0]) - torch.matmul(a[..., 1], b[..., 1]),
-                       -torch.matmul(a[..., 0], b[..., 1]) - torch.matmul(a[..., 1], b[..., 0]))
+
+    a = as_native(a).conj() if conj_a else as_native(a)
+    b = as_native(b).conj() if conj_b else as_native(b)
+    return from_native(torch.matmul(a, b))
 
 
 @tensor_operation
@@ -183,10 +184,12 @@ def mtimes_real_complex(a: torch.Tensor, b: torch.Tensor, conj_b=False):
     if is_real(b):
         raise ValueError('Incorrect dimensions.')
 
-    if not conj_b:
-        return complex(torch.matmul(a, b[..., 0]), torch.matmul(a, b[..., 1]))
+    # Stack real and imaginary parts along the columns to get a single real matrix multiplication
+    c = torch.matmul(a, b.reshape(*b.shape[:-2], -1))
+    c = c.reshape(*c.shape[:-1], -1, 2)
     if conj_b:
-        return complex(torch.matmul(a, b[..., 0]), -torch.matmul(a, b[..., 1]))
+        c[..., 1] *= -1
+    return c
 
 
 @tensor_operation
@@ -194,10 +197,12 @@ def mtimes_complex_real(a: torch.Tensor, b: torch.Tensor, conj_a=False):
     if is_real(a):
         raise ValueError('Incorrect dimensions.')
 
-    if not conj_a:
-        return complex(torch.matmul(a[..., 0], b), torch.matmul(a[..., 1], b))
+    # Move the real and imaginary parts to the rows to get a single real matrix multiplication
+    c = torch.matmul(a.transpose(-1, -2), b.unsqueeze(-3)).transpose(-1, -2)
     if conj_a:
-        return complex(torch.matmul(a[..., 0], b), -torch.matmul(a[..., 1], b))
+        c = c.clone()
+        c[..., 1] *= -1
+    return c
 
 
 @tensor_operation
@@ -1,10 +1,114 @@
 import torch
 import math
+import functools
+import inspect
+import threading
+from collections import OrderedDict
 from pytracking import fourier
 from pytracking import complex
 import torch.nn.functional as F
 
 
+class ConstantCache:
+    """Bounded least recently used cache for the constant tensors of the DCF trackers (windows, interpolation
+    kernels, regularization filters and labels). The regularization filters and labels depend on the target size,
+    they are computed from the rounded target size so that sequences with similar target sizes share them. Cached
+    values are cloned on return, so that they can be modified by the caller.
+    args:
+        max_size: Maximum number of cached entries. Zero disables the cache.
+    """
+    def __init__(self, max_size=64):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, compute_fn):
+        if key is None or self.max_size <= 0:
+            return compute_fn()
+
+        with self.lock:
+            if key in self.entries:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return _clone(self.entries[key])
+            self.misses += 1
+
+        value = compute_fn()
+
+        with self.lock:
+            self.entries[key] = _clone(value)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self.entries), 'max_size': self.max_size}
+
+
+_constant_cache = ConstantCache()
+
+
+def set_cache_size(max_size: int):
+    """Set the maximum number of cached DCF constants. Zero disables the cache."""
+    _constant_cache.max_size = max_size
+    with _constant_cache.lock:
+        while len(_constant_cache.entries) > max(max_size, 0):
+            _constant_cache.entries.popitem(last=False)
+
+
+def clear_cache():
+    _constant_cache.clear()
+
+
+def cache_info() -> dict:
+    """Number of hits and misses and the size of the DCF constant cache."""
+    return _constant_cache.info()
+
+
+def _clone(value):
+    if isinstance(value, torch.Tensor):
+        return value.clone()
+    if isinstance(value, tuple):
+        return tuple(_clone(v) for v in value)
+    return value
+
+
+def _cache_key(value):
+    """Hashable key of a function argument. Returns None if the argument is not supported."""
+    if isinstance(value, torch.Tensor):
+        return ('tensor', str(value.dtype), str(value.device), tuple(value.shape), tuple(value.reshape(-1).tolist()))
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, torch.device):
+        return str(value)
+    if isinstance(value, (tuple, list)):
+        keys = tuple(_cache_key(v) for v in value)
+        return None if any(k is None and v is not None for k, v in zip(keys, value)) else keys
+    return None
+
+
+def cached(fn):
+    """Cache the output of fn in the DCF constant cache, keyed by the function name and all arguments."""
+    signature = inspect.signature(fn)
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        key = _cache_key(tuple(bound.arguments.values()))
+        return _constant_cache.get(None if key is None else (fn.__name__,) + key, lambda: fn(*args, **kwargs))
+
+    return wrapper
+
+
 def hann1d(sz: int, centered = True) -> torch.Tensor:
     """1D cosine window."""
     if centered:
@@ -13,6 +117,7 @@ def hann1d(sz: int, centered = True) -> torch.Tensor:
     return torch.cat([w, w[1:sz-sz//2].flip((0,))])
 
 
+@cached
 def hann2d(sz: torch.Tensor, centered = True) -> torch.Tensor:
     """2D cosine window."""
     return hann1d(sz[0].item(), centered).reshape(1, 1, -1, 1) * hann1d(sz[1].item(), centered).reshape(1, 1, 1, -1)
@@ -51,6 +156,13 @@ def gauss_spatial(sz, sigma, center=0, end_pad=0):
 
 
 def label_function(sz: torch.Tensor, sigma: torch.Tensor):
+    """Fourier coefficients of the Gaussian label. Computed for sigma rounded to two decimals, which lets the
+    sequences with similar target sizes share the cached label."""
+    return _label_function(sz, (sigma * 100).round() / 100)
+
+
+@cached
+def _label_function(sz: torch.Tensor, sigma: torch.Tensor):
     return gauss_fourier(sz[0].item(), sigma[0].item()).reshape(1, 1, -1, 1) * gauss_fourier(sz[1].item(), sigma[1].item(), True).reshape(1, 1, 1, -1)
 
 def label_function_spatial(sz: torch.Tensor, sigma: torch.Tensor, center: torch.Tensor = torch.zeros(2), end_pad: torch.Tensor = torch.zeros(2)):
@@ -71,6 +183,7 @@ def cubic_spline_fourier(f, a):
     return bf
 
 
+@cached
 def get_interp_fourier(sz: torch.Tensor, method='ideal', bicubic_param=0.5, centering=True, windowing=False, device='cpu'):
 
     ky, kx = fourier.get_frequency_coord(sz)
@@ -104,19 +217,29 @@ def interpolate_dft(a: torch.Tensor, interp_fs) -> torch.Tensor:
 
 
 def get_reg_filter(sz: torch.Tensor, target_sz: torch.Tensor, params):
-    """Computes regularization filter in CCOT and ECO."""
+    """Computes regularization filter in CCOT and ECO. Computed for the target size rounded to whole pixels, which lets
+    the sequences with similar target sizes share the cached filter."""
 
     if not params.use_reg_window:
         return params.reg_window_min * torch.ones(1,1,1,1)
 
-    if getattr(params, 'reg_window_square', False):
+    return _reg_filter(sz, target_sz.round().clamp(min=1), params.reg_window_min, params.reg_window_edge,
+                       params.reg_window_power, params.reg_sparsity_threshold,
+                       getattr(params, 'reg_window_square', False), getattr(params, 'reg_window_centered', True))
+
+
+@cached
+def _reg_filter(sz: torch.Tensor, target_sz: torch.Tensor, reg_window_min, reg_window_edge, reg_window_power,
+                reg_sparsity_threshold, reg_window_square=False, reg_window_centered=True):
+
+    if reg_window_square:
         target_sz = target_sz.prod().sqrt() * torch.ones(2)
 
     # Normalization factor
     reg_scale = 0.5 * target_sz
 
     # Construct grid
-    if getattr(params, 'reg_window_centered', True):
+    if reg_window_centered:
         wrg = torch.arange(-int((sz[0]-1)/2), int(sz[0]/2+1), dtype=torch.float32).view(1,1,-1,1)
         wcg = torch.arange(-int((sz[1]-1)/2), int(sz[1]/2+1), dtype=torch.float32).view(1,1,1,-1)
     else:
@@ -126,18 +249,18 @@ def get_reg_filter(sz: torch.Tensor, target_sz: torch.Tensor, params):
                          torch.arange(-int((sz[1] - 1) / 2), 0, dtype=torch.float32)]).view(1,1,1,-1)
 
     # Construct regularization window
-    reg_window = (params.reg_window_edge - params.reg_window_min) * \
-                 (torch.abs(wrg/reg_scale[0])**params.reg_window_power +
-                  torch.abs(wcg/reg_scale[1])**params.reg_window_power) + params.reg_window_min
+    reg_window = (reg_window_edge - reg_window_min) * \
+                 (torch.abs(wrg/reg_scale[0])**reg_window_power +
+                  torch.abs(wcg/reg_scale[1])**reg_window_power) + reg_window_min
 
     # Compute DFT and enforce sparsity
-    reg_window_dft = torch.rfft(reg_window, 2) / sz.prod()
+    reg_window_dft = torch.view_as_real(torch.fft.rfft2(reg_window)) / sz.prod()
     reg_window_dft_abs = complex.abs(reg_window_dft)
-    reg_window_dft[reg_window_dft_abs < params.reg_sparsity_threshold * reg_window_dft_abs.max(), :] = 0
+    reg_window_dft[reg_window_dft_abs < reg_sparsity_threshold * reg_window_dft_abs.max(), :] = 0
 
     # Do the inverse transform to correct for the window minimum
-    reg_window_sparse = torch.irfft(reg_window_dft, 2, signal_sizes=sz.long().tolist())
-    reg_window_dft[0,0,0,0,0] += params.reg_window_min - sz.prod() * reg_window_sparse.min()
+    reg_window_sparse = torch.fft.irfft2(complex.as_native(reg_window_dft), s=sz.long().tolist())
+    reg_window_dft[0,0,0,0,0] += reg_window_min - sz.prod() * reg_window_sparse.min()
     reg_window_dft = complex.real(fourier.rfftshift2(reg_window_dft))
 
     # Remove zeros
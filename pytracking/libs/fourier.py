@@ -1,3 +1,4 @@
+import math
 import torch
 import torch.nn.functional as F
 from pytracking import complex, TensorList
@@ -21,14 +22,14 @@ def cfft2(a):
     """Do FFT and center the low frequency component.
     Always produces odd (full) output sizes."""
 
-    return rfftshift2(torch.rfft(a, 2))
+    return rfftshift2(torch.view_as_real(torch.fft.rfft2(a)))
 
 
 @tensor_operation
 def cifft2(a, signal_sizes=None):
     """Do inverse FFT corresponding to cfft2."""
 
-    return torch.irfft(irfftshift2(a), 2, signal_sizes=signal_sizes)
+    return torch.fft.irfft2(complex.as_native(irfftshift2(a)), s=signal_sizes)
 
 
 @tensor_operation
@@ -41,8 +42,8 @@ def sample_fs(a: torch.Tensor, grid_sz: torch.Tensor = None, rescale = True):
     # Default grid
     if grid_sz is None or sz[0] == grid_sz[0] and sz[1] == grid_sz[1]:
         if rescale:
-            return sz.prod().item() * cifft2(a)
-        return cifft2(a)
+            return sz.prod().item() * cifft2(a, signal_sizes=sz.long().tolist())
+        return cifft2(a, signal_sizes=sz.long().tolist())
 
     if sz[0] > grid_sz[0] or sz[1] > grid_sz[1]:
         raise ValueError("Only grid sizes that are smaller than the Fourier series size are supported.")
@@ -61,6 +62,20 @@ def sample_fs(a: torch.Tensor, grid_sz: torch.Tensor = None, rescale = True):
         return cifft2(F.pad(a, (0, 0, 0, pad_right, pad_top, pad_bottom)), signal_sizes=grid_sz.long().tolist())
 
 
+@tensor_operation
+def truncate_fs(a: torch.Tensor, sz: torch.Tensor):
+    """Keeps the low frequency band of size sz (odd) of the Fourier coefficients in dimensions 2 and 3.
+    Dimensions of length one are kept as they are."""
+
+    h = int(sz[0]) if a.shape[2] > 1 else 1
+    w = int(sz[1] + 1) // 2 if a.shape[3] > 1 else 1
+    if h == a.shape[2] and w == a.shape[3]:
+        return a
+
+    top = (a.shape[2] - h) // 2
+    return a[:, :, top:top+h, :w, ...]
+
+
 def get_frequency_coord(sz, add_complex_dim = False, device='cpu'):
     """Frequency coordinates."""
 
@@ -92,6 +107,53 @@ def shift_fs(a: torch.Tensor, shift: torch.Tensor):
     return complex.mult(complex.mult(a, complex.exp_imag(shift[0].item()*ky)), complex.exp_imag(shift[1].item()*kx))
 
 
+def maximize_fs(a: torch.Tensor, init_ind: torch.Tensor, num_iter: int = 5):
+    """Refines the maximum of a Fourier series with Newton iterations on the series itself, as in the ECO
+    optimize_scores. Sub-pixel precision is obtained without sampling the series on a finer grid.
+    Params:
+        a : The Fourier coefficients (num_samples, 1, h, w, 2).
+        init_ind : Index of the maximum in the series sampled at its own size (num_samples, 1, 2), e.g. from max2d.
+        num_iter : Number of Newton iterations.
+    Returns the maximum values (num_samples, 1) and positions (num_samples, 1, 2) relative to the origin, in units of
+    the grid given by the size of the series."""
+
+    sz = torch.Tensor([a.shape[2], 2*a.shape[3]-1]).to(a.device)
+    ky, kx = get_frequency_coord(sz.long().tolist(), device=a.device)
+    ky, kx = ky.view(-1), kx.view(-1)
+
+    # The series is real, so the negative x-frequencies are included by weighting the positive ones twice
+    wx = torch.full_like(kx, 2)
+    wx[0] = 1
+    c = complex.as_native(a) * wx
+
+    def evaluate(pos):
+        """Value, gradient and Hessian of the series at the positions (in radians)."""
+        exp_y = torch.exp(1j * ky * pos[..., :1])
+        exp_x = torch.exp(1j * kx * pos[..., 1:])
+        ey = torch.stack((exp_y, 1j * ky * exp_y, -ky**2 * exp_y), -2)
+        ex = torch.stack((exp_x, 1j * kx * exp_x, -kx**2 * exp_x), -1)
+        d = torch.matmul(torch.matmul(ey, c), ex).real
+        return d[..., 0, 0], d[..., 1, 0], d[..., 0, 1], d[..., 2, 0], d[..., 0, 2], d[..., 1, 1]
+
+    # Start from the grid maximum
+    init_pos = 2*math.pi * ((init_ind.float() + (sz / 2).floor()) % sz - (sz / 2).floor()) / sz
+    pos = init_pos.clone()
+    for _ in range(num_iter):
+        _, grad_y, grad_x, H_yy, H_xx, H_xy = evaluate(pos)
+        det_H = H_yy * H_xx - H_xy * H_xy
+        pos = pos - torch.stack((H_xx * grad_y - H_xy * grad_x, H_yy * grad_x - H_xy * grad_y), -1) / det_H.unsqueeze(-1)
+
+    # Keep the grid maximum where the iterations did not increase the score
+    init_val = evaluate(init_pos)[0]
+    max_val = evaluate(pos)[0]
+    not_better = ~(max_val > init_val)
+    max_val = torch.where(not_better, init_val, max_val)
+    pos = torch.where(not_better.unsqueeze(-1), init_pos, pos)
+
+    max_disp = ((pos + math.pi) % (2*math.pi) - math.pi) / (2*math.pi) * sz
+    return max_val, max_disp
+
+
 def sum_fs(a: TensorList) -> torch.Tensor:
     """Sum a list of Fourier series expansions."""
 
@@ -143,4 +205,15 @@ def inner_prod_fs(a: torch.Tensor, b: torch.Tensor):
     elif complex.is_real(a) and complex.is_real(b):
         return 2 * (a.reshape(-1) @ b.reshape(-1)) - a[:, :, :, 0].reshape(-1) @ b[:, :, :, 0].reshape(-1)
     else:
-        raise NotImplementedError('Not implemented for mixed real and complex.')
\ No newline at end of file
+        raise NotImplementedError('Not implemented for mixed real and complex.')
+
+
+@tensor_operation
+def inner_prod_fs_batch(a: torch.Tensor, b: torch.Tensor):
+    """Inner product of Fourier coefficients, computed separately for each element in the first dimension. The
+    result keeps the number of dimensions of the input."""
+    if not (complex.is_complex(a) and complex.is_complex(b)):
+        raise NotImplementedError('Only implemented for complex tensors.')
+    ip = 2 * (a * b).reshape(a.shape[0], -1).sum(1) - \
+         (a[:, :, :, 0, :] * b[:, :, :, 0, :]).reshape(a.shape[0], -1).sum(1)
+    return ip.view(-1, *[1] * (a.dim() - 1))
\ No newline at end of file
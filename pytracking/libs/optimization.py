@@ -63,21 +63,29 @@ class ConjugateGradientBase:
         # Right hand side
         self.b = None
 
+        # Number of iterations run in the last call to run_CG
+        self.num_iter_run = 0
+
     def reset_state(self):
         self.p = None
         self.rho = torch.ones(1)
         self.r_prev = None
 
 
-    def run_CG(self, num_iter, x=None, eps=0.0):
+    def run_CG(self, num_iter, x=None, eps=0.0, rel_eps=0.0):
         """Main conjugate gradient method.
 
         args:
             num_iter: Number of iterations.
             x: Initial guess. Assumed zero if None.
             eps: Stop if the residual norm gets smaller than this.
+            rel_eps: Stop if the residual norm gets smaller than this times the norm of the right hand side. No
+                     iterations are run if the initial guess already fulfills this, the returned solution is then the
+                     initial guess (zero if None).
         """
 
+        self.num_iter_run = 0
+
         # Apply forgetting factor
         if self.direction_forget_factor == 0:
             self.reset_state()
@@ -89,6 +97,13 @@ class ConjugateGradientBase:
         else:
             r = self.b - self.A(x)
 
+        if rel_eps > 0.0:
+            eps = max(eps, rel_eps * self.residual_norm(self.b).item())
+            if self.residual_norm(r) <= eps:
+                if self.debug:
+                    print('Skipped CG since the initial residual is smaller than eps')
+                return (self.b.clone().zero_() if x is None else x), (torch.zeros(1) if self.debug else None)
+
         # Norms of residuals etc for debugging
         resvec = None
         if self.debug:
@@ -110,16 +125,18 @@ class ConjugateGradientBase:
                     print('Stopped CG since rho = 0')
                     if resvec is not None:
                         resvec = resvec[:ii+1]
-                return x, resvec
+                return (self.b.clone().zero_() if x is None else x), resvec
+
+            self.num_iter_run = ii + 1
 
             if self.p is None:
                 self.p = z.clone()
             else:
                 if self.fletcher_reeves:
-                    beta = self.rho / rho1
+                    beta = self.div(self.rho, rho1)
                 else:
                     rho2 = self.ip(self.r_prev, z)
-                    beta = (self.rho - rho2) / rho1
+                    beta = self.div(self.rho - rho2, rho1)
 
                 beta = beta.clamp(0)
                 self.p = z + self.p * beta
@@ -128,9 +145,9 @@ class ConjugateGradientBase:
             pq = self.ip(self.p, q)
 
             if self.standard_alpha:
-                alpha = self.rho / pq
+                alpha = self.div(self.rho, pq)
             else:
-                alpha = self.ip(self.p, r) / pq
+                alpha = self.div(self.ip(self.p, r), pq)
 
             # Save old r for PR formula
             if not self.fletcher_reeves:
@@ -183,6 +200,10 @@ class ConjugateGradientBase:
             ss = sum(ss)
         return ss.item() > 0
 
+    def div(self, a, b):
+        # Division used for the step lengths
+        return a / b
+
     def M1(self, x):
         # M1 preconditioner
         return x
@@ -295,7 +316,7 @@ class GaussNewtonCG(ConjugateGradientBase):
 
     def __init__(self, problem: L2Problem, variable: TensorList, cg_eps = 0.0, fletcher_reeves = True,
                  standard_alpha = True, direction_forget_factor = 0, debug = False, analyze = False, plotting = False,
-                 visdom=None):
+                 visdom=None, cg_rel_eps = 0.0, gn_rel_eps = 0.0):
         super().__init__(fletcher_reeves, standard_alpha, direction_forget_factor, debug or analyze or plotting)
 
         self.problem = problem
@@ -307,6 +328,8 @@ class GaussNewtonCG(ConjugateGradientBase):
         self.visdom = visdom
 
         self.cg_eps = cg_eps
+        self.cg_rel_eps = cg_rel_eps
+        self.gn_rel_eps = gn_rel_eps
         self.f0 = None
         self.g = None
         self.dfdxt_g = None
@@ -315,6 +338,11 @@ class GaussNewtonCG(ConjugateGradientBase):
         self.losses = torch.zeros(0)
         self.gradient_mags = torch.zeros(0)
 
+        # Number of iterations actually run in the last call to run()
+        self.num_gn_iter_run = 0
+        self.num_cg_iter_run = 0
+        self.grad_norm0 = None
+
     def clear_temp(self):
         self.f0 = None
         self.g = None
@@ -331,6 +359,8 @@ class GaussNewtonCG(ConjugateGradientBase):
             num_cg_iter: Number of CG iterations per GN iter. If list, then each entry specifies number of CG iterations
                          and number of GN iterations is given by the length of the list.
             num_gn_iter: Number of GN iterations. Shall only be given if num_cg_iter is an integer.
+        If gn_rel_eps is set, the GN iterations are stopped once the gradient norm gets smaller than gn_rel_eps times
+        the gradient norm in the first GN iteration.
         """
 
         if isinstance(num_cg_iter, int):
@@ -345,9 +375,18 @@ class GaussNewtonCG(ConjugateGradientBase):
         if self.analyze_convergence:
             self.evaluate_CG_iteration(0)
 
+        self.num_gn_iter_run = 0
+        self.num_cg_iter_run = 0
+        self.grad_norm0 = None
+
         # Outer loop for running the GN iterations.
         for cg_iter in num_cg_iter:
-            self.run_GN_iter(cg_iter)
+            if not self.run_GN_iter(cg_iter):
+                if self.debug:
+                    print('Stopped GN since the gradient norm is smaller than eps')
+                break
+            self.num_gn_iter_run += 1
+            self.num_cg_iter_run += self.num_iter_run
 
         if self.debug:
             if not self.analyze_convergence:
@@ -375,7 +414,8 @@ class GaussNewtonCG(ConjugateGradientBase):
 
 
     def run_GN_iter(self, num_cg_iter):
-        """Runs a single GN iteration."""
+        """Runs a single GN iteration. Returns False, without running CG, if gn_rel_eps is set and the gradient norm
+        is smaller than gn_rel_eps times the gradient norm in the first GN iteration."""
 
         self.x.requires_grad_(True)
 
@@ -397,8 +437,17 @@ class GaussNewtonCG(ConjugateGradientBase):
         # Get the right hand side
         self.b = - self.dfdxt_g.detach()
 
+        if self.gn_rel_eps > 0:
+            # Norm of the gradient at the current estimate
+            grad_norm = self.residual_norm(self.b).item()
+            if self.grad_norm0 is None:
+                self.grad_norm0 = grad_norm
+            elif grad_norm <= self.gn_rel_eps * self.grad_norm0:
+                self.x.detach_()
+                return False
+
         # Run CG
-        delta_x, res = self.run_CG(num_cg_iter, eps=self.cg_eps)
+        delta_x, res = self.run_CG(num_cg_iter, eps=self.cg_eps, rel_eps=self.cg_rel_eps)
 
         self.x.detach_()
         self.x += delta_x
@@ -406,6 +455,8 @@ class GaussNewtonCG(ConjugateGradientBase):
         if self.debug:
             self.residuals = torch.cat((self.residuals, res))
 
+        return True
+
 
     def A(self, x):
         dfdx_x = torch.autograd.grad(self.dfdxt_g, self.g, x, retain_graph=True)
@@ -171,7 +171,7 @@ class TensorList(list):
         return TensorList([fn(e) for e in self])
 
     def __getattr__(self, name):
-        if not hasattr(torch.Tensor, name):
+        if name == '__torch_function__' or not hasattr(torch.Tensor, name):
             raise AttributeError('\'TensorList\' object has not attribute \'{}\''.format(name))
 
         def apply_attr(*args, **kwargs):
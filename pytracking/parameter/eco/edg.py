@@ -1,6 +1,6 @@
 from pytracking.utils import TrackerParams, FeatureParams
 from pytracking.features.extractor import MultiResolutionExtractor
-from pytracking.features import deep
+from pytracking.features import deep, icg
 import torch
 
 def parameters():
@@ -9,7 +9,7 @@ def parameters():
     params.debug = 0
     params.visualization = False
 
-    params.use_gpu = True
+    params.use_gpu = False
 
     # Feature specific parameters
     shallow_params = TrackerParams()
@@ -104,8 +104,7 @@ def parameters():
     fparams = FeatureParams(feature_params=[base_params]) 
 #    features = deep.ResNet18m1(output_layers=['vggconv1', 'layer3'], use_gpu=params.use_gpu, fparams=fparams,
 #                                pool_stride=[2, 1], normalize_power=2)
-    features = deep.ResNet18m1(output_layers=['edg'], use_gpu=params.use_gpu, fparams=fparams,
-                                pool_stride=[4], normalize_power=2)
+    features = icg.ICG(use_gpu=params.use_gpu, fparams=fparams, pool_stride=4, normalize_power=2)
 #    features = deep.cvt(output_layers=['layer1', 'layer3'],use_gpu=params.use_gpu, fparams=fparams,
 #                                pool_stride=[1, 1], normalize_power=2)
     params.features = MultiResolutionExtractor([features])
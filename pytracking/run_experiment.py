@@ -10,19 +10,20 @@ if env_path not in sys.path:
 from pytracking.evaluation.running import run_dataset
 
 
-def run_experiment(experiment_module: str, experiment_name: str, debug=0, threads=0):
+def run_experiment(experiment_module: str, experiment_name: str, debug=0, threads=0, fan_out=False):
     """Run experiment.
     args:
         experiment_module: Name of experiment module in the experiments/ folder.
         experiment_name: Name of the experiment function.
         debug: Debug level.
         threads: Number of threads.
+        fan_out: Run all trackers on a sequence in lockstep, decoding each frame once.
     """
     expr_module = importlib.import_module('pytracking.experiments.{}'.format(experiment_module))
     expr_func = getattr(expr_module, experiment_name)
     trackers, dataset = expr_func()
     print('Running:  {}  {}'.format(experiment_module, experiment_name))
-    run_dataset(dataset, trackers, debug, threads)
+    run_dataset(dataset, trackers, debug, threads, fan_out=fan_out)
 
 
 def main():
@@ -31,10 +32,11 @@ def main():
     parser.add_argument('experiment_name', type=str, help='Name of the experiment function.')
     parser.add_argument('--debug', type=int, default=0, help='Debug level.')
     parser.add_argument('--threads', type=int, default=0, help='Number of threads.')
+    parser.add_argument('--fan_out', action='store_true', help='Decode each frame once for all trackers.')
 
     args = parser.parse_args()
 
-    run_experiment(args.experiment_module, args.experiment_name, args.debug, args.threads)
+    run_experiment(args.experiment_module, args.experiment_name, args.debug, args.threads, args.fan_out)
 
 
 if __name__ == '__main__':
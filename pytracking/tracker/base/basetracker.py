@@ -1,4 +1,5 @@
 from _collections import OrderedDict
+from pytracking.utils.profiler import StageProfiler
 
 class BaseTracker:
     """Base class for all trackers."""
@@ -7,6 +8,9 @@ class BaseTracker:
         self.params = params
         self.visdom = None
 
+        # Per-frame timing of the tracker stages, only recorded if params.profile_stages is set
+        self.profiler = StageProfiler(params.get('profile_stages', False))
+
     def predicts_segmentation_mask(self):
         return False
 
@@ -588,6 +588,8 @@ class DiMP(BaseTracker):
 
     def _overwrite_classifier_params(self, feature_dim):
         # Overwrite some parameters in the classifier. (These are not generally changed)
+        # The network is shared with the other trackers in the process, modify a copy of the classifier
+        self.net.copy_submodules('classifier')
         pred_module = getattr(self.net.classifier.filter_optimizer, 'score_predictor', self.net.classifier.filter_optimizer)
         if self.params.get('label_threshold', None) is not None:
             self.net.classifier.filter_optimizer.label_threshold = self.params.label_threshold
@@ -6,8 +6,10 @@ from pytracking import complex, dcf, fourier, TensorList
 from pytracking.libs.tensorlist import tensor_operation
 from pytracking.features.preprocessing import numpy_to_torch
 from pytracking.utils.plotting import show_tensor
+from pytracking.utils.profiler import profiled
 from pytracking.libs.optimization import GaussNewtonCG
 from .optim import FilterOptim, FactorizedConvProblem
+from .scale_filter import ScaleFilter
 from pytracking.features import augmentation
 #from pytorch_grad_cam import GradCAM
 #from pytorch_grad_cam.utils.model_targets import ClassifierOutputTarget
@@ -34,6 +36,7 @@ class ECO(BaseTracker):
             self.params.device = 'cuda' if self.params.use_gpu else 'cpu'
         # Initialize features
         self.initialize_features()
+        self.params.features.profiler = self.profiler
 
         # Chack if image is color
         self.params.features.set_is_color(image.shape[2] == 3)
@@ -48,7 +51,10 @@ class ECO(BaseTracker):
         # Set search area
         self.target_scale = 1.0
         search_area = torch.prod(self.target_sz * self.params.search_area_scale).item()
-        if search_area > self.params.max_image_sample_size:
+        if self.params.get('image_sample_size', None) is not None:
+            # Fixed image sample size, this gives the same feature and filter sizes for all targets
+            self.target_scale = math.sqrt(search_area) / self.params.image_sample_size
+        elif search_area > self.params.max_image_sample_size:
             self.target_scale =  math.sqrt(search_area / self.params.max_image_sample_size)
         elif search_area < self.params.min_image_sample_size:
             self.target_scale =  math.sqrt(search_area / self.params.min_image_sample_size)
@@ -65,7 +71,12 @@ class ECO(BaseTracker):
         self.img_support_sz = self.img_sample_sz
         self.feature_sz = self.params.features.size(self.img_sample_sz)
 ############################################
-        self.filter_sz = self.feature_sz + (self.feature_sz + 1) % 2
+        self.fs_sz = self.feature_sz + (self.feature_sz + 1) % 2
+
+        # Only keep the low frequency band of the Fourier coefficients in the filters and samples
+        fourier_truncation = self.fparams.attribute('fourier_truncation', 1.0)
+        self.filter_sz = TensorList([torch.min(sz, 2 * torch.floor(sz * t / 2) + 1)
+                                     for sz, t in zip(self.fs_sz, fourier_truncation)])
 #        self.filter_sz = self.feature_sz
 ############################################
         self.output_sz = self.params.score_upsample_factor * self.img_support_sz   # Interpolated size of the output
@@ -81,7 +92,9 @@ class ECO(BaseTracker):
         # Get interpolation function
         self.interp_fs = TensorList([dcf.get_interp_fourier(sz, self.params.interpolation_method,
                                                 self.params.interpolation_bicubic_a, self.params.interpolation_centering,
-                                                self.params.interpolation_windowing, self.params.device) for sz in self.filter_sz])
+                                                self.params.interpolation_windowing, self.params.device) for sz in self.fs_sz])
+        self.interp_fs = TensorList([(fourier.truncate_fs(by, sz), fourier.truncate_fs(bx, sz))
+                                     for (by, bx), sz in zip(self.interp_fs, self.filter_sz)])
 
         # Get regularization filter
         self.reg_filter = TensorList([dcf.get_reg_filter(self.img_support_sz, self.base_target_sz, fparams).to(self.params.device)
@@ -90,8 +103,9 @@ class ECO(BaseTracker):
 
         # Get label function
         output_sigma_factor = self.fparams.attribute('output_sigma_factor')
-        sigma = (self.filter_sz / self.img_support_sz) * torch.sqrt(self.base_target_sz.prod()) * output_sigma_factor
-        self.yf = TensorList([dcf.label_function(sz, sig).to(self.params.device) for sz, sig in zip(self.filter_sz, sigma)])
+        sigma = (self.fs_sz / self.img_support_sz) * torch.sqrt(self.base_target_sz.prod()) * output_sigma_factor
+        self.yf = TensorList([dcf.label_function(sz, sig).to(self.params.device) for sz, sig in zip(self.fs_sz, sigma)])
+        self.yf = fourier.truncate_fs(self.yf, self.filter_sz)
 
         # Optimization options
         self.params.precond_learning_rate = self.fparams.attribute('learning_rate')
@@ -108,6 +122,15 @@ class ECO(BaseTracker):
         self.image_sz = torch.Tensor([im.shape[2], im.shape[3]])
         self.min_scale_factor = torch.max(10 / self.base_target_sz)
         self.max_scale_factor = torch.min(self.image_sz / self.base_target_sz)
+
+        # Estimate the scale with a separate scale filter, the translation filter is then only applied at one scale
+        self.use_scale_filter = self.params.get('use_scale_filter', False)
+        if self.use_scale_filter:
+            self.scale_factors = torch.ones(1)
+            self.scale_filter = ScaleFilter(self.params)
+            self.scale_filter.initialize(im, self.pos, self.base_target_sz, self.target_scale)
+        else:
+            self.scale_factors = self.params.scale_factors
 #################################################################
         # Extract and transform sample into feature
         x = self.generate_init_samples(im)
@@ -159,16 +182,30 @@ class ECO(BaseTracker):
         # Do joint optimization
         self.joint_problem = FactorizedConvProblem(self.init_training_samples, self.yf, self.reg_filter, self.projection_matrix, self.params, self.init_sample_weights)
         joint_var = self.filter.concat(self.projection_matrix)
-        self.joint_optimizer = GaussNewtonCG(self.joint_problem, joint_var, debug=(self.params.debug>=1), visdom=self.visdom)
+        self.joint_optimizer = GaussNewtonCG(self.joint_problem, joint_var, debug=(self.params.debug>=1), visdom=self.visdom,
+                                             cg_rel_eps=self.params.get('init_CG_tol', 0.0),
+                                             gn_rel_eps=self.params.get('init_GN_tol', 0.0))
 ####################################################
+        # Number of CG iterations saved by the early exits in each frame
+        self.cg_iter_saved = []
+        init_cg_iter = self.params.post_init_CG_iter
+        init_cg_iter_run = 0
+
         if self.params.update_projection_matrix:
-            self.joint_optimizer.run(self.params.init_CG_iter // self.params.init_GN_iter, self.params.init_GN_iter)
+            with self.profiler.stage('CG'):
+                self.joint_optimizer.run(self.params.init_CG_iter // self.params.init_GN_iter, self.params.init_GN_iter)
+            init_cg_iter += (self.params.init_CG_iter // self.params.init_GN_iter) * self.params.init_GN_iter
+            init_cg_iter_run += self.joint_optimizer.num_cg_iter_run
 ####################################################
         # Re-project samples with the new projection matrix
         compressed_samples = complex.mtimes(self.init_training_samples, self.projection_matrix)
         for train_samp, init_samp in zip(self.training_samples, compressed_samples):
             train_samp[:,:,:init_samp.shape[2],:,:] = init_samp
 
+        # Initialize the sample space model
+        if self.params.get('sample_memory_policy', 'replace') == 'merge':
+            self.init_sample_space_model()
+
         # Initialize optimizer
         self.filter_optimizer = FilterOptim(self.params, self.reg_energy)
         self.filter_optimizer.register(self.filter, self.training_samples, self.yf, self.sample_weights, self.reg_filter)
@@ -176,13 +213,21 @@ class ECO(BaseTracker):
         self.filter_optimizer.residuals = self.joint_optimizer.residuals.clone()
 ###########################################################
         if not self.params.update_projection_matrix:
-            self.filter_optimizer.run(self.params.init_CG_iter)
+            with self.profiler.stage('CG'):
+                self.filter_optimizer.run(self.params.init_CG_iter)
+            init_cg_iter += self.params.init_CG_iter
+            init_cg_iter_run += self.filter_optimizer.num_iter_run
 
         # Post optimization
-        self.filter_optimizer.run(self.params.post_init_CG_iter)
+        with self.profiler.stage('CG'):
+            self.filter_optimizer.run(self.params.post_init_CG_iter)
+        init_cg_iter_run += self.filter_optimizer.num_iter_run
+        self.cg_iter_saved.append(init_cg_iter - init_cg_iter_run)
 ############################################################
         self.symmetrize_filter()
 
+        return {'cg_iter_saved': self.cg_iter_saved[0]}
+
 
     def track(self, image, info: dict = None) -> dict:
         self.debug_info = {}
@@ -190,6 +235,8 @@ class ECO(BaseTracker):
         self.frame_num += 1
         self.debug_info['frame_num'] = self.frame_num
 
+        self.params.features.profiler = self.profiler
+
         # Convert image
         im = numpy_to_torch(image)
 
@@ -197,17 +244,23 @@ class ECO(BaseTracker):
 
         # Get sample
         sample_pos = self.pos.round()
-        sample_scales = self.target_scale * self.params.scale_factors
+        sample_scales = self.target_scale * self.scale_factors
         test_xf = self.extract_fourier_sample(im, self.pos, sample_scales, self.img_sample_sz)
 
         # Compute scores
         sf = self.apply_filter(test_xf)
         
         translation_vec, scale_ind, s = self.localize_target(sf)
-        scale_change_factor = self.params.scale_factors[scale_ind]
+        new_pos = sample_pos + translation_vec
+
+        if self.use_scale_filter:
+            with self.profiler.stage('scale_filter'):
+                scale_change_factor = self.scale_filter.track(im, new_pos, self.target_scale)
+        else:
+            scale_change_factor = self.scale_factors[scale_ind]
 
         # Update position and scale
-        self.update_state(sample_pos + translation_vec, self.target_scale * scale_change_factor)
+        self.update_state(new_pos, self.target_scale * scale_change_factor)
 
         score_map = s[scale_ind, ...]
         max_score = torch.max(score_map).item()
@@ -237,33 +290,47 @@ class ECO(BaseTracker):
         self.update_memory(train_xf)
 
         # Train filter
+        cg_iter_saved = 0
         if self.frame_num % self.params.train_skipping == 1:
-            self.filter_optimizer.run(self.params.CG_iter, train_xf)
+            with self.profiler.stage('CG'):
+                self.filter_optimizer.run(self.params.CG_iter, train_xf)
             self.symmetrize_filter()
+            cg_iter_saved = self.params.CG_iter - self.filter_optimizer.num_iter_run
+        self.cg_iter_saved.append(cg_iter_saved)
+        self.debug_info['CG_iter_saved'] = cg_iter_saved
+
+        # Update the scale filter
+        if self.use_scale_filter:
+            with self.profiler.stage('scale_filter'):
+                self.scale_filter.update(im, self.pos, self.target_scale)
 
         # Return new state
         new_state = torch.cat((self.pos[[1,0]] - (self.target_sz[[1,0]]-1)/2, self.target_sz[[1,0]]))
 
-        out = {'target_bbox': new_state.tolist()}
+        out = {'target_bbox': new_state.tolist(), 'cg_iter_saved': cg_iter_saved}
         return out
 
 
+    @profiled('filter')
     def apply_filter(self, sample_xf: TensorList) -> torch.Tensor:
 #        plt.figure()
 #       plt.imshow(sample_xf[0][0,7,:,:,0].detach().cpu().numpy()) 
 #        plt.show()
         return complex.mult(self.filter, sample_xf).sum(1, keepdim=True)
 
+    @profiled('localization')
     def localize_target(self, sf: TensorList):
-        if self.params.score_fusion_strategy == 'sum':
-            scores = fourier.sample_fs(fourier.sum_fs(sf), self.output_sz)
-        elif self.params.score_fusion_strategy == 'weightedsum':
-            weight = self.fparams.attribute('translation_weight')
-            scores = fourier.sample_fs(fourier.sum_fs(weight * sf), self.output_sz)
+        if self.params.score_fusion_strategy in ['sum', 'weightedsum']:
+            if self.params.score_fusion_strategy == 'weightedsum':
+                sf = self.fparams.attribute('translation_weight') * sf
+            scores_fs = fourier.sum_fs(sf)
+            if self.params.get('newton_iterations', 0) > 0:
+                return self.optimize_scores(scores_fs)
+            scores = fourier.sample_fs(scores_fs, self.output_sz)
         elif self.params.score_fusion_strategy == 'transcale':
             alpha = self.fparams.attribute('scale_weight')
             beta = self.fparams.attribute('translation_weight')
-            sample_sz = torch.round(self.output_sz.view(1,-1) * self.params.scale_factors.view(-1,1))
+            sample_sz = torch.round(self.output_sz.view(1,-1) * self.scale_factors.view(-1,1))
             scores = 0
             for sfe, a, b in zip(sf, alpha, beta):
                 sfe = fourier.shift_fs(sfe, math.pi*torch.ones(2))
@@ -292,11 +359,31 @@ class ECO(BaseTracker):
         # Compute translation vector and scale change factor
         translation_vec = disp[scale_ind, ...].view(-1) * (self.img_support_sz / self.output_sz) * self.target_scale
         if self.params.score_fusion_strategy in ['sum', 'weightedsum']:
-            translation_vec *= self.params.scale_factors[scale_ind]
+            translation_vec *= self.scale_factors[scale_ind]
+
+        return translation_vec, scale_ind, scores
+
+
+    def optimize_scores(self, scores_fs: torch.Tensor):
+        """Localize the target with sub-pixel precision by running Newton iterations on the Fourier series of the
+        scores, starting from the maximum of the scores sampled at the size of the series."""
+        fs_sz = torch.Tensor([scores_fs.shape[2], 2*scores_fs.shape[3]-1])
+        scores = fourier.sample_fs(scores_fs, fs_sz)
+
+        # Refine the grid maximum for all scales
+        _, max_ind = dcf.max2d(scores)
+        max_score, max_disp = fourier.maximize_fs(scores_fs, max_ind, self.params.newton_iterations)
+        _, scale_ind = torch.max(max_score, dim=0)
+        disp = max_disp.cpu()
+
+        # Compute translation vector
+        translation_vec = disp[scale_ind, ...].view(-1) * (self.img_support_sz / fs_sz) * self.target_scale * \
+                          self.scale_factors[scale_ind]
 
         return translation_vec, scale_ind, scores
 
 
+    @profiled('sample')
     def extract_sample(self, im: torch.Tensor, pos: torch.Tensor, scales, sz: torch.Tensor):
         return self.params.features.extract(im, pos, scales, sz)[0]
 
@@ -304,15 +391,17 @@ class ECO(BaseTracker):
         x = self.extract_sample(im, pos, scales, sz)
         return self.preprocess_sample(self.project_sample(x))
 
+    @profiled('fft')
     def preprocess_sample(self, x: TensorList) -> TensorList:
 #        print(x[0].shape, x[1].shape)
 #        print(self.window[0].shape, self.window[1].shape) 
         x *= self.window
         ############################################################################### 
-        sample_xf = fourier.cfft2(x)
+        sample_xf = fourier.truncate_fs(fourier.cfft2(x), self.filter_sz)
         ###############################################################################
         return TensorList([dcf.interpolate_dft(xf, bf) for xf, bf in zip(sample_xf, self.interp_fs)])
     
+    @profiled('projection')
     def project_sample(self, x: TensorList):
         @tensor_operation
         def _project_sample(x: torch.Tensor, P: torch.Tensor):
@@ -350,11 +439,24 @@ class ECO(BaseTracker):
         return init_samples
 
 
+    @profiled('memory_update')
     def update_memory(self, sample_xf: TensorList):
-        # Update weights and get index to replace
-        replace_ind = self.update_sample_weights()
-        for train_samp, xf, ind in zip(self.training_samples, sample_xf, replace_ind):
-            train_samp[:,:,ind:ind+1,:,:] = xf.permute(2, 3, 0, 1, 4)
+        old_weights = self.sample_weights.clone()
+
+        if self.params.get('sample_memory_policy', 'replace') == 'merge':
+            changed_inds, old_samples = self.update_sample_space_model(sample_xf)
+        else:
+            # Update weights and get index to replace
+            replace_ind = self.update_sample_weights()
+            changed_inds = [[ind] for ind in replace_ind]
+            old_samples = TensorList()
+            for train_samp, xf, ind in zip(self.training_samples, sample_xf, replace_ind):
+                old_samples.append(train_samp[:,:,ind:ind+1,:,:].clone())
+                train_samp[:,:,ind:ind+1,:,:] = xf.permute(2, 3, 0, 1, 4)
+
+        # Update the cached normal equations of the filter optimizer
+        if self.filter_optimizer.use_gram_cache:
+            self.filter_optimizer.update_gram_cache(changed_inds, old_samples, old_weights)
 
 
     def update_sample_weights(self):
@@ -383,6 +485,137 @@ class ECO(BaseTracker):
         self.num_stored_samples += 1
         return replace_ind
 
+    def sample_gram(self, a: torch.Tensor, b: torch.Tensor) -> torch.Tensor:
+        """Inner products between the Fourier samples in a (h, w, Na, C, 2) and b (h, w, Nb, C, 2)."""
+        wgt = a.new_full((a.shape[0], a.shape[1]), 2)
+        wgt[:, 0] = 1
+        a = a.reshape(a.shape[0] * a.shape[1], a.shape[2], -1)
+        b = b.reshape(b.shape[0] * b.shape[1], b.shape[2], -1) * wgt.view(-1, 1, 1)
+        return torch.matmul(a, b.transpose(1, 2)).sum(0)
+
+    def init_sample_space_model(self):
+        """Compute the Gram and distance matrices of the initial samples (ECO sample space model)."""
+        self.gram_matrix = TensorList()
+        self.distance_matrix = TensorList()
+        for train_samp, num in zip(self.training_samples, self.num_stored_samples):
+            gram = train_samp.new_zeros(self.params.sample_memory_size, self.params.sample_memory_size)
+            gram[:num, :num] = self.sample_gram(train_samp[:, :, :num, ...], train_samp[:, :, :num, ...])
+            dist = (gram.diag().view(-1, 1) + gram.diag().view(1, -1) - 2 * gram).clamp(min=0)
+            dist.fill_diagonal_(math.inf)
+            self.gram_matrix.append(gram)
+            self.distance_matrix.append(dist)
+
+    def update_sample_space_model(self, sample_xf: TensorList):
+        """Insert the new sample into memory by merging the closest pair of components (ECO sample space model).
+        Returns the changed memory positions and their previous samples for each feature block."""
+        changed_inds = []
+        old_samples = TensorList()
+        for i, (train_samp, xf, sw, gram, dist, fparams) in enumerate(zip(self.training_samples, sample_xf,
+                self.sample_weights, self.gram_matrix, self.distance_matrix, self.fparams)):
+            x = xf.permute(2, 3, 0, 1, 4)
+            lr = fparams.learning_rate
+            num_samp = self.num_stored_samples[i]
+            memory_size = sw.shape[0]
+
+            gram_vector = self.sample_gram(train_samp, x).view(-1)
+            new_norm = self.sample_gram(x, x).item()
+
+            if num_samp == 0 or lr == 1:
+                inds, new_samples = [0], x
+                self._update_distance_matrix(gram, dist, gram_vector, new_norm, 0, -1, 0, 1)
+                sw[:] = 0
+                sw[0] = 1
+            elif num_samp < memory_size:
+                # Insert into the next free position
+                inds, new_samples = [num_samp], x
+                self._update_distance_matrix(gram, dist, gram_vector, new_norm, num_samp, -1, 0, 1)
+                sw *= 1 - lr
+                sw[num_samp] = lr
+            else:
+                min_weight, min_ind = torch.min(sw, 0)
+                min_ind = min_ind.item()
+                if min_weight.item() < lr * (1 - lr)**(2 * memory_size):
+                    # Replace a sample with negligible weight
+                    inds, new_samples = [min_ind], x
+                    self._update_distance_matrix(gram, dist, gram_vector, new_norm, min_ind, -1, 0, 1)
+                    sw[min_ind] = 0
+                    sw *= (1 - lr) / sw.sum()
+                    sw[min_ind] = lr
+                else:
+                    dist_vector = (new_norm + gram.diag() - 2 * gram_vector).clamp(min=0)
+                    new_dist, new_ind = torch.min(dist_vector, 0)
+                    pair_dist, pair_ind = torch.min(dist.view(-1), 0)
+                    sw *= 1 - lr
+
+                    if new_dist.item() < pair_dist.item():
+                        # Merge the new sample with the closest existing sample
+                        k = new_ind.item()
+                        w = sw[k].item()
+                        inds = [k]
+                        new_samples = (w * train_samp[:, :, k:k+1, ...] + lr * x) / (w + lr)
+                        self._update_distance_matrix(gram, dist, gram_vector, new_norm, k, -1, w, lr)
+                        sw[k] += lr
+                    else:
+                        # Merge the two closest existing samples and insert the new sample in the free position
+                        k1, k2 = divmod(pair_ind.item(), memory_size)
+                        if sw[k2] > sw[k1]:
+                            k1, k2 = k2, k1
+                        w1, w2 = sw[k1].item(), sw[k2].item()
+                        inds = [k1, k2]
+                        merged = (w1 * train_samp[:, :, k1:k1+1, ...] + w2 * train_samp[:, :, k2:k2+1, ...]) / (w1 + w2)
+                        new_samples = torch.cat((merged, x), 2)
+                        self._update_distance_matrix(gram, dist, gram_vector, new_norm, k1, k2, w1, w2)
+                        sw[k1] += sw[k2]
+                        sw[k2] = lr
+
+            old_samples.append(train_samp[:, :, inds, ...])
+            train_samp[:, :, inds, ...] = new_samples
+            changed_inds.append(inds)
+            sw /= sw.sum()
+
+        self.num_stored_samples += 1
+        return changed_inds, old_samples
+
+    def _update_distance_matrix(self, gram, dist, gram_vector, new_norm, id1, id2, w1, w2):
+        """Update the Gram and distance matrices after sample id1 has been merged with the new sample (id2 < 0) or
+        with sample id2, in which case the new sample is inserted at id2. Zero weight w1 means replacing id1."""
+        alpha1 = w1 / (w1 + w2)
+        alpha2 = 1 - alpha1
+
+        if id2 < 0:
+            if alpha1 == 0:
+                gram[:, id1] = gram_vector
+                gram[id1, :] = gram_vector
+                gram[id1, id1] = new_norm
+            elif alpha2 > 0:
+                norm_id1 = gram[id1, id1].item()
+                merged = alpha1 * gram[:, id1] + alpha2 * gram_vector
+                gram[:, id1] = merged
+                gram[id1, :] = merged
+                gram[id1, id1] = alpha1**2 * norm_id1 + alpha2**2 * new_norm + 2 * alpha1 * alpha2 * gram_vector[id1]
+            ids = [id1]
+        else:
+            norm_id1 = gram[id1, id1].item()
+            norm_id2 = gram[id2, id2].item()
+            ip_id1_id2 = gram[id1, id2].item()
+            merged = alpha1 * gram[:, id1] + alpha2 * gram[:, id2]
+            gram[:, id1] = merged
+            gram[id1, :] = merged
+            gram[id1, id1] = alpha1**2 * norm_id1 + alpha2**2 * norm_id2 + 2 * alpha1 * alpha2 * ip_id1_id2
+
+            gram_vector = gram_vector.clone()
+            gram_vector[id1] = alpha1 * gram_vector[id1] + alpha2 * gram_vector[id2]
+            gram[:, id2] = gram_vector
+            gram[id2, :] = gram_vector
+            gram[id2, id2] = new_norm
+            ids = [id1, id2]
+
+        diag = gram.diag()
+        for ind in ids:
+            dist[:, ind] = (gram[ind, ind] + diag - 2 * gram[:, ind]).clamp(min=0)
+            dist[ind, :] = dist[:, ind]
+            dist[ind, ind] = math.inf
+
     def update_state(self, new_pos, new_scale):
         # Update scale
         self.target_scale = new_scale.clamp(self.min_scale_factor, self.max_scale_factor)
@@ -131,6 +131,12 @@ class FilterOptim(optimization.ConjugateGradientBase):
 
         self.residuals = torch.zeros(0)
 
+        # Keep the normal equations of the data term instead of applying all samples in every iteration
+        self.use_gram_cache = self.params.get('use_gram_cache', False)
+
+        # Relative residual tolerance of CG. The update is skipped if the current filter already fulfills it.
+        self.cg_tol = self.params.get('CG_tol', 0.0)
+
 
     def register(self, filter, training_samples, yf, sample_weights, reg_filter):
         self.filter = filter
@@ -139,9 +145,54 @@ class FilterOptim(optimization.ConjugateGradientBase):
         self.sample_weights = sample_weights
         self.reg_filter = reg_filter
 
+        if self.use_gram_cache:
+            self.init_gram_cache()
+
+
+    def init_gram_cache(self):
+        """Compute the weighted sample covariance (h, w, num_channels, num_channels, 2) and the weighted sample mean
+        (h, w, 1, num_channels, 2) for each Fourier coefficient."""
+        weighted_samples = complex.mult(self.sample_weights.view(1,1,-1,1), self.training_samples)
+        self.sample_cov = complex.mtimes(self.training_samples.permute(0,1,3,2,4), weighted_samples, conj_a=True)
+        self.sample_mean = complex.mtimes(self.sample_weights.view(1,1,1,-1), self.training_samples)
+        self.num_cache_updates = 0
+
+
+    def update_gram_cache(self, changed_inds, old_samples, old_weights):
+        """Low-rank update of the cached covariance and mean after the samples at changed_inds have been changed.
+        The weights of all other samples are assumed to have been scaled by a common factor.
+        args:
+            changed_inds: List of changed memory positions for each feature block.
+            old_samples: The samples previously stored at those positions, (h, w, num_changed, num_channels, 2).
+            old_weights: The sample weights before the update.
+        """
+        self.num_cache_updates += 1
+        if self.num_cache_updates >= self.params.get('gram_cache_refresh_interval', 100):
+            # Recompute to avoid accumulating numerical errors
+            self.init_gram_cache()
+            return
+
+        for i, (inds, x_old, w_old, w_new, x_all) in enumerate(zip(changed_inds, old_samples, old_weights,
+                                                                   self.sample_weights, self.training_samples)):
+            x_new = x_all[:,:,inds,...]
+            w_old = w_old[inds]
+            w_new = w_new[inds]
+
+            # Common scale factor of the unchanged weights
+            old_rest = 1 - w_old.sum().item()
+            scale = (1 - w_new.sum().item()) / old_rest if old_rest > 1e-10 else 0
+
+            # Remove the old and add the new samples with a single product
+            x = torch.cat((x_new, x_old), 2)
+            x_weighted = complex.mult(torch.cat((w_new, -scale * w_old)).view(1,1,-1,1), x)
+
+            self.sample_cov[i].mul_(scale).add_(complex.mtimes(x.permute(0,1,3,2,4), x_weighted, conj_a=True))
+            self.sample_mean[i].mul_(scale).add_(x_weighted.sum(2, keepdim=True))
+
 
     def run(self, num_iter, new_xf: TensorList = None):
         if num_iter == 0:
+            self.num_iter_run = 0
             return
 
         if new_xf is not None:
@@ -152,13 +203,12 @@ class FilterOptim(optimization.ConjugateGradientBase):
                 self.sample_energy = (1 - self.params.precond_learning_rate) * self.sample_energy + self.params.precond_learning_rate * new_sample_energy
 
         # Compute right hand side
-        self.b = complex.mtimes(self.sample_weights.view(1,1,1,-1), self.training_samples).permute(2,3,0,1,4)
-        self.b = complex.mult_conj(self.yf, self.b)
+        self.b = complex.mult_conj(self.yf, self.weighted_sample_mean())
 
         self.diag_M = (1 - self.params.precond_reg_param) * (self.params.precond_data_param * self.sample_energy +
                             (1 - self.params.precond_data_param) * self.sample_energy.mean(1, keepdim=True)) + self.params.precond_reg_param * self.reg_energy
 
-        _, res = self.run_CG(num_iter, self.filter)
+        _, res = self.run_CG(num_iter, self.filter, rel_eps=self.cg_tol)
 
         if self.debug:
             self.residuals = torch.cat((self.residuals, res))
@@ -166,13 +216,29 @@ class FilterOptim(optimization.ConjugateGradientBase):
 
 
 
-    def A(self, hf: TensorList):
+    def weighted_sample_mean(self):
+        """Weighted mean of the training samples, in the shape of the filter."""
+        if self.use_gram_cache:
+            return self.sample_mean.permute(2,3,0,1,4)
+        return complex.mtimes(self.sample_weights.view(1,1,1,-1), self.training_samples).permute(2,3,0,1,4)
+
+
+    def apply_samples(self, hf: TensorList):
+        """Data term of the left hand side operator."""
+        if self.use_gram_cache:
+            # Apply the cached sample covariance
+            return complex.mtimes(self.sample_cov, hf.permute(2,3,1,0,4)).permute(3,2,0,1,4)
+
         # Classify
         sh = complex.mtimes(self.training_samples, hf.permute(2,3,1,0,4)) # (h, w, num_samp, num_filt, 2)
         sh = complex.mult(self.sample_weights.view(1,1,-1,1), sh)
 
         # Multiply with transpose
-        hf_out = complex.mtimes(sh.permute(0,1,3,2,4), self.training_samples, conj_b=True).permute(2,3,0,1,4)
+        return complex.mtimes(sh.permute(0,1,3,2,4), self.training_samples, conj_b=True).permute(2,3,0,1,4)
+
+
+    def A(self, hf: TensorList):
+        hf_out = self.apply_samples(hf)
 
         # Add regularization
         for hfe, hfe_out, reg_filter in zip(hf, hf_out, self.reg_filter):
@@ -185,18 +251,19 @@ class FilterOptim(optimization.ConjugateGradientBase):
             else:
                 hfe_conv = hfe.clone()
 
-            # Shift data to batch dimension
-            hfe_conv = hfe_conv.permute(0,1,4,2,3).reshape(-1, 1, hfe_conv.shape[-3], hfe_conv.shape[-2])
+            # Shift data to batch dimension, each filter is convolved with its own regularization filter
+            num_filt = reg_filter.shape[0]
+            hfe_conv = hfe_conv.permute(1,4,0,2,3).reshape(-1, num_filt, hfe_conv.shape[-3], hfe_conv.shape[-2])
 
             # Do first convolution
-            hfe_conv = F.conv2d(hfe_conv, reg_filter, padding=(reg_pad1, reg_pad2))
+            hfe_conv = F.conv2d(hfe_conv, reg_filter, padding=(reg_pad1, reg_pad2), groups=num_filt)
 
             # Do second convolution
             remove_size = min(reg_pad2, hfe.shape[-2]-1)
-            hfe_conv = F.conv2d(hfe_conv[...,remove_size:], reg_filter)
+            hfe_conv = F.conv2d(hfe_conv[...,remove_size:], reg_filter, groups=num_filt)
 
             # Reshape back and add
-            hfe_out += hfe_conv.reshape(hfe.shape[0], hfe.shape[1], 2, hfe.shape[2], hfe.shape[3]).permute(0,1,3,4,2)
+            hfe_out += hfe_conv.reshape(hfe.shape[1], 2, hfe.shape[0], hfe.shape[2], hfe.shape[3]).permute(2,0,3,4,1)
 
         return hf_out
 
@@ -207,3 +274,46 @@ class FilterOptim(optimization.ConjugateGradientBase):
 
     def M1(self, hf):
         return complex.div(hf, self.diag_M)
+
+
+class BatchedFilterOptim(FilterOptim):
+    """Filter optimizer for several independent targets. The filters have the shape (num_targets, num_channels, h, w, 2),
+    the training samples (h, w, num_targets, num_samples, num_channels, 2) and the sample weights
+    (num_targets, num_samples). The Conjugate Gradient step lengths are computed separately for each target."""
+    def __init__(self, params, reg_energy):
+        super(BatchedFilterOptim, self).__init__(params, reg_energy)
+
+        if self.use_gram_cache:
+            raise ValueError('The cached normal equations are not supported for multiple targets.')
+
+
+    def weighted_sample_mean(self):
+        weights = TensorList([w.view(1, 1, w.shape[0], 1, w.shape[1]) for w in self.sample_weights])
+        return complex.mtimes(weights, self.training_samples).permute(2,3,4,0,1,5).squeeze(1)
+
+
+    def apply_samples(self, hf: TensorList):
+        # Classify
+        sh = complex.mtimes(self.training_samples, hf.permute(2,3,0,1,4).unsqueeze(-2)) # (h, w, num_targets, num_samp, 1, 2)
+        sh = complex.mult(TensorList([w.view(1, 1, w.shape[0], w.shape[1], 1) for w in self.sample_weights]), sh)
+
+        # Multiply with transpose
+        hf_out = complex.mtimes(sh.permute(0,1,2,4,3,5), self.training_samples, conj_b=True)
+        return hf_out.permute(2,3,4,0,1,5).squeeze(1)
+
+
+    def ip(self, a: torch.Tensor, b: torch.Tensor):
+        return fourier.inner_prod_fs_batch(a, b)
+
+
+    def check_zero(self, s, eps = 0.0):
+        # Only stop when the iterations have converged for all targets
+        return all((e.abs() <= eps).all().item() for e in s)
+
+
+    def div(self, a, b):
+        # The iterations continue until all targets have converged, so the step lengths of converged targets can have a
+        # zero denominator. These targets get a zero step instead of NaN.
+        if isinstance(a, TensorList):
+            return TensorList([self.div(ai, bi) for ai, bi in zip(a, b)])
+        return torch.where(b == 0, torch.zeros_like(a), a / b)
@@ -0,0 +1,128 @@
+import math
+import torch
+import torch.nn.functional as F
+from pytracking.features.preprocessing import sample_patch_batch
+from pytracking.features.icg import icg_features
+
+
+class ScaleFilter:
+    """Discriminative 1-D scale filter, as in fDSST. The target scale is estimated with a correlation filter over a
+    set of cheap, low resolution ICG samples taken at different scales, so the translation filter only needs the
+    features at a single scale.
+    args:
+        params: Tracker parameters. The scale filter specific parameters are optional.
+    """
+    def __init__(self, params):
+        self.params = params
+
+        num_scales = params.get('number_of_scales_filter', 17)
+        num_interp_scales = params.get('number_of_interp_scales', 33)
+        scale_step = params.get('scale_step_filter', 1.02)
+        scale_sigma = num_interp_scales * params.get('scale_sigma_factor', 1/16)
+
+        # The scale samples are spread over the range of the interpolated scales
+        scale_exp = (torch.arange(num_scales).float() - (num_scales - 1) // 2) * num_interp_scales / num_scales
+        scale_exp_shift = scale_exp.roll(-((num_scales - 1) // 2))
+
+        interp_scale_exp = torch.arange(num_interp_scales).float() - (num_interp_scales - 1) // 2
+        interp_scale_exp_shift = interp_scale_exp.roll(-((num_interp_scales - 1) // 2))
+
+        self.scale_size_factors = scale_step ** scale_exp
+        self.interp_scale_factors = scale_step ** interp_scale_exp_shift
+        self.num_interp_scales = num_interp_scales
+
+        # Label function and window over the scale dimension
+        self.yf = torch.fft.fft(torch.exp(-0.5 * scale_exp_shift**2 / scale_sigma**2))
+        self.window = torch.hann_window(num_scales + 2, periodic=False)[1:-1]
+
+        self.cell_size = params.get('scale_cell_size', 4)
+        self.learning_rate = params.get('scale_learning_rate', 0.025)
+        self.reg = params.get('scale_lambda', 1e-2)
+
+
+    def initialize(self, im: torch.Tensor, pos: torch.Tensor, base_target_sz: torch.Tensor, target_scale):
+        """Set the size of the scale model and train the filter on the first frame."""
+        self.base_target_sz = base_target_sz
+
+        # Limit the number of pixels in the scale samples
+        target_sz = base_target_sz * target_scale
+        scale_model_factor = self.params.get('scale_model_factor', 1.0)
+        scale_model_max_area = self.params.get('scale_model_max_area', 32*16)
+        if target_sz.prod().item() * scale_model_factor**2 > scale_model_max_area:
+            scale_model_factor = math.sqrt(scale_model_max_area / target_sz.prod().item())
+        self.scale_model_sz = torch.floor(target_sz * scale_model_factor).clamp(min=2*self.cell_size)
+
+        self.s_num = None
+        self.sf_den = None
+        self.update(im, pos, target_scale)
+
+
+    def extract_sample(self, im: torch.Tensor, pos: torch.Tensor, target_scale) -> torch.Tensor:
+        """Extract the scale sample (feature_dim, num_scales)."""
+        sample_sz = self.base_target_sz.view(1, -1) * target_scale * self.scale_size_factors.view(-1, 1)
+        im_patches, _ = sample_patch_batch(im, pos, sample_sz, self.scale_model_sz)
+
+        feat = F.avg_pool2d(icg_features(im_patches), self.cell_size, self.cell_size)
+        return feat.reshape(feat.shape[0], -1).t()
+
+    def project_sample(self, x: torch.Tensor, basis: torch.Tensor) -> torch.Tensor:
+        return torch.matmul(basis, x) * self.window
+
+
+    def track(self, im: torch.Tensor, pos: torch.Tensor, target_scale) -> torch.Tensor:
+        """Estimate the scale change factor of the target at pos."""
+        xsf = torch.fft.fft(self.project_sample(self.extract_sample(im, pos, target_scale), self.basis), dim=1)
+        scale_responsef = (self.sf_num * xsf).sum(0) / (self.sf_den + self.reg)
+
+        # Interpolate the response to all scales
+        response = torch.fft.ifft(self.resize_dft(scale_responsef, self.num_interp_scales)).real
+        max_ind = torch.argmax(response).item()
+
+        # Sub-grid refinement by fitting a parabola to the maximum and its neighbours
+        inds = [(max_ind - 1) % self.num_interp_scales, max_ind, (max_ind + 1) % self.num_interp_scales]
+        poly_x = self.interp_scale_factors[inds].double()
+        poly_A = torch.stack((poly_x**2, poly_x, torch.ones_like(poly_x)), dim=1)
+        poly = torch.linalg.solve(poly_A, response[inds].double())
+
+        if poly[0] >= 0:
+            return self.interp_scale_factors[max_ind]
+        return (-poly[1] / (2 * poly[0])).float()
+
+    @staticmethod
+    def resize_dft(inputdft: torch.Tensor, desired_len: int) -> torch.Tensor:
+        """Zero pad (or truncate) a 1-D DFT to the desired length."""
+        input_len = inputdft.shape[0]
+        minsz = min(input_len, desired_len)
+        mids = math.ceil(minsz / 2)
+        mide = (minsz - 1) // 2
+
+        resized = inputdft.new_zeros(desired_len)
+        resized[:mids] = inputdft[:mids]
+        if mide > 0:
+            resized[-mide:] = inputdft[-mide:]
+        return resized * (desired_len / input_len)
+
+
+    def update(self, im: torch.Tensor, pos: torch.Tensor, target_scale):
+        """Update the scale filter with the sample at the estimated target position and scale."""
+        xs = self.extract_sample(im, pos, target_scale)
+
+        if self.s_num is None:
+            self.s_num = xs
+        else:
+            self.s_num = (1 - self.learning_rate) * self.s_num + self.learning_rate * xs
+
+        # Compress the samples using orthonormal bases of the model and of the new sample
+        self.basis = torch.linalg.qr(self.s_num)[0].t()
+        basis_den = torch.linalg.qr(xs)[0].t()
+
+        sf_proj = torch.fft.fft(self.project_sample(self.s_num, self.basis), dim=1)
+        self.sf_num = self.yf * sf_proj.conj()
+
+        xsf = torch.fft.fft(self.project_sample(xs, basis_den), dim=1)
+        new_sf_den = (xsf * xsf.conj()).real.sum(0)
+
+        if self.sf_den is None:
+            self.sf_den = new_sf_den
+        else:
+            self.sf_den = (1 - self.learning_rate) * self.sf_den + self.learning_rate * new_sf_den
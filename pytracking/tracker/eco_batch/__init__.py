@@ -0,0 +1,4 @@
+from .eco_batch import ECOBatch
+
+def get_tracker_class():
+    return ECOBatch
\ No newline at end of file
@@ -0,0 +1,316 @@
+import torch
+import torch.nn.functional as F
+import math
+from collections import OrderedDict
+from pytracking import complex, dcf, fourier, TensorList
+from pytracking.features.preprocessing import numpy_to_torch
+from pytracking.tracker.eco import ECO
+from pytracking.tracker.eco.optim import BatchedFilterOptim
+from pytracking.utils.profiler import profiled
+
+
+class ECOBatch(ECO):
+    """ECO for multiple targets. The state of all targets is stacked along a leading target dimension, so that the
+    features of all targets are extracted with a single call per frame and the filters of all targets are trained
+    with one batched Conjugate Gradient. All targets use the same image sample size (params.image_sample_size),
+    which gives the same feature and filter sizes. Each new target is initialized with a single target ECO."""
+
+    multiobj_mode = 'default'
+
+    def initialize(self, image, info: dict) -> dict:
+        if self.params.get('image_sample_size', None) is None:
+            raise ValueError('ECOBatch requires a fixed image sample size, params.image_sample_size.')
+        if self.params.get('sample_memory_policy', 'replace') != 'replace':
+            raise ValueError('ECOBatch only supports the \'replace\' sample memory policy.')
+        if self.params.score_fusion_strategy not in ['sum', 'weightedsum']:
+            raise ValueError('Score fusion strategy {} is not supported by ECOBatch.'.format(self.params.score_fusion_strategy))
+
+        self.frame_num = 1
+        self.initialize_features()
+
+        # Multiple objects are given as dicts over the object ids
+        self.multiobj = isinstance(info['init_bbox'], (dict, OrderedDict))
+        init_bbox = info['init_bbox'] if self.multiobj else {1: info['init_bbox']}
+
+        self.object_ids = []
+        self.add_targets(image, init_bbox)
+
+        return {'cg_iter_saved': self.cg_iter_saved[0]}
+
+
+    def add_targets(self, image, init_bbox: dict):
+        """Initialize a single target ECO for each new target and append its state to the stacked state."""
+        targets = []
+        for obj_id, state in init_bbox.items():
+            tracker = ECO(self.params)
+            tracker.visdom = self.visdom
+            tracker.profiler = self.profiler
+            tracker.features_initialized = True
+            tracker.initialize(image, {'init_bbox': state})
+            targets.append(tracker)
+            self.object_ids.append(obj_id)
+
+        first = targets[0]
+        if not hasattr(self, 'pos'):
+            # Sizes and functions shared by all targets
+            for name in ['fparams', 'img_sample_sz', 'img_support_sz', 'feature_sz', 'filter_sz', 'output_sz',
+                         'compressed_dim', 'num_filters', 'window', 'interp_fs', 'image_sz', 'scale_factors',
+                         'use_scale_filter']:
+                setattr(self, name, getattr(first, name))
+
+            self.pos = first.pos.new_zeros(0, 2)
+            self.target_sz = first.pos.new_zeros(0, 2)
+            self.base_target_sz = first.pos.new_zeros(0, 2)
+            self.target_scale = first.pos.new_zeros(0)
+            self.min_scale_factor = first.pos.new_zeros(0)
+            self.max_scale_factor = first.pos.new_zeros(0)
+            self.scale_filters = []
+            self.target_reg_filters = []
+            self.cg_iter_saved = [0]
+
+            self.filter = TensorList([hf.new_zeros(0, *hf.shape[1:]) for hf in first.filter])
+            self.projection_matrix = TensorList([P.new_zeros(0, *P.shape) for P in first.projection_matrix])
+            self.training_samples = TensorList([ts.new_zeros(ts.shape[0], ts.shape[1], 0, *ts.shape[2:])
+                                                for ts in first.training_samples])
+            self.sample_weights = TensorList([sw.new_zeros(0, sw.shape[0]) for sw in first.sample_weights])
+            self.previous_replace_ind = [torch.zeros(0, dtype=torch.long) for _ in first.sample_weights]
+            self.yf = TensorList([yf.new_zeros(0, *yf.shape[1:]) for yf in first.yf])
+            self.sample_energy = TensorList([e.new_zeros(0, *e.shape[1:])
+                                             for e in first.filter_optimizer.sample_energy])
+        else:
+            self.sample_energy = self.filter_optimizer.sample_energy
+
+        if any((t.img_sample_sz != self.img_sample_sz).any() for t in targets):
+            raise RuntimeError('All targets must have the same image sample size.')
+
+        # Append the target states
+        self.pos = torch.cat([self.pos] + [t.pos.view(1, 2) for t in targets])
+        self.target_sz = torch.cat([self.target_sz] + [t.target_sz.view(1, 2) for t in targets])
+        self.base_target_sz = torch.cat([self.base_target_sz] + [t.base_target_sz.view(1, 2) for t in targets])
+        self.target_scale = torch.cat([self.target_scale, torch.Tensor([float(t.target_scale) for t in targets])])
+        self.min_scale_factor = torch.cat([self.min_scale_factor, torch.stack([t.min_scale_factor for t in targets])])
+        self.max_scale_factor = torch.cat([self.max_scale_factor, torch.stack([t.max_scale_factor for t in targets])])
+        if self.use_scale_filter:
+            self.scale_filters.extend([t.scale_filter for t in targets])
+        self.target_reg_filters.extend([t.reg_filter for t in targets])
+        self.cg_iter_saved[-1] += sum(t.cg_iter_saved[0] for t in targets)
+
+        for i in range(len(self.filter)):
+            self.filter[i] = torch.cat([self.filter[i]] + [t.filter[i] for t in targets])
+            self.projection_matrix[i] = torch.cat([self.projection_matrix[i]] + [t.projection_matrix[i].unsqueeze(0) for t in targets])
+            self.training_samples[i] = torch.cat([self.training_samples[i]] + [t.training_samples[i].unsqueeze(2) for t in targets], 2)
+            self.sample_weights[i] = torch.cat([self.sample_weights[i]] + [t.sample_weights[i].unsqueeze(0) for t in targets])
+            self.previous_replace_ind[i] = torch.cat([self.previous_replace_ind[i], torch.full((len(targets),), -1, dtype=torch.long)])
+            self.yf[i] = torch.cat([self.yf[i]] + [t.yf[i] for t in targets])
+            self.sample_energy[i] = torch.cat([self.sample_energy[i]] + [t.filter_optimizer.sample_energy[i] for t in targets])
+
+        # Zero pad the regularization filters of all targets to the same size
+        self.reg_filter = TensorList()
+        for i in range(len(self.filter)):
+            reg_filters = [rf[i] for rf in self.target_reg_filters]
+            max_sz = [max(rf.shape[d] for rf in reg_filters) for d in (-2, -1)]
+            padded = []
+            for rf in reg_filters:
+                pad_h, pad_w = max_sz[0] - rf.shape[-2], max_sz[1] - rf.shape[-1]
+                padded.append(F.pad(rf, (pad_w // 2, pad_w - pad_w // 2, pad_h // 2, pad_h - pad_h // 2)))
+            self.reg_filter.append(torch.cat(padded))
+        self.reg_energy = TensorList([(rf**2).sum((1,2,3)).view(-1, 1, 1, 1) for rf in self.reg_filter])
+
+        # Initialize the batched optimizer
+        self.filter_optimizer = BatchedFilterOptim(self.params, self.reg_energy)
+        self.filter_optimizer.register(self.filter, self.training_samples, self.yf, self.sample_weights, self.reg_filter)
+        self.filter_optimizer.sample_energy = self.sample_energy
+
+
+    def track(self, image, info: dict = None) -> dict:
+        info = {} if info is None else info
+        self.frame_num += 1
+
+        self.params.features.profiler = self.profiler
+
+        # Convert image
+        im = numpy_to_torch(image)
+
+        num_targets = self.pos.shape[0]
+        target_inds = torch.arange(num_targets)
+
+        # ------- LOCALIZATION ------- #
+
+        # Get samples of all targets
+        sample_pos = self.pos.round()
+        sample_scales = self.target_scale.view(-1, 1) * self.scale_factors.view(1, -1)
+        test_xf = self.extract_fourier_sample(im, self.pos, sample_scales, self.img_sample_sz)
+
+        # Compute scores
+        sf = self.apply_filter(test_xf)
+
+        translation_vec, scale_ind, s = self.localize_target(sf)
+        new_pos = sample_pos + translation_vec
+
+        if self.use_scale_filter:
+            with self.profiler.stage('scale_filter'):
+                scale_change_factor = torch.stack([scale_filter.track(im, pos, scale) for scale_filter, pos, scale
+                                                   in zip(self.scale_filters, new_pos, self.target_scale)])
+        else:
+            scale_change_factor = self.scale_factors[scale_ind]
+
+        # Update position and scale
+        self.update_state(new_pos, self.target_scale * scale_change_factor)
+
+        # ------- UPDATE ------- #
+
+        # Get train samples
+        train_xf = TensorList([xf.view(num_targets, -1, *xf.shape[1:])[target_inds, scale_ind, ...] for xf in test_xf])
+
+        # Shift the samples
+        shift_samp = 2*math.pi * (self.pos - sample_pos) / (sample_scales[target_inds, scale_ind].view(-1, 1) * self.img_support_sz)
+        train_xf = self.shift_sample(train_xf, shift_samp)
+
+        # Update memory
+        self.update_memory(train_xf)
+
+        # Train filters
+        cg_iter_saved = 0
+        if self.frame_num % self.params.train_skipping == 1:
+            with self.profiler.stage('CG'):
+                self.filter_optimizer.run(self.params.CG_iter, train_xf)
+            self.symmetrize_filter()
+            cg_iter_saved = self.params.CG_iter - self.filter_optimizer.num_iter_run
+        self.cg_iter_saved.append(cg_iter_saved)
+
+        # Update the scale filters
+        if self.use_scale_filter:
+            with self.profiler.stage('scale_filter'):
+                for scale_filter, pos, scale in zip(self.scale_filters, self.pos, self.target_scale):
+                    scale_filter.update(im, pos, scale)
+
+        # Return new states
+        new_state = torch.cat((self.pos[:, [1,0]] - (self.target_sz[:, [1,0]]-1)/2, self.target_sz[:, [1,0]]), 1)
+        target_bbox = OrderedDict(zip(self.object_ids, new_state.tolist()))
+
+        # Initialize new targets
+        if info.get('init_object_ids', False):
+            new_bbox = OrderedDict((obj_id, info['init_bbox'][obj_id]) for obj_id in info['init_object_ids'])
+            self.add_targets(image, new_bbox)
+            target_bbox.update(new_bbox)
+
+        if not self.multiobj:
+            return {'target_bbox': target_bbox[self.object_ids[0]], 'cg_iter_saved': self.cg_iter_saved[-1]}
+        return {'target_bbox': target_bbox, 'cg_iter_saved': self.cg_iter_saved[-1]}
+
+
+    @profiled('filter')
+    def apply_filter(self, sample_xf: TensorList) -> TensorList:
+        return TensorList([complex.mult(hf.unsqueeze(1), xf.view(hf.shape[0], -1, *xf.shape[1:])).sum(2).view(-1, 1, *xf.shape[2:])
+                           for hf, xf in zip(self.filter, sample_xf)])
+
+    @profiled('localization')
+    def localize_target(self, sf: TensorList):
+        if self.params.score_fusion_strategy == 'sum':
+            scores_fs = fourier.sum_fs(sf)
+        elif self.params.score_fusion_strategy == 'weightedsum':
+            weight = self.fparams.attribute('translation_weight')
+            scores_fs = fourier.sum_fs(weight * sf)
+        else:
+            raise ValueError('Unknown score fusion strategy.')
+
+        num_targets = self.pos.shape[0]
+        target_inds = torch.arange(num_targets)
+
+        if self.params.get('newton_iterations', 0) > 0:
+            # Refine the maximum at the size of the Fourier series for all targets and scales
+            grid_sz = torch.Tensor([scores_fs.shape[2], 2*scores_fs.shape[3]-1])
+            scores = fourier.sample_fs(scores_fs, grid_sz)
+            max_score, disp = fourier.maximize_fs(scores_fs, dcf.max2d(scores)[1], self.params.newton_iterations)
+            max_score = max_score.view(num_targets, -1)
+            _, scale_ind = torch.max(max_score, dim=1)
+            disp = disp.view(num_targets, -1, 2)[target_inds, scale_ind, :].cpu()
+        else:
+            grid_sz = self.output_sz
+            scores = fourier.sample_fs(scores_fs, grid_sz)
+
+            # Get maximum for each target
+            max_score, max_disp = dcf.max2d(scores.view(num_targets, -1, *scores.shape[-2:]))
+            _, scale_ind = torch.max(max_score, dim=1)
+            max_disp = max_disp[target_inds, scale_ind, :].float().cpu()
+
+            # Convert to displacements in the base scale
+            disp = (max_disp + grid_sz / 2) % grid_sz - grid_sz / 2
+
+        scores = scores.view(num_targets, -1, *scores.shape[-2:])
+
+        # Compute translation vectors
+        translation_vec = disp * (self.img_support_sz / grid_sz) * \
+                          (self.target_scale * self.scale_factors[scale_ind]).view(-1, 1)
+
+        return translation_vec, scale_ind, scores
+
+    @profiled('sample')
+    def extract_sample(self, im: torch.Tensor, pos: torch.Tensor, scales, sz: torch.Tensor):
+        return self.params.features.extract_batch(im, pos, scales, sz)
+
+    @profiled('projection')
+    def project_sample(self, x: TensorList):
+        num_targets = self.pos.shape[0]
+        x_proj = TensorList()
+        for e, P in zip(x, self.projection_matrix):
+            if P is None:
+                x_proj.append(e)
+                continue
+            e = e.view(num_targets, -1, *e.shape[1:]).permute(0, 3, 4, 1, 2)
+            e = torch.matmul(e, P.unsqueeze(1).unsqueeze(1)).permute(0, 3, 4, 1, 2)
+            x_proj.append(e.reshape(-1, *e.shape[2:]))
+        return x_proj
+
+    def shift_sample(self, xf: TensorList, shift: torch.Tensor) -> TensorList:
+        """Shift the Fourier samples (num_targets, ...) of each target by its own shift (num_targets, 2)."""
+        xf_shifted = TensorList()
+        for e in xf:
+            ky, kx = fourier.get_frequency_coord((e.shape[2], 2*e.shape[3]-1), device=e.device)
+            e = complex.mult(complex.mult(e, complex.exp_imag(shift[:, 0].view(-1, 1, 1, 1) * ky)),
+                             complex.exp_imag(shift[:, 1].view(-1, 1, 1, 1) * kx))
+            xf_shifted.append(e)
+        return xf_shifted
+
+    @profiled('memory_update')
+    def update_memory(self, sample_xf: TensorList):
+        # Update weights and get indices to replace
+        replace_ind = self.update_sample_weights()
+        target_inds = torch.arange(self.pos.shape[0])
+        for train_samp, xf, ind in zip(self.training_samples, sample_xf, replace_ind):
+            train_samp[:, :, target_inds, ind, :, :] = xf.permute(2, 3, 0, 1, 4)
+
+    def update_sample_weights(self):
+        target_inds = torch.arange(self.pos.shape[0])
+        replace_ind = []
+        for i, (sw, fparams) in enumerate(zip(self.sample_weights, self.fparams)):
+            if fparams.learning_rate == 1:
+                sw[:] = 0
+                sw[:, 0] = 1
+                r_ind = torch.zeros(sw.shape[0], dtype=torch.long)
+            else:
+                # Get indices to replace
+                _, r_ind = torch.min(sw, 1)
+
+                # Update weights
+                prev_ind = self.previous_replace_ind[i]
+                no_prev = prev_ind < 0
+                prev_weight = sw[target_inds, prev_ind.clamp(min=0)] / (1 - fparams.learning_rate)
+                sw[no_prev, :] /= 1 - fparams.learning_rate
+                sw[target_inds, r_ind] = torch.where(no_prev, torch.full_like(prev_weight, fparams.learning_rate), prev_weight)
+
+            sw /= sw.sum(1, keepdim=True)
+            replace_ind.append(r_ind)
+
+        self.previous_replace_ind = [r_ind.clone() for r_ind in replace_ind]
+        return replace_ind
+
+    def update_state(self, new_pos, new_scale):
+        # Update scales
+        self.target_scale = torch.max(torch.min(new_scale, self.max_scale_factor), self.min_scale_factor)
+        self.target_sz = self.base_target_sz * self.target_scale.view(-1, 1)
+
+        # Update positions
+        inside_ratio = 0.2
+        inside_offset = (inside_ratio - 0.5) * self.target_sz
+        self.pos = torch.max(torch.min(new_pos, self.image_sz - inside_offset), inside_offset)
@@ -801,9 +801,12 @@ class KeepTrack(BaseTracker):
         x = self.get_classification_features(init_backbone_feat)
 
         # Set regularization weight and initializer
+        # The network is shared with the other trackers in the process, modify a copy of the classifier
         if hasattr(self.net, 'classifier'):
+            self.net.copy_submodules('classifier')
             pred_module = getattr(self.net.classifier.filter_optimizer, 'score_predictor', self.net.classifier.filter_optimizer)
         elif hasattr(self.net, 'dimp_classifier'):
+            self.net.copy_submodules('dimp_classifier')
             self.net.classifier = self.net.dimp_classifier
             pred_module = getattr(self.net.dimp_classifier.filter_optimizer, 'score_predictor',
                                   self.net.dimp_classifier.filter_optimizer)
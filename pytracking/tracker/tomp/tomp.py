@@ -665,6 +665,8 @@ class ToMP(BaseTracker):
         self.num_gth_frames = target_boxes.shape[0]
 
         if hasattr(self.net.head.filter_predictor, 'num_gth_frames'):
+            # The network is shared with the other trackers in the process, modify a copy of the head
+            self.net.copy_submodules('head')
             self.net.head.filter_predictor.num_gth_frames = self.num_gth_frames
 
         self.init_memory(TensorList([x]))
@@ -0,0 +1,851 @@
+import os
+import sys
+import time
+import argparse
+import importlib
+import contextlib
+from collections import OrderedDict
+import numpy as np
+import cv2 as cv
+import torch
+import torch.nn.functional as F
+
+env_path = os.path.join(os.path.dirname(__file__), '../..')
+if env_path not in sys.path:
+    sys.path.append(env_path)
+
+from pytracking import TensorList, dcf
+from pytracking.libs import complex
+from pytracking.libs.tensorlist import tensor_operation
+from pytracking.utils import TrackerParams
+from pytracking.features import augmentation
+from pytracking.features.icg import ICG
+from pytracking.features.preprocessing import numpy_to_torch, sample_patch, sample_patch_batch
+from pytracking.tracker.eco.optim import FilterOptim
+
+
+# Shared helpers
+
+def synthetic_sequence(num_frames=50, image_sz=(240, 320), target_sz=(30, 40), scale_change=0.0, seed=0):
+    """ Generates a simple tracking sequence with a textured target moving over a textured background. Useful for
+    timing trackers when no dataset is available.
+
+    args:
+        num_frames - number of frames
+        image_sz - image size (H, W)
+        target_sz - target size (H, W)
+        scale_change - amplitude of the relative change of the target size over the sequence
+        seed - random seed
+    returns:
+        list of RGB uint8 frames, ground truth boxes as np.array of shape (num_frames, 4) in [x, y, w, h] format
+    """
+    rng = np.random.RandomState(seed)
+    H, W = image_sz
+    th, tw = target_sz
+
+    background = cv.resize((255 * rng.rand(H // 8, W // 8, 3)).astype(np.uint8), (W, H), interpolation=cv.INTER_LINEAR)
+    target = cv.resize((255 * rng.rand(th // 3, tw // 4, 3)).astype(np.uint8), (tw, th), interpolation=cv.INTER_NEAREST)
+
+    frames = []
+    boxes = []
+    for i in range(num_frames):
+        scale = 1 + scale_change * np.sin(i / 15)
+        sh, sw = int(round(th * scale)), int(round(tw * scale))
+        x = int(W / 2 - sw / 2 + W / 8 * np.sin(i / 8))
+        y = int(H / 2 - sh / 2 + H / 12 * np.cos(i / 10))
+        im = background.copy()
+        im[y:y + sh, x:x + sw, :] = target if scale_change == 0 else cv.resize(target, (sw, sh))
+        frames.append(im)
+        boxes.append([x, y, sw, sh])
+
+    return frames, np.array(boxes, dtype=np.float64)
+
+
+def dataset_sequence(dataset_name, sequence, num_frames=None):
+    """ Loads the frames and ground truth of a dataset sequence.
+
+    args:
+        dataset_name - name of the dataset, see pytracking.evaluation.get_dataset
+        sequence - sequence name or number
+        num_frames - only load the first num_frames frames (None loads all)
+    """
+    from pytracking.evaluation import get_dataset
+    seq = get_dataset(dataset_name)[sequence]
+
+    frame_paths = seq.frames if num_frames is None else seq.frames[:num_frames]
+    frames = [cv.cvtColor(cv.imread(f), cv.COLOR_BGR2RGB) for f in frame_paths]
+    return frames, np.array(seq.ground_truth_rect[:len(frames)], dtype=np.float64)
+
+
+def load_sequence(dataset_name=None, sequence=None, num_frames=50, scale_change=0.0):
+    """ Dataset sequence if a dataset is given, otherwise a synthetic sequence."""
+    if dataset_name is None:
+        return synthetic_sequence(num_frames, scale_change=scale_change)
+    return dataset_sequence(dataset_name, sequence, num_frames)
+
+
+def get_tracker_parameters(tracker_name, param_name):
+    """ Loads the parameters of a tracker parameter file."""
+    param_module = importlib.import_module('pytracking.parameter.{}.{}'.format(tracker_name, param_name))
+    return param_module.parameters()
+
+
+def get_tracker(tracker_name, params):
+    """ Creates a tracker instance from the given parameters."""
+    tracker_module = importlib.import_module('pytracking.tracker.{}'.format(tracker_name))
+    return tracker_module.get_tracker_class()(params)
+
+
+def run_frames(tracker, frames, init_box):
+    """ Runs a tracker over a list of frames.
+
+    returns:
+        predicted boxes as np.array of shape (num_frames, 4), initialization time, list of per-frame tracking times
+    """
+    start = time.perf_counter()
+    tracker.initialize(frames[0], {'init_bbox': list(init_box)})
+    init_time = time.perf_counter() - start
+
+    boxes = [list(init_box)]
+    frame_times = []
+    for im in frames[1:]:
+        start = time.perf_counter()
+        out = tracker.track(im)
+        frame_times.append(time.perf_counter() - start)
+        boxes.append(out['target_bbox'])
+
+    return np.array(boxes, dtype=np.float64), init_time, frame_times
+
+
+def overlap(pred, gt):
+    """ Intersection over union between boxes in [x, y, w, h] format."""
+    tl = np.maximum(pred[:, :2], gt[:, :2])
+    br = np.minimum(pred[:, :2] + pred[:, 2:], gt[:, :2] + gt[:, 2:])
+    intersection = np.prod(np.clip(br - tl, 0, None), axis=1)
+    union = np.prod(pred[:, 2:], axis=1) + np.prod(gt[:, 2:], axis=1) - intersection
+    return intersection / union
+
+
+def success_auc(pred, gt):
+    """ Area under the success curve (in percent), computed over 21 overlap thresholds as in OTB."""
+    iou = overlap(pred, gt)
+    thresholds = np.linspace(0, 1, 21)
+    return 100 * np.mean([np.mean(iou > t) for t in thresholds])
+
+
+def time_fn(fn, num_iter, num_warmup=3):
+    """ Mean run time of fn in seconds."""
+    for _ in range(num_warmup):
+        fn()
+    start = time.perf_counter()
+    for _ in range(num_iter):
+        fn()
+    return (time.perf_counter() - start) / num_iter
+
+
+def print_run_stats(name, pred, gt, init_time, frame_times):
+    frame_times = np.array(frame_times)
+    print('{:24s}  init {:7.1f} ms  frame mean {:7.1f} ms  p95 {:7.1f} ms  FPS {:6.1f}  AUC {:5.1f}'.format(
+        name, 1000 * init_time, 1000 * frame_times.mean(), 1000 * np.percentile(frame_times, 95),
+        1 / frame_times.mean(), success_auc(pred, gt)))
+
+
+def set_num_threads(num_threads):
+    if num_threads is not None:
+        torch.set_num_threads(num_threads)
+
+
+# ICG feature
+
+def benchmark_icg(num_scales=5, sample_sz=250, num_iter=20, num_threads=None):
+    """ Micro-benchmark of the CPU 'edg' (ICG) feature against the vggconv1 layer of ResNet18m1. One frame corresponds
+    to extracting the feature for all scale patches, as done in ECO.track. The network is randomly initialized since
+    only the run time is of interest.
+
+    args:
+        num_scales - number of scale patches per frame
+        sample_sz - size of the (square) image patches
+        num_iter - number of timed frames
+        num_threads - number of torch CPU threads (None uses the torch default)
+    """
+    from ltr.models.backbone.resnet18_vggm import resnet18_vggmconv1
+    set_num_threads(num_threads)
+
+    im_patches = 255 * torch.rand(num_scales, 3, sample_sz, sample_sz)
+
+    icg = ICG(pool_stride=4, normalize_power=2)
+
+    net = resnet18_vggmconv1(['vggconv1'])
+    net.eval()
+    mean = torch.Tensor([0.485, 0.456, 0.406]).view(1, -1, 1, 1)
+    std = torch.Tensor([0.229, 0.224, 0.225]).view(1, -1, 1, 1)
+
+    def run_vggconv1():
+        with torch.no_grad():
+            feat = net((im_patches / 255 - mean) / std)['vggconv1']
+        feat = F.avg_pool2d(feat, 2, 2)
+        feat /= (torch.sum(feat.abs().view(feat.shape[0], 1, 1, -1) ** 2, dim=3, keepdim=True) /
+                 (feat.shape[1] * feat.shape[2] * feat.shape[3]) + 1e-10) ** (1 / 2)
+        return feat
+
+    def run_icg():
+        return icg.get_feature(im_patches)
+
+    print('Patches: {} x {}x{}, torch threads: {}'.format(num_scales, sample_sz, sample_sz, torch.get_num_threads()))
+    for name, fn in [('icg (edg)', run_icg), ('vggconv1', run_vggconv1)]:
+        t = time_fn(fn, num_iter)
+        feat = fn()
+        print('{:12s}  {:8.2f} ms/frame  {:8.1f} FPS  output {}'.format(name, 1000 * t, 1 / t, tuple(feat.shape)))
+
+
+# Complex arithmetic emulated by slicing the last dimension, as before the native backend. Only used as reference.
+
+@tensor_operation
+def _emulated_mult(a, b):
+    if complex.is_real(a):
+        return complex.mult_real_cplx(a, b)
+    if complex.is_real(b):
+        return complex.mult_real_cplx(b, a)
+    c = complex.mult_real_cplx(a[..., 0], b)
+    c[..., 0] -= a[..., 1] * b[..., 1]
+    c[..., 1] += a[..., 1] * b[..., 0]
+    return c
+
+
+@tensor_operation
+def _emulated_mult_conj(a, b):
+    if complex.is_real(a):
+        return complex.mult_real_cplx(a, _emulated_conj(b))
+    if complex.is_real(b):
+        return complex.mult_real_cplx(b, a)
+    c = complex.mult_real_cplx(b[..., 0], a)
+    c[..., 0] += a[..., 1] * b[..., 1]
+    c[..., 1] -= a[..., 0] * b[..., 1]
+    return c
+
+
+@tensor_operation
+def _emulated_conj(a):
+    return complex.complex(a[..., 0], -a[..., 1])
+
+
+@tensor_operation
+def _emulated_div(a, b):
+    if complex.is_real(b):
+        return complex.div_cplx_real(a, b)
+    return complex.div_cplx_real(_emulated_mult_conj(a, b), complex.abs_sqr(b))
+
+
+@tensor_operation
+def _emulated_mtimes(a, b, conj_a=False, conj_b=False):
+    if complex.is_real(a):
+        re, im = torch.matmul(a, b[..., 0]), torch.matmul(a, b[..., 1])
+        return complex.complex(re, -im if conj_b else im)
+    if complex.is_real(b):
+        re, im = torch.matmul(a[..., 0], b), torch.matmul(a[..., 1], b)
+        return complex.complex(re, -im if conj_a else im)
+    sa = -1 if conj_a else 1
+    sb = -1 if conj_b else 1
+    return complex.complex(torch.matmul(a[..., 0], b[..., 0]) - sa * sb * torch.matmul(a[..., 1], b[..., 1]),
+                           sb * torch.matmul(a[..., 0], b[..., 1]) + sa * torch.matmul(a[..., 1], b[..., 0]))
+
+
+@contextlib.contextmanager
+def emulated_complex():
+    """ Temporarily replaces the native complex backend with the emulated one."""
+    replaced = {'mult': _emulated_mult, 'mult_conj': _emulated_mult_conj, 'conj': _emulated_conj,
+                'div': _emulated_div, 'mtimes': _emulated_mtimes}
+    native = {name: getattr(complex, name) for name in replaced}
+    for name, fn in replaced.items():
+        setattr(complex, name, fn)
+    try:
+        yield
+    finally:
+        for name, fn in native.items():
+            setattr(complex, name, fn)
+
+
+def benchmark_cg_ops(num_samples=200, compressed_dim=64, filter_sz=(63, 32), num_iter=10):
+    """ Times one application of the ECO filter operator (the two mtimes in FilterOptim.A)."""
+    samples = torch.randn(filter_sz[0], filter_sz[1], num_samples, compressed_dim, 2)
+    hf = torch.randn(1, compressed_dim, filter_sz[0], filter_sz[1], 2)
+    weights = torch.rand(num_samples)
+
+    def apply_A():
+        sh = complex.mtimes(samples, hf.permute(2, 3, 1, 0, 4))
+        sh = complex.mult(weights.view(1, 1, -1, 1), sh)
+        return complex.mtimes(sh.permute(0, 1, 3, 2, 4), samples, conj_b=True)
+
+    t_native = time_fn(apply_A, num_iter)
+    with emulated_complex():
+        t_emulated = time_fn(apply_A, num_iter)
+
+    print('FilterOptim.A data term ({} samples, {} channels, {}x{} coefficients)'.format(
+        num_samples, compressed_dim, filter_sz[0], filter_sz[1]))
+    print('  emulated {:8.2f} ms   native {:8.2f} ms   speedup {:.2f}x'.format(
+        1000 * t_emulated, 1000 * t_native, t_emulated / t_native))
+
+
+def benchmark_fourier(tracker_param='edg', dataset_name=None, sequence=None, num_frames=50, num_threads=None):
+    """ Per-frame ECO time with the emulated and the native complex arithmetic.
+
+    args:
+        tracker_param - name of the ECO parameter file
+        dataset_name - dataset to take the sequence from (None uses a synthetic sequence)
+        sequence - sequence name or number
+        num_frames - number of frames to run
+        num_threads - number of torch CPU threads (None uses the torch default)
+    """
+    set_num_threads(num_threads)
+    frames, gt = load_sequence(dataset_name, sequence, num_frames)
+
+    benchmark_cg_ops()
+
+    for name, ctx in [('emulated', emulated_complex()), ('native', contextlib.nullcontext())]:
+        with ctx:
+            torch.manual_seed(0)
+            tracker = get_tracker('eco', get_tracker_parameters('eco', tracker_param))
+            pred, init_time, frame_times = run_frames(tracker, frames, gt[0])
+        print_run_stats('eco/{} {}'.format(tracker_param, name), pred, gt, init_time, frame_times)
+
+
+# Cached normal equations
+
+def _get_optimizer(memory_size, compressed_dim, filter_sz, use_gram_cache):
+    params = TrackerParams()
+    params.fletcher_reeves = False
+    params.standard_alpha = True
+    params.direction_forget_factor = 0
+    params.debug = 0
+    params.precond_learning_rate = 0.01
+    params.precond_data_param = 0.3
+    params.precond_reg_param = 0.15
+    params.use_gram_cache = use_gram_cache
+
+    h, w = filter_sz
+    samples = TensorList([torch.randn(h, w, memory_size, compressed_dim, 2)])
+    weights = TensorList([torch.rand(memory_size)])
+    weights /= weights.sum()
+    yf = TensorList([torch.randn(1, 1, h, w, 2)])
+    reg_filter = TensorList([torch.rand(1, 1, 5, 5)])
+    hf = TensorList([torch.zeros(1, compressed_dim, h, w, 2)])
+
+    optimizer = FilterOptim(params, reg_filter.view(-1) @ reg_filter.view(-1))
+    optimizer.register(hf, samples, yf, weights, reg_filter)
+    optimizer.sample_energy = TensorList([torch.rand(1, compressed_dim, h, w)])
+    return optimizer
+
+
+def benchmark_gram_cache(memory_sizes=(50, 200, 400), compressed_dims=(16, 64), filter_sz=(63, 32), num_iter=10,
+                         num_threads=None):
+    """ Times the FilterOptim left hand side operator A() and a 5-iteration CG update, with and without the cached
+    normal equations. For the cache, the time of the low-rank update done when a sample is replaced is also given.
+
+    args:
+        memory_sizes - sample memory sizes to test
+        compressed_dims - number of feature channels to test
+        filter_sz - number of Fourier coefficients (h, w) of the filter
+        num_iter - number of timed repetitions
+        num_threads - number of torch CPU threads (None uses the torch default)
+    """
+    set_num_threads(num_threads)
+    print('Filter size {}x{}, torch threads: {}'.format(filter_sz[0], filter_sz[1], torch.get_num_threads()))
+    print('{:>8s} {:>6s}   {:>12s} {:>12s} {:>8s}   {:>12s} {:>12s}   {:>12s}'.format(
+        'memory', 'dim', 'A() samples', 'A() cache', 'speedup', 'CG samples', 'CG cache', 'cache update'))
+
+    for compressed_dim in compressed_dims:
+        for memory_size in memory_sizes:
+            times = {}
+            for use_cache in [False, True]:
+                torch.manual_seed(0)
+                optimizer = _get_optimizer(memory_size, compressed_dim, filter_sz, use_cache)
+                hf = TensorList([torch.randn_like(f) for f in optimizer.filter])
+                times['A', use_cache] = time_fn(lambda: optimizer.A(hf), num_iter)
+                times['CG', use_cache] = time_fn(lambda: optimizer.run(5), num_iter)
+
+            old_samples = TensorList([s[:, :, :1, ...].clone() for s in optimizer.training_samples])
+            old_weights = optimizer.sample_weights.clone()
+            t_update = time_fn(lambda: optimizer.update_gram_cache([[0]], old_samples, old_weights), num_iter)
+
+            print('{:8d} {:6d}   {:9.2f} ms {:9.2f} ms {:7.2f}x   {:9.2f} ms {:9.2f} ms   {:9.2f} ms'.format(
+                memory_size, compressed_dim, 1000 * times['A', False], 1000 * times['A', True],
+                times['A', False] / times['A', True], 1000 * times['CG', False], 1000 * times['CG', True],
+                1000 * t_update))
+
+
+# Fourier coefficient truncation
+
+def benchmark_fourier_truncation(tracker_params=('edg',), dataset_name=None, sequence=None,
+                                 num_frames=100, truncations=(1.0, 0.75, 0.5, 0.3), num_threads=None):
+    """ Per-frame time and AUC of ECO when only the low frequency band of the Fourier coefficients is kept in the
+    filters and samples. The same truncation ratio is used for all feature blocks.
+
+    args:
+        tracker_params - names of the ECO parameter files
+        dataset_name - dataset to take the sequence from (None uses a synthetic sequence)
+        sequence - sequence name or number
+        num_frames - number of frames to run
+        truncations - ratios of the Fourier coefficients to keep in each dimension
+        num_threads - number of torch CPU threads (None uses the torch default)
+    """
+    set_num_threads(num_threads)
+    frames, gt = load_sequence(dataset_name, sequence, num_frames)
+
+    for tracker_param in tracker_params:
+        for truncation in truncations:
+            torch.manual_seed(0)
+            params = get_tracker_parameters('eco', tracker_param)
+            for fparams in params.features.get_fparams('feature_params'):
+                fparams.fourier_truncation = truncation
+            tracker = get_tracker('eco', params)
+            pred, init_time, frame_times = run_frames(tracker, frames, gt[0])
+
+            filter_sz = ' '.join('{}x{}'.format(*sz.int().tolist()) for sz in tracker.filter_sz)
+            print_run_stats('eco/{} truncation {}'.format(tracker_param, truncation), pred, gt, init_time,
+                               frame_times)
+            print('{:24s}  filter size {}'.format('', filter_sz))
+
+
+# Batched multi-target ECO
+
+def synthetic_multi_target_sequence(num_targets, num_frames=20, image_sz=(360, 640), seed=0):
+    """ Generates a sequence with several textured targets of different sizes moving over a textured background.
+
+    returns:
+        list of RGB uint8 frames, list of OrderedDicts with the [x, y, w, h] box of each target in each frame
+    """
+    rng = np.random.RandomState(seed)
+    H, W = image_sz
+
+    background = cv.resize((255 * rng.rand(H // 8, W // 8, 3)).astype(np.uint8), (W, H), interpolation=cv.INTER_LINEAR)
+    targets = [cv.resize((255 * rng.rand(6, 6, 3)).astype(np.uint8), tuple(rng.randint(20, 50, 2).tolist()),
+                         interpolation=cv.INTER_NEAREST) for _ in range(num_targets)]
+    centers = [(60 + rng.rand() * (W - 120), 60 + rng.rand() * (H - 120)) for _ in range(num_targets)]
+
+    frames = []
+    boxes = []
+    for i in range(num_frames):
+        im = background.copy()
+        frame_boxes = OrderedDict()
+        for k, (target, (cx, cy)) in enumerate(zip(targets, centers)):
+            x = int(cx + 20 * np.sin(i / 8 + k))
+            y = int(cy + 15 * np.cos(i / 10 + k))
+            im[y:y + target.shape[0], x:x + target.shape[1], :] = target
+            frame_boxes[k + 1] = [x, y, target.shape[1], target.shape[0]]
+        frames.append(im)
+        boxes.append(frame_boxes)
+
+    return frames, boxes
+
+
+def benchmark_eco_batch(num_targets=(1, 4, 10), tracker_param='edg', num_frames=20, num_threads=None):
+    """ Per-frame time of one single target ECO per object, run one after another as in MultiObjectWrapper, against
+    ECOBatch. Both use the eco_batch parameters, so that the tracked boxes should be the same.
+
+    args:
+        num_targets - numbers of targets to test
+        tracker_param - name of the eco_batch parameter file
+        num_frames - number of frames to run
+        num_threads - number of torch CPU threads (None uses the torch default)
+    """
+    set_num_threads(num_threads)
+    print('Torch threads: {}'.format(torch.get_num_threads()))
+
+    for n in num_targets:
+        frames, boxes = synthetic_multi_target_sequence(n, num_frames)
+        obj_ids = list(boxes[0].keys())
+
+        # One tracker per object
+        torch.manual_seed(0)
+        params = get_tracker_parameters('eco_batch', tracker_param)
+        trackers = [get_tracker('eco', params) for _ in obj_ids]
+        for tracker, obj_id in zip(trackers, obj_ids):
+            tracker.initialize(frames[0], {'init_bbox': boxes[0][obj_id]})
+        pred_serial = []
+        start = time.perf_counter()
+        for im in frames[1:]:
+            pred_serial.append([tracker.track(im)['target_bbox'] for tracker in trackers])
+        t_serial = (time.perf_counter() - start) / (num_frames - 1)
+
+        # Batched tracker
+        torch.manual_seed(0)
+        tracker = get_tracker('eco_batch', get_tracker_parameters('eco_batch', tracker_param))
+        tracker.initialize(frames[0], {'init_bbox': boxes[0], 'init_object_ids': obj_ids, 'object_ids': obj_ids})
+        pred_batch = []
+        start = time.perf_counter()
+        for im in frames[1:]:
+            out = tracker.track(im)['target_bbox']
+            pred_batch.append([out[obj_id] for obj_id in obj_ids])
+        t_batch = (time.perf_counter() - start) / (num_frames - 1)
+
+        print('{:3d} targets   serial {:8.1f} ms/frame   batched {:8.1f} ms/frame   speedup {:5.2f}x   '
+              'max box diff {:.2e}'.format(n, 1000 * t_serial, 1000 * t_batch, t_serial / t_batch,
+                                           np.abs(np.array(pred_serial) - np.array(pred_batch)).max()))
+
+
+# DCF constant cache
+
+def build_dcf_constants(params, sample_sz, target_sz, feature_sz):
+    """ Builds the DCF constants as done in ECO.initialize."""
+    fparams = params.features.get_fparams('feature_params')
+    filter_sz = feature_sz + (feature_sz + 1) % 2
+    output_sigma_factor = fparams.attribute('output_sigma_factor')
+    sigma = (filter_sz / sample_sz) * torch.sqrt(target_sz.prod()) * output_sigma_factor
+
+    window = TensorList([dcf.hann2d(sz) for sz in feature_sz])
+    interp_fs = TensorList([dcf.get_interp_fourier(sz, params.interpolation_method, params.interpolation_bicubic_a,
+                                                   params.interpolation_centering, params.interpolation_windowing)
+                            for sz in filter_sz])
+    reg_filter = TensorList([dcf.get_reg_filter(sample_sz, target_sz, fp) for fp in fparams])
+    yf = TensorList([dcf.label_function(sz, sig) for sz, sig in zip(filter_sz, sigma)])
+    return window, interp_fs, reg_filter, yf
+
+
+def benchmark_dcf_cache(tracker_param='edg', sample_sizes=(204, 244), target_size=(30, 40), num_sequences=20,
+                        num_iter=5):
+    """ Time to build the ECO DCF constants for a series of sequences with the constant cache disabled and enabled.
+    The sequences share a few image sample sizes and target sizes, as with fixed sample size clamping.
+
+    args:
+        tracker_param - name of the ECO parameter file
+        sample_sizes - image sample sizes that occur in the sequences
+        target_size - target size in the base scale (H, W)
+        num_sequences - number of sequences
+        num_iter - number of timed repetitions
+    """
+    params = get_tracker_parameters('eco', tracker_param)
+    params.features.set_is_color(True)
+
+    def run_sequences():
+        for i in range(num_sequences):
+            sample_sz = sample_sizes[i % len(sample_sizes)] * torch.ones(2)
+            build_dcf_constants(params, sample_sz, torch.Tensor(target_size), params.features.size(sample_sz))
+
+    times = {}
+    for cache_size in [0, 64]:
+        dcf.set_cache_size(cache_size)
+        dcf.clear_cache()
+        times[cache_size] = time_fn(run_sequences, num_iter, num_warmup=0) / num_sequences
+        info = dcf.cache_info()
+        print('cache size {:3d}   {:7.2f} ms/sequence   hits {:5d}   misses {:5d}'.format(
+            cache_size, 1000 * times[cache_size], info['hits'], info['misses']))
+
+    print('speedup {:.1f}x'.format(times[0] / times[64]))
+
+
+# First frame augmentation
+
+def get_eco_transforms():
+    """ The first frame transforms of the ECO parameter files."""
+    transforms = [augmentation.Identity()]
+    transforms.extend([augmentation.Translation(shift) for shift in [(6, 6), (-6, 6), (6, -6), (-6, -6)]])
+    transforms.append(augmentation.FlipHorizontal())
+    transforms.extend([augmentation.Rotate(angle) for angle in [5, -5, 10, -10, 20, -20, 30, -30, 45, -45, -60, 60]])
+    transforms.extend([augmentation.Blur(sigma) for sigma in [(2, 0.2), (0.2, 2), (3, 1), (1, 3), (2, 2)]])
+    return transforms
+
+
+def benchmark_augmentation(sample_sz=204, num_iter=20, num_threads=None):
+    """ Compares the batched augmentation (augmentation.apply_transforms) to applying the transforms one at a time.
+
+    args:
+        sample_sz - size of the (square) image patch
+        num_iter - number of timed repetitions
+        num_threads - number of torch CPU threads (None uses the torch default)
+    """
+    set_num_threads(num_threads)
+
+    torch.manual_seed(0)
+    im_patch = F.interpolate(255 * torch.rand(1, 3, sample_sz // 8, sample_sz // 8), (sample_sz, sample_sz),
+                             mode='bilinear')
+    transforms = get_eco_transforms()
+
+    def run_serial():
+        return torch.cat([T(im_patch) for T in transforms])
+
+    def run_batched():
+        return augmentation.apply_transforms(im_patch, transforms)
+
+    t_serial = time_fn(run_serial, num_iter)
+    t_batched = time_fn(run_batched, num_iter)
+    diff = (run_serial() - run_batched()).abs()
+
+    print('{} transforms, patch {}x{}, torch threads: {}'.format(len(transforms), sample_sz, sample_sz,
+                                                                torch.get_num_threads()))
+    print('  serial {:7.2f} ms   batched {:7.2f} ms   speedup {:.2f}x'.format(
+        1000 * t_serial, 1000 * t_batched, t_serial / t_batched))
+    print('  max abs difference {:.2e}, mean {:.2e} (pixel range 0-255)'.format(diff.max().item(), diff.mean().item()))
+
+
+# Multi-scale patch sampling
+
+def benchmark_patch_sampling(image_sz=(720, 1280), num_scales=(1, 5, 17), sample_szs=(150, 300, 600),
+                             output_sz=288, mode='replicate', num_iter=20, num_threads=None):
+    """ Times the multi-scale patch sampling with one sample_patch call per scale and with the batched
+    sample_patch_batch. The maximum absolute difference between the patches is also given.
+
+    args:
+        image_sz - size (h, w) of the random test image
+        num_scales - numbers of scales to sample
+        sample_szs - side lengths of the square image region sampled at the middle scale
+        output_sz - side length of the resized patches
+        mode - border mode, 'replicate', 'inside' or 'inside_major'
+        num_iter - number of timed repetitions
+        num_threads - number of torch CPU threads (None uses the torch default)
+    """
+    set_num_threads(num_threads)
+    torch.manual_seed(0)
+    im = 255 * torch.rand(1, 3, *image_sz)
+    pos = torch.Tensor(image_sz) / 3
+    output_sz = torch.Tensor([output_sz, output_sz])
+
+    print('Image size {}x{}, torch threads: {}'.format(image_sz[0], image_sz[1], torch.get_num_threads()))
+    print('{:>7s} {:>7s}   {:>12s} {:>12s} {:>8s}   {:>9s}'.format('scales', 'size', 'per scale', 'batched',
+                                                               'speedup', 'max diff'))
+
+    for sample_sz in sample_szs:
+        for n in num_scales:
+            scales = 1.02 ** (torch.arange(n).float() - (n - 1) // 2)
+            sample_sz_all = scales.view(-1, 1) * torch.Tensor([sample_sz, sample_sz])
+
+            def loop():
+                return torch.cat([sample_patch(im, pos, sz, output_sz, mode=mode, max_scale_change=1.5)[0]
+                                  for sz in sample_sz_all])
+
+            def batched():
+                return sample_patch_batch(im, pos, sample_sz_all, output_sz, mode=mode, max_scale_change=1.5)[0]
+
+            t_loop = time_fn(loop, num_iter)
+            t_batched = time_fn(batched, num_iter)
+            max_diff = (loop() - batched()).abs().max().item()
+
+            print('{:7d} {:7d}   {:9.2f} ms {:9.2f} ms {:7.2f}x   {:9.2e}'.format(
+                n, sample_sz, 1000 * t_loop, 1000 * t_batched, t_loop / t_batched, max_diff))
+
+
+# Scale filter
+
+def benchmark_scale_filter(tracker_params=('edg', 'edg_fdsst'), dataset_name=None, sequence=None, num_frames=100,
+                           scale_change=0.3, num_threads=None):
+    """ Per-frame time and AUC of ECO with the multi-scale search of the translation filter (edg) and with the 1-D
+    scale filter (edg_fdsst). The synthetic sequence (used when no dataset is given) has a target that changes size.
+
+    args:
+        tracker_params - names of the ECO parameter files to compare
+        dataset_name - dataset to take the sequence from (None uses a synthetic sequence)
+        sequence - sequence name or number
+        num_frames - number of frames to run
+        scale_change - relative amplitude of the target size change in the synthetic sequence
+        num_threads - number of torch CPU threads (None uses the torch default)
+    """
+    set_num_threads(num_threads)
+    frames, gt = load_sequence(dataset_name, sequence, num_frames, scale_change)
+
+    for tracker_param in tracker_params:
+        torch.manual_seed(0)
+        params = get_tracker_parameters('eco', tracker_param)
+        tracker = get_tracker('eco', params)
+        pred, init_time, frame_times = run_frames(tracker, frames, gt[0])
+
+        if getattr(params, 'use_scale_filter', False):
+            name = 'scale filter'
+        else:
+            name = '{} scales'.format(len(params.scale_factors))
+        print_run_stats('eco/{} {}'.format(tracker_param, name), pred, gt, init_time, frame_times)
+
+
+# Newton refinement of the score maximum
+
+def benchmark_newton_scores(tracker_param='edg', dataset_name=None, sequence=None, num_frames=100,
+                            upsample_factors=(1, 2), newton_iterations=5, num_iter=20, num_threads=None):
+    """ Per-frame time, AUC and localization time of ECO when the scores are sampled on the upsampled pixel grid and
+    when the grid maximum of the score Fourier series is refined with Newton iterations.
+
+    args:
+        tracker_param - name of the ECO parameter file
+        dataset_name - dataset to take the sequence from (None uses a synthetic sequence)
+        sequence - sequence name or number
+        num_frames - number of frames to run
+        upsample_factors - score upsample factors to compare with
+        newton_iterations - number of Newton iterations
+        num_iter - number of timed repetitions of the localization
+        num_threads - number of torch CPU threads (None uses the torch default)
+    """
+    set_num_threads(num_threads)
+    frames, gt = load_sequence(dataset_name, sequence, num_frames)
+
+    settings = [(f, 0) for f in upsample_factors] + [(1, newton_iterations)]
+    for upsample_factor, num_newton_iter in settings:
+        torch.manual_seed(0)
+        params = get_tracker_parameters('eco', tracker_param)
+        params.score_upsample_factor = upsample_factor
+        params.newton_iterations = num_newton_iter
+        tracker = get_tracker('eco', params)
+        pred, init_time, frame_times = run_frames(tracker, frames, gt[0])
+
+        # Time the localization on the scores of the last frame
+        im = numpy_to_torch(frames[-1])
+        test_xf = tracker.extract_fourier_sample(im, tracker.pos, tracker.target_scale * tracker.scale_factors,
+                                                 tracker.img_sample_sz)
+        sf = tracker.apply_filter(test_xf)
+        t_loc = time_fn(lambda: tracker.localize_target(sf), num_iter)
+
+        name = '{} Newton iter'.format(num_newton_iter) if num_newton_iter > 0 else 'upsample {}'.format(upsample_factor)
+        print_run_stats('eco/{} {}'.format(tracker_param, name), pred, gt, init_time, frame_times)
+        print('{:24s}  localization {:7.2f} ms'.format('', 1000 * t_loc))
+
+
+# Residual based early exit of the optimizers
+
+def benchmark_adaptive_cg(tracker_param='edg', dataset_name=None, sequence=None, num_frames=100,
+                          cg_tols=(0.05, 0.1, 0.2), init_cg_tol=0.02, init_gn_tol=0.2, num_threads=None):
+    """ Per-frame time and AUC of ECO with the fixed number of CG iterations and with the relative residual early
+    exit, for different tolerances. Also gives the number of CG iterations saved in the first frame and per frame
+    in the tracking.
+
+    args:
+        tracker_param - name of the ECO parameter file
+        dataset_name - dataset to take the sequence from (None uses a synthetic sequence)
+        sequence - sequence name or number
+        num_frames - number of frames to run
+        cg_tols - relative residual tolerances of the CG updates in the tracking (CG_tol)
+        init_cg_tol - relative residual tolerance of CG in the first frame (init_CG_tol)
+        init_gn_tol - relative gradient tolerance of the Gauss-Newton iterations in the first frame (init_GN_tol)
+        num_threads - number of torch CPU threads (None uses the torch default)
+    """
+    set_num_threads(num_threads)
+    frames, gt = load_sequence(dataset_name, sequence, num_frames)
+
+    for cg_tol in [0.0] + list(cg_tols):
+        torch.manual_seed(0)
+        params = get_tracker_parameters('eco', tracker_param)
+        params.CG_tol = cg_tol
+        params.init_CG_tol = init_cg_tol if cg_tol > 0 else 0.0
+        params.init_GN_tol = init_gn_tol if cg_tol > 0 else 0.0
+        tracker = get_tracker('eco', params)
+        pred, init_time, frame_times = run_frames(tracker, frames, gt[0])
+
+        name = 'CG_tol {}'.format(cg_tol) if cg_tol > 0 else 'fixed CG iter'
+        print_run_stats('eco/{} {}'.format(tracker_param, name), pred, gt, init_time, frame_times)
+
+        saved = np.array(tracker.cg_iter_saved[1:])
+        print('{:24s}  CG iter saved: init {:4d}  per frame mean {:5.2f} max {:3d}  total {:6d}'.format(
+            '', tracker.cg_iter_saved[0], saved.mean(), saved.max(), saved.sum()))
+
+
+def _sequence_name(sequence):
+    """ Sequence number if the argument is an integer, otherwise the sequence name."""
+    try:
+        return int(sequence)
+    except (TypeError, ValueError):
+        return sequence
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks of the ECO components.')
+    parser.add_argument('--threads', type=int, default=None, help='Number of torch CPU threads.')
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    icg_parser = subparsers.add_parser('icg', help='ICG feature against vggconv1 on the CPU.')
+    icg_parser.add_argument('--num_scales', type=int, default=5, help='Number of scale patches per frame.')
+    icg_parser.add_argument('--sample_sz', type=int, default=250, help='Image patch size.')
+    icg_parser.add_argument('--num_iter', type=int, default=20, help='Number of timed frames.')
+
+    fourier_parser = subparsers.add_parser('fourier', help='ECO with emulated and native complex arithmetic.')
+    fourier_parser.add_argument('--tracker_param', type=str, default='edg', help='Name of ECO parameter file.')
+
+    gram_parser = subparsers.add_parser('gram_cache', help='Cached normal equations of the ECO filter optimizer.')
+    gram_parser.add_argument('--memory_sizes', type=int, nargs='+', default=[50, 200, 400], help='Sample memory sizes.')
+    gram_parser.add_argument('--compressed_dims', type=int, nargs='+', default=[16, 64], help='Feature dimensions.')
+    gram_parser.add_argument('--filter_sz', type=int, nargs=2, default=[63, 32], help='Number of Fourier coefficients.')
+    gram_parser.add_argument('--num_iter', type=int, default=10, help='Number of timed repetitions.')
+
+    truncation_parser = subparsers.add_parser('fourier_truncation', help='Fourier coefficient truncation of ECO.')
+    truncation_parser.add_argument('--tracker_params', type=str, nargs='+', default=['edg'],
+                                   help='Names of ECO parameter files.')
+    truncation_parser.add_argument('--truncations', type=float, nargs='+', default=[1.0, 0.75, 0.5, 0.3],
+                                   help='Ratios of the Fourier coefficients to keep.')
+
+    batch_parser = subparsers.add_parser('eco_batch', help='Batched multi-target ECO against one ECO per target.')
+    batch_parser.add_argument('--num_targets', type=int, nargs='+', default=[1, 4, 10], help='Numbers of targets.')
+    batch_parser.add_argument('--tracker_param', type=str, default='edg', help='Name of eco_batch parameter file.')
+    batch_parser.add_argument('--num_frames', type=int, default=20, help='Number of frames.')
+
+    dcf_parser = subparsers.add_parser('dcf_cache', help='Cache of the DCF constants.')
+    dcf_parser.add_argument('--tracker_param', type=str, default='edg', help='Name of ECO parameter file.')
+    dcf_parser.add_argument('--num_sequences', type=int, default=20, help='Number of sequences.')
+    dcf_parser.add_argument('--num_iter', type=int, default=5, help='Number of timed repetitions.')
+
+    augmentation_parser = subparsers.add_parser('augmentation', help='Batched first frame augmentation.')
+    augmentation_parser.add_argument('--sample_sz', type=int, default=204, help='Image patch size.')
+    augmentation_parser.add_argument('--num_iter', type=int, default=20, help='Number of timed repetitions.')
+
+    patch_parser = subparsers.add_parser('patch_sampling', help='Batched multi-scale patch sampling.')
+    patch_parser.add_argument('--image_sz', type=int, nargs=2, default=[720, 1280], help='Image size.')
+    patch_parser.add_argument('--num_scales', type=int, nargs='+', default=[1, 5, 17], help='Numbers of scales.')
+    patch_parser.add_argument('--sample_szs', type=int, nargs='+', default=[150, 300, 600],
+                              help='Sampled region sizes.')
+    patch_parser.add_argument('--output_sz', type=int, default=288, help='Size of the resized patches.')
+    patch_parser.add_argument('--mode', type=str, default='replicate', help='Border mode.')
+    patch_parser.add_argument('--num_iter', type=int, default=20, help='Number of timed repetitions.')
+
+    scale_parser = subparsers.add_parser('scale_filter', help='ECO scale filter against the multi-scale search.')
+    scale_parser.add_argument('--tracker_params', type=str, nargs='+', default=['edg', 'edg_fdsst'],
+                              help='Names of ECO parameter files.')
+    scale_parser.add_argument('--scale_change', type=float, default=0.3,
+                              help='Target size change of synthetic sequence.')
+
+    newton_parser = subparsers.add_parser('newton', help='Newton refinement of the ECO score maximum.')
+    newton_parser.add_argument('--tracker_param', type=str, default='edg', help='Name of ECO parameter file.')
+    newton_parser.add_argument('--upsample_factors', type=int, nargs='+', default=[1, 2],
+                               help='Score upsample factors.')
+    newton_parser.add_argument('--newton_iterations', type=int, default=5, help='Number of Newton iterations.')
+    newton_parser.add_argument('--num_iter', type=int, default=20, help='Number of timed repetitions.')
+
+    cg_parser = subparsers.add_parser('adaptive_cg', help='Residual based early exit of the ECO optimizers.')
+    cg_parser.add_argument('--tracker_param', type=str, default='edg', help='Name of ECO parameter file.')
+    cg_parser.add_argument('--cg_tols', type=float, nargs='+', default=[0.05, 0.1, 0.2], help='CG tolerances.')
+    cg_parser.add_argument('--init_cg_tol', type=float, default=0.02, help='CG tolerance in the first frame.')
+    cg_parser.add_argument('--init_gn_tol', type=float, default=0.2, help='Gauss-Newton tolerance in the first frame.')
+
+    for sequence_parser, num_frames in [(fourier_parser, 50), (truncation_parser, 100), (scale_parser, 100),
+                                        (newton_parser, 100), (cg_parser, 100)]:
+        sequence_parser.add_argument('--dataset_name', type=str, default=None,
+                                     help='Dataset name (default: synthetic sequence).')
+        sequence_parser.add_argument('--sequence', type=str, default=None, help='Sequence number or name.')
+        sequence_parser.add_argument('--num_frames', type=int, default=num_frames, help='Number of frames.')
+
+    args = parser.parse_args()
+
+    if args.benchmark == 'icg':
+        benchmark_icg(args.num_scales, args.sample_sz, args.num_iter, args.threads)
+    elif args.benchmark == 'fourier':
+        benchmark_fourier(args.tracker_param, args.dataset_name, _sequence_name(args.sequence), args.num_frames,
+                          args.threads)
+    elif args.benchmark == 'gram_cache':
+        benchmark_gram_cache(args.memory_sizes, args.compressed_dims, args.filter_sz, args.num_iter, args.threads)
+    elif args.benchmark == 'fourier_truncation':
+        benchmark_fourier_truncation(args.tracker_params, args.dataset_name, _sequence_name(args.sequence),
+                                     args.num_frames, args.truncations, args.threads)
+    elif args.benchmark == 'eco_batch':
+        benchmark_eco_batch(args.num_targets, args.tracker_param, args.num_frames, args.threads)
+    elif args.benchmark == 'dcf_cache':
+        benchmark_dcf_cache(args.tracker_param, num_sequences=args.num_sequences, num_iter=args.num_iter)
+    elif args.benchmark == 'augmentation':
+        benchmark_augmentation(args.sample_sz, args.num_iter, args.threads)
+    elif args.benchmark == 'patch_sampling':
+        benchmark_patch_sampling(args.image_sz, args.num_scales, args.sample_szs, args.output_sz, args.mode,
+                                 args.num_iter, args.threads)
+    elif args.benchmark == 'scale_filter':
+        benchmark_scale_filter(args.tracker_params, args.dataset_name, _sequence_name(args.sequence),
+                               args.num_frames, args.scale_change, args.threads)
+    elif args.benchmark == 'newton':
+        benchmark_newton_scores(args.tracker_param, args.dataset_name, _sequence_name(args.sequence), args.num_frames,
+                                args.upsample_factors, args.newton_iterations, args.num_iter, args.threads)
+    elif args.benchmark == 'adaptive_cg':
+        benchmark_adaptive_cg(args.tracker_param, args.dataset_name, _sequence_name(args.sequence), args.num_frames,
+                              args.cg_tols, args.init_cg_tol, args.init_gn_tol, args.threads)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+import os
+import sys
+import argparse
+
+env_path = os.path.join(os.path.dirname(__file__), '../..')
+if env_path not in sys.path:
+    sys.path.append(env_path)
+
+from ltr.admin.environment import env_settings
+from ltr.data.image_loader import opencv_loader
+from ltr.dataset import Lasot, Got10k, TrackingNet
+from ltr.dataset.crop_cache import crop_cache_dir, write_crop_cache
+
+
+def get_training_dataset(dataset_name):
+    """ The training datasets that can be cached, by name."""
+    env = env_settings()
+    if dataset_name == 'lasot':
+        return Lasot(env.lasot_dir, split='train', image_loader=opencv_loader)
+    if dataset_name in ('got10k_train', 'got10k_vottrain', 'got10k_votval'):
+        return Got10k(env.got10k_dir, split=dataset_name[len('got10k_'):], image_loader=opencv_loader)
+    if dataset_name == 'trackingnet':
+        return TrackingNet(env.trackingnet_dir, set_ids=list(range(4)), image_loader=opencv_loader)
+    raise ValueError('Unknown dataset {}'.format(dataset_name))
+
+
+def create_crop_cache(dataset_name, search_area_factor, output_sz, oversize=1.5, cache_dir=None, shard_size=10000,
+                      num_workers=0):
+    """ Extracts the crops around the target in all frames of a training dataset, which are read by the
+    ltr.dataset.CropCacheDataset with the same settings.
+
+    args:
+        dataset_name - lasot, got10k_train, got10k_vottrain, got10k_votval or trackingnet
+        search_area_factor, output_sz - search area settings of the training processing
+        oversize - size of the cached crops relative to the search area
+        cache_dir - root directory of the crop caches (None uses the crop_cache_dir in the local.py)
+        shard_size - approximate number of frames per shard
+        num_workers - number of processes extracting the crops
+    """
+    cache_dir = env_settings().crop_cache_dir if cache_dir is None else cache_dir
+    if not cache_dir:
+        raise ValueError('No cache directory given and the crop_cache_dir is not set in the local.py.')
+
+    dataset = get_training_dataset(dataset_name)
+    path = crop_cache_dir(cache_dir, dataset, search_area_factor, output_sz, oversize)
+    crop_cache = write_crop_cache(dataset, path, search_area_factor, output_sz, oversize, shard_size, num_workers)
+    print('{}: {} sequences of {} cached in {}'.format(dataset_name, len(crop_cache.offsets),
+                                                       dataset.get_num_sequences(), path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cache the training crops of a dataset as memory-mapped shards.')
+    parser.add_argument('dataset_name', type=str, help='Name of the dataset.')
+    parser.add_argument('search_area_factor', type=float, help='Search area factor of the training processing.')
+    parser.add_argument('output_sz', type=int, help='Output size of the training processing.')
+    parser.add_argument('--oversize', type=float, default=1.5, help='Size of the crops relative to the search area.')
+    parser.add_argument('--cache_dir', type=str, default=None, help='Cache directory (default: from local.py).')
+    parser.add_argument('--shard_size', type=int, default=10000, help='Approximate number of frames per shard.')
+    parser.add_argument('--num_workers', type=int, default=0, help='Number of processes extracting the crops.')
+
+    args = parser.parse_args()
+
+    create_crop_cache(args.dataset_name, args.search_area_factor, args.output_sz, args.oversize, args.cache_dir,
+                      args.shard_size, args.num_workers)
+
+
+if __name__ == '__main__':
+    main()
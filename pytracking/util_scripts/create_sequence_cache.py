@@ -0,0 +1,92 @@
+import os
+import sys
+import math
+import argparse
+import importlib
+
+env_path = os.path.join(os.path.dirname(__file__), '../..')
+if env_path not in sys.path:
+    sys.path.append(env_path)
+
+from pytracking.evaluation import get_dataset
+from pytracking.evaluation.environment import env_settings
+from pytracking.evaluation.sequence_cache import write_sequence_cache, load_sequence_cache, sample_scale
+
+
+def tracker_sample_size(tracker_name, parameter_name):
+    """ Largest side length (in pixels) of the image samples of the tracker, and its search area scale."""
+    params = importlib.import_module('pytracking.parameter.{}.{}'.format(tracker_name, parameter_name)).parameters()
+    if params.get('image_sample_size', None) is not None:
+        sample_sz = params.image_sample_size
+    else:
+        sample_sz = math.sqrt(params.max_image_sample_size)
+    return sample_sz, params.search_area_scale
+
+
+def create_sequence_cache(dataset_name, sequence=None, cache_path=None, tracker_name=None, parameter_name=None,
+                          target_shrink=4.0, max_size=None, overwrite=False):
+    """ Decodes the frames of a dataset once and stores them as memory-mapped arrays, which are used by get_dataset
+    when the sequence_cache_path is set in the local.py.
+
+    args:
+        dataset_name - name of the dataset, see pytracking.evaluation.get_dataset
+        sequence - only cache this sequence (name or number)
+        cache_path - root directory of the cache (None uses the sequence_cache_path in the local.py)
+        tracker_name, parameter_name - downscale the frames to the largest size that this tracker samples, see
+                                       sequence_cache.sample_scale. The tracking results on downscaled frames are not
+                                       comparable to the results on the original images.
+        target_shrink - with tracker_name, how much the target may shrink from its initial size before the samples
+                        lose resolution
+        max_size - maximum length of the longest image side. Also changes the results if the frames are downscaled.
+        overwrite - recreate sequences that are already cached
+    """
+    cache_path = env_settings().sequence_cache_path if cache_path is None else cache_path
+    if not cache_path:
+        raise ValueError('No cache path given and the sequence_cache_path is not set in the local.py.')
+
+    sample_sz = None
+    if tracker_name is not None:
+        sample_sz, search_area_scale = tracker_sample_size(tracker_name, parameter_name)
+
+    dataset = get_dataset(dataset_name)
+    if sequence is not None:
+        dataset = [dataset[sequence]]
+
+    for seq in dataset:
+        if not overwrite and load_sequence_cache(seq, cache_path) is not None:
+            print('{}: already cached'.format(seq.name))
+            continue
+
+        scale = 1.0 if sample_sz is None else sample_scale(seq, sample_sz, search_area_scale, target_shrink)
+        frame_cache = write_sequence_cache(seq, cache_path, scale, max_size)
+        print('{}: {} frames of size {}x{}, scale {:.3f}'.format(seq.name, len(frame_cache),
+                                                                 *frame_cache.index['frame_size'], frame_cache.scale))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cache the decoded frames of a dataset as memory-mapped arrays.')
+    parser.add_argument('dataset_name', type=str, help='Name of the dataset.')
+    parser.add_argument('--sequence', type=str, default=None, help='Sequence number or name.')
+    parser.add_argument('--cache_path', type=str, default=None, help='Cache directory (default: from local.py).')
+    parser.add_argument('--tracker_name', type=str, default=None,
+                        help='Downscale the frames to the largest size sampled by this tracker. The results are not '
+                             'comparable to runs on the original images.')
+    parser.add_argument('--target_shrink', type=float, default=4.0,
+                        help='How much the target may shrink from its initial size without losing sample resolution.')
+    parser.add_argument('--parameter_name', type=str, default='default', help='Parameter file of the tracker.')
+    parser.add_argument('--max_size', type=int, default=None, help='Maximum length of the longest image side.')
+    parser.add_argument('--overwrite', action='store_true', help='Recreate already cached sequences.')
+
+    args = parser.parse_args()
+
+    try:
+        seq_name = int(args.sequence)
+    except:
+        seq_name = args.sequence
+
+    create_sequence_cache(args.dataset_name, seq_name, args.cache_path, args.tracker_name, args.parameter_name,
+                          args.target_shrink, args.max_size, args.overwrite)
+
+
+if __name__ == '__main__':
+    main()
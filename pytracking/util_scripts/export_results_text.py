@@ -0,0 +1,49 @@
+import os
+import sys
+import argparse
+
+env_path = os.path.join(os.path.dirname(__file__), '../..')
+if env_path not in sys.path:
+    sys.path.append(env_path)
+
+from pytracking.evaluation import Tracker
+from pytracking.evaluation.results_store import get_results_store
+
+
+def export_results_text(tracker_name, tracker_param, run_id=None, output_dir=None):
+    """ Writes the results of a tracker run, stored in the npz results store, as the text files of the text results
+    format (one file per sequence and field).
+
+    args:
+        tracker_name - name of the tracker
+        tracker_param - name of the parameter file
+        run_id - run id of the tracker
+        output_dir - directory of the text files (None uses the results directory of the tracker)
+    """
+    tracker = Tracker(tracker_name, tracker_param, run_id)
+    output_dir = tracker.results_dir if output_dir is None else output_dir
+
+    store = get_results_store(tracker.results_dir)
+    names = store.names()
+    if len(names) == 0:
+        print('No stored results found for {} {}'.format(tracker_name, tracker_param))
+        return
+
+    store.export_text(output_dir)
+    print('Exported {} results to {}'.format(len(names), output_dir))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export the stored results of a tracker run as text files.')
+    parser.add_argument('tracker_name', type=str, help='Name of tracking method.')
+    parser.add_argument('tracker_param', type=str, help='Name of parameter file.')
+    parser.add_argument('--run_id', type=int, default=None, help='The run id.')
+    parser.add_argument('--output_dir', type=str, default=None, help='Output directory (default: results directory).')
+
+    args = parser.parse_args()
+
+    export_results_text(args.tracker_name, args.tracker_param, args.run_id, args.output_dir)
+
+
+if __name__ == '__main__':
+    main()
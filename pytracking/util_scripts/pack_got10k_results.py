@@ -2,6 +2,7 @@ import numpy as np
 import os
 import shutil
 from pytracking.evaluation.environment import env_settings
+from pytracking.evaluation.results_store import load_results
 
 
 def pack_got10k_results(tracker_name, param_name, output_name):
@@ -27,10 +28,9 @@ def pack_got10k_results(tracker_name, param_name, output_name):
             os.makedirs(seq_output_path)
 
         for run_id in range(3):
-            res = np.loadtxt('{}/{}/{}_{:03d}/{}.txt'.format(results_path, tracker_name, param_name, run_id, seq_name), dtype=np.float64)
-            times = np.loadtxt(
-                '{}/{}/{}_{:03d}/{}_time.txt'.format(results_path, tracker_name, param_name, run_id, seq_name),
-                dtype=np.float64)
+            results_dir = '{}/{}/{}_{:03d}'.format(results_path, tracker_name, param_name, run_id)
+            res = load_results(results_dir, seq_name)
+            times = load_results(results_dir, '{}_time'.format(seq_name))
 
             np.savetxt('{}/{}_{:03d}.txt'.format(seq_output_path, seq_name, run_id+1), res, delimiter=',', fmt='%f')
             np.savetxt('{}/{}_time.txt'.format(seq_output_path, seq_name), times, fmt='%f')
@@ -3,6 +3,7 @@ import os
 import shutil
 from pytracking.evaluation.environment import env_settings
 from pytracking.evaluation.datasets import get_dataset
+from pytracking.evaluation.results_store import load_results
 
 
 def pack_trackingnet_results(tracker_name, param_name, run_id=None, output_name=None):
@@ -35,11 +36,11 @@ def pack_trackingnet_results(tracker_name, param_name, run_id=None, output_name=
         seq_name = seq.name
 
         if run_id is None:
-            seq_results_path = '{}/{}/{}/{}.txt'.format(results_path, tracker_name, param_name, seq_name)
+            results_dir = '{}/{}/{}'.format(results_path, tracker_name, param_name)
         else:
-            seq_results_path = '{}/{}/{}_{:03d}/{}.txt'.format(results_path, tracker_name, param_name, run_id, seq_name)
+            results_dir = '{}/{}/{}_{:03d}'.format(results_path, tracker_name, param_name, run_id)
 
-        results = np.loadtxt(seq_results_path, dtype=np.float64)
+        results = load_results(results_dir, seq_name)
 
         np.savetxt('{}/{}.txt'.format(output_path, seq_name), results, delimiter=',', fmt='%.2f')
 
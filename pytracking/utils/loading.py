@@ -1,33 +1,118 @@
 import os
+import copy
+import threading
 import ltr.admin.loading as ltr_loading
 from pytracking.evaluation.environment import env_settings
 
 
-def load_network(net_path, **kwargs):
+# Process-wide registry of the loaded networks, shared by all trackers in the process
+_network_registry = {}
+_network_locks = {}
+_registry_lock = threading.Lock()
+
+
+def get_shared_network(key, constructor, device=None):
+    """Get a network from the process-wide network registry. The network is constructed by calling constructor() the
+    first time the key is requested, moved to the device and kept in eval mode in the registry. The registered network
+    itself is returned and is shared by all trackers in the process, so it must be treated as read-only. Trackers that
+    set attributes on their network must first copy the submodules they modify, see copy_submodules. Thread safe, a
+    network is only constructed once even if it is requested from several threads at the same time.
+    args:
+        key - Hashable key of the network, e.g. the resolved path and the layer set.
+        constructor - Function without arguments that constructs the network.
+        device - Device to move the network to, e.g. 'cuda'. None keeps the network where the constructor put it.
+                 The networks on different devices are registered separately.
+    """
+    key = (key, None if device is None else str(device))
+
+    with _registry_lock:
+        net = _network_registry.get(key)
+        key_lock = _network_locks.setdefault(key, threading.Lock())
+
+    if net is None:
+        with key_lock:
+            # Another thread may have constructed the network while waiting for the lock
+            with _registry_lock:
+                net = _network_registry.get(key)
+
+            if net is None:
+                net = constructor()
+                if device is not None:
+                    net = net.to(device)
+                net.eval()
+
+                with _registry_lock:
+                    _network_registry[key] = net
+
+    return net
+
+
+def copy_submodules(net, names):
+    """Shallow copy of the network with its own deep copies of the submodules with the given names. The other
+    submodules and the parameters are shared with net. Used by the trackers to modify a network from the registry
+    without changing it for the other trackers, see get_shared_network.
+    args:
+        net - The network, a torch.nn.Module.
+        names - Names of the direct submodules of net that are copied.
+    """
+    net_copy = copy.copy(net)
+    net_copy._modules = net._modules.copy()
+    for name in names:
+        net_copy._modules[name] = copy.deepcopy(net._modules[name])
+    return net_copy
+
+
+def clear_network_registry():
+    """Remove all networks from the registry."""
+    with _registry_lock:
+        _network_registry.clear()
+        _network_locks.clear()
+
+
+def network_path_candidates(net_path):
+    """Full paths to try for a network path. If it is not an absolute path, it is relative to the network_path(s) in
+    the local.py."""
+    if os.path.isabs(net_path):
+        return [net_path]
+
+    root_paths = env_settings().network_path
+    if isinstance(root_paths, str):
+        root_paths = [root_paths]
+    return [os.path.join(root, net_path) for root in root_paths]
+
+
+def load_network(net_path, shared=True, device=None, **kwargs):
     """Load network for tracking.
     args:
         net_path - Path to network. If it is not an absolute path, it is relative to the network_path in the local.py.
                    See ltr.admin.loading.load_network for further details.
+        shared - Get the network from the process-wide registry, so that it is only loaded once per process. The
+                 network is then shared with the other trackers and must not be modified, see get_shared_network.
+        device - Device to move the network to, e.g. 'cuda'. None keeps the network on the CPU.
         **kwargs - Additional key-word arguments that are sent to ltr.admin.loading.load_network.
     """
     kwargs['backbone_pretrained'] = False
-    if os.path.isabs(net_path):
-        path_full = net_path
-        net, _ = ltr_loading.load_network(path_full, **kwargs)
-    elif isinstance(env_settings().network_path, (list, tuple)):
+
+    # Only try the paths that exist, fall back to all paths if none of them does
+    path_candidates = network_path_candidates(net_path)
+    path_candidates = [p for p in path_candidates if os.path.exists(p)] or path_candidates
+
+    def _load():
         net = None
-        for p in env_settings().network_path:
-            path_full = os.path.join(p, net_path)
+        for path_full in path_candidates:
             try:
                 net, _ = ltr_loading.load_network(path_full, **kwargs)
                 break
             except Exception as e:
-                # print(e)
-                pass
+                if len(path_candidates) == 1:
+                    raise e
 
         assert net is not None, 'Failed to load network'
-    else:
-        path_full = os.path.join(env_settings().network_path, net_path)
-        net, _ = ltr_loading.load_network(path_full, **kwargs)
+        return net
 
-    return net
+    if not shared:
+        net = _load()
+        return net if device is None else net.to(device)
+
+    key = ('ltr', os.path.realpath(path_candidates[0]), tuple(sorted((k, repr(v)) for k, v in kwargs.items())))
+    return get_shared_network(key, _load, device)
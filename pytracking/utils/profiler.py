@@ -0,0 +1,120 @@
+import time
+import functools
+import numpy as np
+import torch
+from collections import OrderedDict
+
+
+class _NullStage:
+    """Context manager that does nothing, returned by a disabled profiler."""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+_null_stage = _NullStage()
+
+
+class _Stage:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        if self.profiler.synchronize:
+            torch.cuda.synchronize()
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.profiler.synchronize:
+            torch.cuda.synchronize()
+        self.profiler.add(self.name, time.perf_counter() - self.start_time)
+        return False
+
+
+class StageProfiler:
+    """Measures the time spent in named stages of a tracker, separately for each frame. Call new_frame() at the start of
+    each frame and wrap the stages in
+        with profiler.stage('name'):
+            ...
+    or decorate methods of objects with a profiler attribute with @profiled('name'). The times of a stage that is run
+    several times in a frame are summed. Nested stages are timed independently, so the time of an inner stage is also
+    included in the outer one. A disabled profiler returns a shared no-op context manager from stage().
+    args:
+        enabled - Record the stage times.
+        synchronize - Synchronize CUDA at the start and end of each stage, to time the GPU work.
+    """
+    def __init__(self, enabled=False, synchronize=False):
+        self.enabled = enabled
+        self.synchronize = synchronize and enabled and torch.cuda.is_available()
+        self.frame_times = []
+
+    def new_frame(self):
+        if self.enabled:
+            self.frame_times.append(OrderedDict())
+
+    def stage(self, name):
+        if not self.enabled:
+            return _null_stage
+        return _Stage(self, name)
+
+    def add(self, name, stage_time):
+        if len(self.frame_times) == 0:
+            self.new_frame()
+        frame = self.frame_times[-1]
+        frame[name] = frame.get(name, 0.0) + stage_time
+
+    def current_frame(self):
+        """The stage times of the current frame, or None if disabled."""
+        if not self.enabled or len(self.frame_times) == 0:
+            return None
+        return self.frame_times[-1]
+
+
+# Shared disabled profiler, used where no profiler has been set
+disabled_profiler = StageProfiler(enabled=False)
+
+
+def profiled(name):
+    """Decorator timing a method as the stage name, using the profiler attribute of the object."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            with self.profiler.stage(name):
+                return fn(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def stage_times_array(frame_times):
+    """The stage times of a sequence as a structured array with one element per frame and one field per stage. Stages
+    that did not run in a frame get the time 0."""
+    stage_names = []
+    for frame in frame_times:
+        stage_names.extend(name for name in frame.keys() if name not in stage_names)
+
+    data = np.zeros(len(frame_times), dtype=[(name, np.float64) for name in stage_names])
+    for i, frame in enumerate(frame_times):
+        for name, stage_time in frame.items():
+            data[name][i] = stage_time
+    return data
+
+
+def save_stage_times(file, frame_times):
+    """Save the stage times of a sequence as a tab separated table with one row per frame and one column per stage.
+    The first line is a header with the stage names. Stages that did not run in a frame get the time 0."""
+    data = stage_times_array(frame_times)
+    np.savetxt(file, data.view(np.float64).reshape(len(data), -1), delimiter='\t', fmt='%f',
+               header='\t'.join(data.dtype.names), comments='')
+
+
+def load_stage_times(file):
+    """Load stage times saved by save_stage_times. Returns the list of stage names and an array of shape
+    (num_frames, num_stages)."""
+    with open(file, 'r') as f:
+        stage_names = f.readline().rstrip('\n').split('\t')
+    data = np.loadtxt(file, delimiter='\t', skiprows=1, ndmin=2)
+    return stage_names, data